@@ -3,6 +3,12 @@ ASGI config for E_hospitality project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with any ASGI server, e.g. ``uvicorn E_hospitality.asgi:application
+--workers 4``. The reporting dashboards (billing_dashboard, patient_statistics)
+are async views that run their aggregates concurrently; the rest of the site
+runs in threads as under WSGI. ``manage.py run_benchmarks --concurrency N``
+compares the two paths.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
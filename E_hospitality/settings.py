@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'adminpanel.middleware.MetricsMiddleware',
+    'adminpanel.querycheck.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,10 +85,41 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+
+    # Read-only copy for the reporting views (adminpanel.replica),
+    # refreshed from default by `manage.py refresh_replica --every 60`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 
 }
 
+DATABASE_ROUTERS = ['adminpanel.replica.ReplicaRouter']
+
+# 'default' is a per-process cache. 'shared' holds what every worker
+# process has to agree on (sessions, login throttle buckets, role and
+# doctor directory version stamps, patient statistics): Redis when
+# REDIS_URL is set, otherwise the database cache table, which migrate
+# creates (adminpanel 0004). A full table culls a third of its rows, live
+# throttle buckets included, so MAX_ENTRIES is kept far above the default.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -133,8 +166,111 @@ STATICFILES_DIRS = [
 
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/patient/'
-LOGOUT_REDIRECT_URL = '/login/'git add -A
-
+LOGOUT_REDIRECT_URL = '/login/'
+
+# Admin appointment queues (keyset pagination)
+APPOINTMENT_PAGE_SIZE = 50
+APPOINTMENT_MAX_PAGE_SIZE = 200
+
+# Patient bills page
+BILLS_PAGE_SIZE = 20
+
+# Patient statistics (adminpanel.statistics)
+# Age ranges are inclusive; None leaves the upper end open.
+PATIENT_AGE_BUCKETS = [(0, 12), (13, 17), (18, 39), (40, 59), (60, None)]
+PATIENT_STATISTICS_CACHE_TIMEOUT = 300
+
+# Appointment slots (doctor.slots); at most 63 slots per day
+CLINIC_OPENING_TIME = '08:00'
+CLINIC_CLOSING_TIME = '20:00'
+APPOINTMENT_SLOT_MINUTES = 15
+
+# Rows fetched per round trip by the streaming exports (adminpanel.exports)
+EXPORT_CHUNK_SIZE = 2000
+
+# Hot/cold appointment archive (patient.archive): finished appointments
+# older than this many days move to the archive table, in chunks of
+# ARCHIVE_CHUNK_SIZE rows per transaction
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_CHUNK_SIZE = 500
+
+# Consultation note search (patient.search)
+SEARCH_RESULTS_LIMIT = 50
+
+# Live appointment queues over server-sent events (adminpanel.live).
+# ASGI streams stay open LIVE_STREAM_SECONDS; WSGI ones answer at once with
+# what is buffered and the browser polls again after LIVE_POLL_MS.
+LIVE_BUFFER_SIZE = 1000
+LIVE_STREAM_SECONDS = 300
+LIVE_POLL_MS = 5000
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_RETRY_MS = 1000
+
+# Sessions (adminpanel.sessions) are sliding, and an unchanged session is
+# written back at most once per SESSION_WRITE_INTERVAL seconds. They are
+# read through SESSION_CACHE_ALIAS only when that is a memory cache all
+# processes share (Redis / Memcached), otherwise from django_session.
+SESSION_ENGINE = 'adminpanel.sessions'
+SESSION_CACHE_ALIAS = 'shared'
+SESSION_SAVE_EVERY_REQUEST = True
+SESSION_WRITE_INTERVAL = 300
+# Expired sessions deleted per statement by `manage.py purge_sessions`
+SESSION_PURGE_BATCH_SIZE = 1000
+
+# Login throttle (adminpanel.throttle): (burst, attempts refilled per minute)
+# per client IP and per username, checked before any password is hashed.
+# The buckets must live in a cache all server processes share; with a
+# per-process cache every worker would allow the full rate on its own.
+LOGIN_THROTTLE_CACHE_ALIAS = 'shared'
+LOGIN_THROTTLE_RATES = {
+    'ip': (30, 30),
+    'username': (5, 5),
+}
 
- STRIPE_PUBLISHABLE_KEY = 'pk_test_51T3rtsQkNouGUxb2v4a0wAbZHQRX6R2HSnyXwpwikBy9usftyV5MOIKclvK5Jh6W8iAZzTiNidDEh5S0qXrVhGPa00uSGedPM6'
- STRIPE_SECRET_KEY = "sk_test_51T3rtsQkNouGUxb23IL3EuFzzcHGAlzXARkpzpkQDcbSrKgLH0noZYJ9jaMMZwJKdq5fM7C0KMmzoq2bf03Oxnk0003zbU3nWD"
+# Per-view request metrics (adminpanel.metrics); latency bucket bounds in seconds
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Bearer token for Prometheus scrapes of /adminpanel/metrics/prometheus/;
+# without it only a logged-in admin can read the endpoint
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# N+1 / query budget checks (adminpanel.querycheck): 'off', 'log' or 'raise'.
+# The test runner below always uses 'raise'.
+QUERY_CHECK = os.getenv('QUERY_CHECK', 'log' if DEBUG else 'off')
+QUERY_CHECK_REPEAT_THRESHOLD = 3
+# Most queries a request to these URL names may run (including the session,
+# the role version stamp and the role lookups of a first request)
+QUERY_BUDGETS = {
+    'patient_dashboard': 8,
+    'view_appointemnt': 8,
+    'view_bills': 10,
+    'view_medical_history': 8,
+    'doctor_dashboard': 8,
+    'appoinment_history': 11,
+    'billing_dashboard': 10,
+    'patient_statistics': 17,  # a miss also writes the shared cache
+    'search_records': 10,  # one FTS query per index, live and archive
+}
+TEST_RUNNER = 'adminpanel.querycheck.QueryCheckRunner'
+
+# Doctor directory (doctor.directory). Entries are versioned by a stamp in
+# the 'shared' cache and kept per process, so this only bounds how long an
+# orphaned version lingers.
+DOCTOR_DIRECTORY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+STRIPE_PUBLISHABLE_KEY = 'pk_test_51T3rtsQkNouGUxb2v4a0wAbZHQRX6R2HSnyXwpwikBy9usftyV5MOIKclvK5Jh6W8iAZzTiNidDEh5S0qXrVhGPa00uSGedPM6'
+STRIPE_SECRET_KEY = "sk_test_51T3rtsQkNouGUxb23IL3EuFzzcHGAlzXARkpzpkQDcbSrKgLH0noZYJ9jaMMZwJKdq5fM7C0KMmzoq2bf03Oxnk0003zbU3nWD"
+
+# Stripe gateway (patient.payments)
+# Point STRIPE_API_BASE at `manage.py fake_stripe` to load-test offline.
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
+STRIPE_POOL_SIZE = 20
+STRIPE_CONNECT_TIMEOUT = 3
+STRIPE_READ_TIMEOUT = 10
+STRIPE_MAX_NETWORK_RETRIES = 2
+STRIPE_CHECKOUT_TTL = 1800
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+# Seconds of clock skew tolerated on a webhook signature
+STRIPE_WEBHOOK_TOLERANCE = 300
+# Inbox events applied per transaction by `manage.py process_stripe_events`
+STRIPE_INBOX_BATCH_SIZE = 500
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AdminpanelConfig(AppConfig):
     name = 'adminpanel'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .tracing import install
+        connection_created.connect(install, dispatch_uid='adminpanel.tracing')
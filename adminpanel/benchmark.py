@@ -0,0 +1,386 @@
+"""
+Drive every named URL through the test client and measure it
+(`manage.py run_benchmarks`).
+
+Each GET route is requested as the role that owns it: admin pages as
+a superuser, /doctor/ pages as a doctor, /patient/ pages as the patient
+with the most appointments. Routes whose GET changes data, or that only
+accept a signed POST, are reported as skipped instead of being run.
+
+load() compares throughput under concurrent requests through the two
+deployment paths: Django's WSGI handler (E_hospitality/wsgi.py) driven
+from a pool of threads, as a threaded WSGI server would, and its ASGI
+handler (E_hospitality/asgi.py) driven from one event loop.
+"""
+import asyncio
+import math
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import time
+from io import BytesIO
+from threading import Lock
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from doctor.directory import DoctorEntry, directory_from
+from patient.models import Appointment
+from . import live, synthetic, views
+from .tracing import tracing
+
+
+SKIPPED = {
+    'patient_logout': "ends the session",
+    'logout': "ends the session",
+    'doctor_logout': "ends the session",
+    'admin_logout': "ends the session",
+    'complete_appointment': "GET completes the appointment",
+    'reject_doctor_appointment': "POST only",
+    'patient_delete': "GET deletes the patient",
+    'doctor_delete': "GET deletes the doctor",
+    'stripe_webhook': "POST only, signed by Stripe",
+    'doctor_queue_events': "long-lived event stream",
+    'appointment_queue_events': "long-lived event stream",
+}
+ANONYMOUS = {
+    'root_redirect', 'patient_login', 'login', 'register',
+    'doctor_login', 'doctor_register', 'admin_login',
+}
+ROLE_BY_PREFIX = {'adminpanel/': 'admin', 'doctor/': 'doctor', 'patient/': 'patient'}
+# URL arguments that are not an appointment id
+FIXED_KWARGS = {'export_data': {'dataset': 'appointments'}}
+# the async dashboards, compared under load by default
+LOAD_ROUTES = ['billing_dashboard', 'patient_statistics']
+
+
+@dataclass
+class Result:
+    url: str
+    status: int
+    p50_ms: float
+    p99_ms: float
+    queries: int
+    peak_kb: float
+
+
+def routes(patterns=None, prefix=''):
+    """[(url name, route prefix, path converter names)] for every named project URL."""
+    found = []
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.app_name == 'admin':
+                continue  # django.contrib.admin
+            found += routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif pattern.name:
+            found.append((pattern.name, prefix, list(pattern.pattern.converters)))
+    return found
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Actors:
+    """The users the benchmark logs in as, and sample objects for URL arguments."""
+
+    def __init__(self):
+        self.admin = User.objects.filter(is_superuser=True).first() or \
+            User.objects.create_superuser(username='bench-admin', password='bench-admin')
+        busiest = (
+            Appointment.objects.values('patient_id')
+            .annotate(n=Count('id')).order_by('-n').first()
+        )
+        self.patient = User.objects.get(pk=busiest['patient_id']) if busiest else \
+            User.objects.create_user(username='bench-patient')
+        self.doctor = User.objects.filter(groups__name='Doctor').first()
+
+        self.bill = Appointment.objects.filter(patient=self.patient, status='Completed').first()
+        self.approved = Appointment.objects.filter(doctor=self.doctor, status='Approved').first()
+        self.any = Appointment.objects.order_by('-id').first()
+
+        # a view that raises is reported with its 500, not allowed to stop the run
+        self.clients = {None: Client(raise_request_exception=False)}
+        for role, user in [('admin', self.admin), ('patient', self.patient), ('doctor', self.doctor)]:
+            client = Client(raise_request_exception=False)
+            if user:
+                client.force_login(user)
+            self.clients[role] = client
+
+    def role(self, name, prefix):
+        if name in ANONYMOUS:
+            return None
+        return ROLE_BY_PREFIX.get(prefix)
+
+    def sample(self, name):
+        return {
+            'pay_bill': self.bill,
+            'payment_success': self.bill,
+            'complete_consultation': self.approved,
+        }.get(name, self.any)
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.queries = 0
+        self._lock = Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def fetch(client, url):
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:  # the rows are read here
+            pass
+    return response
+
+
+def measure(client, url, repeat):
+    fetch(client, url)  # warm caches, sessions and the role lookup
+    latencies = []
+    for _ in range(repeat):
+        # counted through adminpanel.tracing: async views query from worker threads
+        counter = QueryCounter()
+        with tracing(counter):
+            started = perf_counter()
+            response = fetch(client, url)
+            latencies.append(perf_counter() - started)
+        queries = counter.queries
+
+    # a separate run: tracemalloc slows the request down
+    tracemalloc.start()
+    fetch(client, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(
+        url=url,
+        status=response.status_code,
+        p50_ms=round(percentile(latencies, 0.5) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        queries=queries,
+        peak_kb=round(peak / 1024, 1),
+    )
+
+
+def run(repeat=20, only=None):
+    """({url name: Result as dict}, {url name: reason skipped})."""
+    actors = Actors()
+    results, skipped = {}, {}
+    for name, prefix, params in routes():
+        if only and name not in only:
+            continue
+        if name in SKIPPED:
+            skipped[name] = SKIPPED[name]
+            continue
+        kwargs = FIXED_KWARGS.get(name)
+        if kwargs is None:
+            sample = actors.sample(name)
+            if params and sample is None:
+                skipped[name] = "no appointment to pass as its argument"
+                continue
+            kwargs = {param: sample.pk for param in params}
+        url = reverse(name, kwargs=kwargs)
+        results[name] = asdict(measure(actors.clients[actors.role(name, prefix)], url, repeat))
+    return results, skipped
+
+
+@dataclass
+class LoadResult:
+    requests_per_second: float
+    p50_ms: float
+    p99_ms: float
+    errors: int
+
+
+def _wsgi_get(app, url, cookie):
+    """GET `url` through a WSGI application; the status code."""
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query,
+        'SCRIPT_NAME': '', 'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+        'wsgi.errors': BytesIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    body = app(environ, lambda line, headers, exc_info=None: status.append(line))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()  # sends request_finished, which closes the thread's connection
+    return int(status[0].split()[0])
+
+
+async def _asgi_get(app, url, cookie):
+    """GET `url` through an ASGI application; the status code."""
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': parts.path, 'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    received = False
+    disconnected = asyncio.Event()  # never set: the client stays connected
+
+    async def receive():
+        nonlocal received
+        if received:
+            await disconnected.wait()
+        received = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    status = []
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+def _load_result(latencies, statuses, elapsed):
+    return LoadResult(
+        requests_per_second=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 0.5) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        errors=sum(status >= 400 for status in statuses),
+    )
+
+
+def wsgi_load(url, cookie, concurrency, requests):
+    app = WSGIHandler()
+
+    def timed(_):
+        started = perf_counter()
+        status = _wsgi_get(app, url, cookie)
+        return perf_counter() - started, status
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies, statuses = zip(*pool.map(timed, range(requests)))
+    return _load_result(latencies, statuses, perf_counter() - started)
+
+
+def asgi_load(url, cookie, concurrency, requests):
+    app = ASGIHandler()
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed():
+            async with slots:
+                started = perf_counter()
+                status = await _asgi_get(app, url, cookie)
+                return perf_counter() - started, status
+
+        started = perf_counter()
+        results = await asyncio.gather(*(timed() for _ in range(requests)))
+        latencies, statuses = zip(*results)
+        return _load_result(latencies, statuses, perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def load(names=None, concurrency=16, requests=200):
+    """
+    {url name: {'wsgi': LoadResult as dict, 'asgi': ...}} for `requests`
+    admin GETs per route, `concurrency` of them in flight at a time.
+    """
+    client = Actors().clients['admin']
+    cookie = '; '.join(f'{key}={morsel.value}' for key, morsel in client.cookies.items())
+    results = {}
+    # measure the aggregates, not the cache in front of them
+    with override_settings(PATIENT_STATISTICS_CACHE_TIMEOUT=0):
+        for name in names or LOAD_ROUTES:
+            url = reverse(name)
+            _wsgi_get(WSGIHandler(), url, cookie)  # warm up
+            results[name] = {
+                'wsgi': asdict(wsgi_load(url, cookie, concurrency, requests)),
+                'asgi': asdict(asgi_load(url, cookie, concurrency, requests)),
+            }
+    return results
+
+
+def queue_page(rows, doctors, departments):
+    """appoinment_request's template and context for made-up rows and roster (no database)."""
+    specializations = synthetic.SPECIALIZATIONS[:departments]
+    directory = directory_from(sorted(
+        (
+            DoctorEntry(
+                id=index, user_id=index, username=f'doctor{index}', full_name=f'Doctor {index:04d}',
+                specialization=specializations[index % departments],
+                working_from=time(9, 0), working_to=time(17, 0),
+            )
+            for index in range(1, doctors + 1)
+        ),
+        key=lambda entry: (entry.specialization, entry.full_name),
+    ))
+    created = timezone.now()
+    appointments = [
+        Appointment(
+            id=index, patient=User(id=index, username=f'patient{index}'), status='Pending',
+            doctor_type=specializations[index % departments], appointment_date=created.date(),
+            appointment_time=time(9, 0), created_at=created,
+        )
+        for index in range(1, rows + 1)
+    ]
+    request = RequestFactory().get(reverse('appoinment_request'))
+    request.user = AnonymousUser()
+    context = {
+        'appointments': appointments,
+        'next_cursor': None,
+        'filter_query': '',
+        'filters': {},
+        'page_size': rows,
+        'live_after': live.current_id(),
+        **views.doctor_picker(directory),
+    }
+    return request, context
+
+
+def render_queue(rows, doctors, departments=5, repeat=5):
+    """(median ms, page bytes) to render appoinment_request.html for `rows` rows and `doctors` doctors."""
+    request, context = queue_page(rows, doctors, departments)
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        html = render_to_string('appoinment_request.html', context, request)
+        timings.append(perf_counter() - started)
+    return round(percentile(timings, 0.5) * 1000, 2), len(html.encode())
+
+
+def compare(baseline, current, tolerance):
+    """Lines describing every route that got slower or runs more queries."""
+    regressions = []
+    for scale, data in current['scales'].items():
+        before = baseline.get('scales', {}).get(scale, {}).get('routes', {})
+        for name, result in data['routes'].items():
+            old = before.get(name)
+            if not old:
+                continue
+            if result['queries'] > old['queries']:
+                regressions.append(f"{scale} {name}: {old['queries']} -> {result['queries']} queries")
+            if result['p50_ms'] > old['p50_ms'] * (1 + tolerance) and result['p50_ms'] - old['p50_ms'] > 1:
+                regressions.append(f"{scale} {name}: p50 {old['p50_ms']} -> {result['p50_ms']} ms")
+    return regressions
@@ -0,0 +1,188 @@
+"""
+Live appointment queues over server-sent events.
+
+Appointment write paths call changed(ids). Once their transaction
+commits, the ids go into an in-process ring buffer (bus) under the next
+sequence number, and every waiting stream is woken. A stream re-reads
+only those ids through its own queue query. Each row that belongs on
+the page is sent as rendered HTML; every other id is sent as a removal.
+A page that is left open costs nothing until something on it changes.
+
+Under ASGI a response stays open for LIVE_STREAM_SECONDS, with a comment
+line every LIVE_HEARTBEAT_SECONDS, and the browser then reconnects.
+Under WSGI nothing waits: a response carries whatever is already
+buffered after the page's position (or only the new position) and ends
+at once, with a retry of LIVE_POLL_MS. EventSource reconnects after
+that, so the same page polls every few seconds and a worker thread is
+only busy for as long as the rows take to render.
+
+The bus lives in one process. Run one server process (the ASGI server
+handles the concurrency), otherwise a page only hears about writes made
+by the process that serves its stream. Event ids carry the process's
+boot id. A stream that resumes from another boot, or from a sequence
+that has already left the buffer, is told to reload the page.
+"""
+import asyncio
+import json
+from collections import deque
+from functools import partial
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+
+BOOT = uuid4().hex[:8]
+
+
+class Bus:
+    """Sequence-numbered batches of changed appointment ids, newest LIVE_BUFFER_SIZE kept."""
+
+    def __init__(self, size):
+        self._lock = Lock()
+        self._batches = deque(maxlen=size)
+        self._waiters = set()
+        self.last = 0
+
+    def publish(self, ids):
+        with self._lock:
+            self.last += 1
+            self._batches.append((self.last, frozenset(ids)))
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # that stream's loop has already closed
+
+    def since(self, seq):
+        """
+        (ids changed after `seq`, latest seq); ids is None when `seq` is
+        no longer covered by the buffer and the page has to reload.
+        """
+        with self._lock:
+            oldest = self._batches[0][0] if self._batches else self.last + 1
+            if seq > self.last or seq < oldest - 1:
+                return None, self.last
+            ids = set()
+            for number, batch in self._batches:
+                if number > seq:
+                    ids |= batch
+            return ids, self.last
+
+    async def wait(self, seq, timeout):
+        """Return once something is published after `seq`, or after `timeout` seconds."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self.last > seq:
+                return
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+bus = Bus(settings.LIVE_BUFFER_SIZE)
+
+
+def changed(ids):
+    """Announce that the appointments `ids` changed, once the current transaction commits."""
+    ids = frozenset(ids)
+    if ids:
+        transaction.on_commit(partial(bus.publish, ids))
+
+
+def event_id(seq):
+    return f"{BOOT}:{seq}"
+
+
+def current_id():
+    """Where a page rendered now should start listening from."""
+    return event_id(bus.last)
+
+
+def parse_event_id(value):
+    """The sequence number in an event id from this boot, or None."""
+    boot, _, seq = (value or '').partition(':')
+    if boot != BOOT or not seq.isdigit():
+        return None
+    return int(seq)
+
+
+def _message(event, data, seq=None):
+    lines = [f"event: {event}"]
+    if seq is not None:
+        lines.append(f"id: {event_id(seq)}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _events(render_rows, seq, keep_open):
+    yield f"retry: {settings.LIVE_RETRY_MS if keep_open else settings.LIVE_POLL_MS}\n\n"
+    if seq is None:
+        yield _message('reset', {})
+        return
+
+    deadline = monotonic() + settings.LIVE_STREAM_SECONDS
+    while True:
+        ids, latest = bus.since(seq)
+        if ids is None:
+            yield _message('reset', {})
+            return
+        if ids:
+            rows = await sync_to_async(render_rows)(ids)
+            for appointment_id in sorted(ids):
+                if appointment_id in rows:
+                    yield _message('row', {'id': appointment_id, 'html': rows[appointment_id]}, latest)
+                else:
+                    yield _message('remove', {'id': appointment_id}, latest)
+        if not keep_open:
+            if not ids:
+                yield f"id: {event_id(latest)}\n\n"  # so the next poll starts from here
+            return
+        seq = latest
+
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return
+        await bus.wait(seq, min(settings.LIVE_HEARTBEAT_SECONDS, remaining))
+        if bus.last == seq:
+            yield ": keep-alive\n\n"
+
+
+async def _drain(events):
+    return [chunk async for chunk in events]
+
+
+def _blocking(events):
+    # WSGI: the events never wait, so run them here rather than have Django warn about it
+    yield from async_to_sync(_drain)(events)
+
+
+def stream(request, render_rows):
+    """
+    The SSE response for one live queue. `render_rows(ids)` (sync, may
+    query) returns {id: row html} for the ids that belong in the queue.
+    Resumes from the Last-Event-ID header or, on the first connection,
+    from ?after=, the current_id() the page was rendered with.
+    """
+    resume = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    seq = parse_event_id(resume) if resume else bus.last
+    keep_open = isinstance(request, ASGIRequest)
+    events = _events(render_rows, seq, keep_open)
+    response = StreamingHttpResponse(
+        events if keep_open else _blocking(events),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from holding the events back
+    return response
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from adminpanel.scheduler import auto_assign
+
+
+class Command(BaseCommand):
+    help = "Assign every Pending appointment to a free doctor of its department"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Plan the assignments without writing them",
+        )
+
+    def handle(self, *args, **options):
+        result = auto_assign(dry_run=options['dry_run'])
+        verb = "Would assign" if options['dry_run'] else "Assigned"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result.assigned)} appointments; "
+            f"{len(result.unassigned)} left Pending (no free doctor)"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from adminpanel import synthetic
+
+
+class Command(BaseCommand):
+    help = "Bulk-create synthetic patients, doctors and appointments for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=365, help="Spread appointments over this many past days")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows per INSERT batch")
+        parser.add_argument('--prefix', default='synth', help="Username prefix of the generated users")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        chunk_size, prefix, seed = options['chunk_size'], options['prefix'], options['seed']
+        doctors = synthetic.create_doctors(options['doctors'], prefix, chunk_size, seed)
+        patients = synthetic.create_patients(options['patients'], prefix, chunk_size, seed)
+        self.stdout.write(f"Created {doctors} doctors and {patients} patients")
+
+        total = options['appointments']
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{total} appointments", ending='\r')
+            self.stdout.flush()
+
+        synthetic.create_appointments(
+            total, days=options['days'], chunk_size=chunk_size, seed=seed, progress=progress
+        )
+        self.stdout.write('')
+        synthetic.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {total} appointments; balances, revenue rollup and slot bitmaps rebuilt"
+        ))
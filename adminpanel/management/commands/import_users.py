@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from adminpanel import onboarding
+
+
+class Command(BaseCommand):
+    help = "Import patient or doctor accounts from a CSV or NDJSON file; safe to re-run after a failure"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--role', choices=onboarding.ROLES, required=True)
+        parser.add_argument('--format', choices=onboarding.FORMATS, help="Default: from the file extension")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Accounts per transaction")
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help="Password hashing processes (default: one per CPU; 0 hashes in this process)",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or onboarding.guess_format(path)
+
+        def progress(result):
+            self.stdout.write(f"  {result.created} created, {result.skipped} skipped", ending='\r')
+            self.stdout.flush()
+
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = onboarding.import_users(
+                    onboarding.read_rows(stream, fmt), options['role'],
+                    chunk_size=options['chunk_size'], workers=options['workers'], progress=progress,
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write('')
+        for number, message in result.invalid:
+            self.stderr.write(f"line {number}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} {options['role']}s; {result.skipped} already existed, "
+            f"{len(result.invalid)} invalid"
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from adminpanel.sessions import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_PURGE_BATCH_SIZE)
+        parser.add_argument(
+            '--every',
+            type=float,
+            help="Keep purging every N seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired sessions"))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from adminpanel import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the billing dashboard revenue rollup from patient.Appointment"
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Revenue rollup rebuilt: {count} rows"))
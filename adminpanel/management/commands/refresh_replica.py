@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from adminpanel.replica import refresh
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the reporting replica"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=float,
+            help="Keep refreshing every N seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            refresh()
+            self.stdout.write(self.style.SUCCESS(
+                f"Replica refreshed in {time.monotonic() - started:.2f}s"
+            ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,124 @@
+import json
+import platform
+import tempfile
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from adminpanel import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every URL against throwaway databases of growing size; "
+        "save the results as a JSON baseline and compare against an older one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            default='1000,10000,100000',
+            help="Comma-separated appointment counts; the database is topped up from one to the next",
+        )
+        parser.add_argument('--patients-per-scale', type=float, default=0.05,
+                            help="Patients per appointment (default: one per 20)")
+        parser.add_argument('--appointments-per-doctor', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed requests per URL")
+        parser.add_argument('--only', nargs='*', help="Only these URL names")
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help="Requests in flight for the WSGI / ASGI load comparison (0 skips it)")
+        parser.add_argument('--load-requests', type=int, default=200, help="Requests per route under load")
+        parser.add_argument('--load-routes', nargs='*',
+                            help=f"URL names to load (default: {' '.join(benchmark.LOAD_ROUTES)})")
+        parser.add_argument('--output', help="Baseline JSON to write (default: benchmarks/<timestamp>.json)")
+        parser.add_argument('--compare', help="Baseline JSON to compare against")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed p50 slowdown before it counts as a regression")
+
+    def handle(self, *args, **options):
+        scales = sorted(int(scale) for scale in options['scales'].split(','))
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'scales': {},
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # an on-disk SQLite file, like production, not the in-memory test default
+            connections['default'].settings_dict['TEST']['NAME'] = str(Path(tmp) / 'bench.sqlite3')
+            runner = DiscoverRunner(verbosity=0, interactive=False)
+            runner.setup_test_environment()
+            databases = runner.setup_databases()
+            try:
+                with override_settings(QUERY_CHECK='off'):
+                    report['scales'] = self.run_scales(scales, options)
+            finally:
+                runner.teardown_databases(databases)
+                runner.teardown_test_environment()
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' /
+                      f"{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Baseline written to {output}"))
+
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+            regressions = benchmark.compare(baseline, report, options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against {}:\n  {}".format(
+                    options['compare'], '\n  '.join(regressions)))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def run_scales(self, scales, options):
+        results = {}
+        loaded = patients = doctors = 0
+        for scale in scales:
+            want_doctors = max(len(synthetic.SPECIALIZATIONS), scale // options['appointments_per_doctor'])
+            want_patients = max(1, int(scale * options['patients_per_scale']))
+            if want_doctors > doctors:
+                doctors += synthetic.create_doctors(want_doctors - doctors)
+            if want_patients > patients:
+                patients += synthetic.create_patients(want_patients - patients)
+            loaded += synthetic.create_appointments(scale - loaded)
+            synthetic.finish()
+
+            routes, skipped = benchmark.run(options['repeat'], options['only'])
+            results[str(scale)] = {
+                'rows': {'appointments': loaded, 'patients': patients, 'doctors': doctors},
+                'routes': routes,
+                'skipped': skipped,
+            }
+            self.print_scale(scale, routes)
+
+            if options['concurrency']:
+                load = benchmark.load(options['load_routes'], options['concurrency'], options['load_requests'])
+                results[str(scale)]['load'] = load
+                self.print_load(options['concurrency'], load)
+        return results
+
+    def print_scale(self, scale, routes):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{scale} appointments"))
+        self.stdout.write(f"{'URL name':<26}{'status':>7}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KB':>10}")
+        for name, result in routes.items():
+            self.stdout.write(
+                f"{name:<26}{result['status']:>7}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+                f"{result['queries']:>9}{result['peak_kb']:>10}"
+            )
+
+    def print_load(self, concurrency, load):
+        self.stdout.write(f"\n{concurrency} concurrent requests")
+        self.stdout.write(f"{'URL name':<26}{'server':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>9}")
+        for name, servers in load.items():
+            for server, result in servers.items():
+                self.stdout.write(
+                    f"{name:<26}{server:>7}{result['requests_per_second']:>10}{result['p50_ms']:>10}"
+                    f"{result['p99_ms']:>10}{result['errors']:>9}"
+                )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from adminpanel import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering the appointment request queue for growing numbers of rows "
+        "and doctors (no database); the cost should follow the rows only"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='500,1000,2000', help="Comma-separated pending row counts")
+        parser.add_argument('--doctors', default='10,50,150', help="Comma-separated roster sizes")
+        parser.add_argument('--departments', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5, help="Renders per combination")
+
+    def handle(self, *args, **options):
+        rows = [int(value) for value in options['rows'].split(',')]
+        doctors = [int(value) for value in options['doctors'].split(',')]
+
+        setup_test_environment()  # the testserver host for the request the page is rendered for
+        try:
+            self.stdout.write(f"{'rows':>6}{'doctors':>9}{'ms':>10}{'ms/row':>9}{'KB':>10}{'bytes/row':>11}")
+            for row_count in rows:
+                for doctor_count in doctors:
+                    ms, size = benchmark.render_queue(row_count, doctor_count, options['departments'], options['repeat'])
+                    self.stdout.write(
+                        f"{row_count:>6}{doctor_count:>9}{ms:>10}{ms / row_count:>9.3f}"
+                        f"{size / 1024:>10.0f}{size // row_count:>11}"
+                    )
+        finally:
+            teardown_test_environment()
+        self.stdout.write(self.style.SUCCESS("Done"))
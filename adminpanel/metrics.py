@@ -0,0 +1,153 @@
+"""
+Per-view request metrics, kept in this process.
+
+Each thread writes only to its own shard (a plain dict), so recording a
+request takes no lock; snapshot() sums the shards when the metrics page
+or the Prometheus endpoint is read. Every worker process keeps its own
+counters, and counts only grow until the process exits.
+"""
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+
+# Row layout of a shard entry: four counters, then one slot per bucket + overflow
+COUNT, LATENCY, QUERIES, SQL_TIME = range(4)
+FIRST_BUCKET = 4
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()  # only taken the first time a thread records
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append(shard)
+        return shard
+
+
+def record(view, seconds, queries, sql_seconds):
+    shard = _shard()
+    row = shard.get(view)
+    if row is None:
+        row = shard[view] = [0, 0.0, 0, 0.0] + [0] * (len(settings.METRICS_LATENCY_BUCKETS) + 1)
+    row[COUNT] += 1
+    row[LATENCY] += seconds
+    row[QUERIES] += queries
+    row[SQL_TIME] += sql_seconds
+    row[FIRST_BUCKET + bisect_left(settings.METRICS_LATENCY_BUCKETS, seconds)] += 1
+
+
+@dataclass
+class ViewMetrics:
+    view: str
+    count: int = 0
+    latency: float = 0.0
+    queries: int = 0
+    sql_time: float = 0.0
+    # per bucket of settings.METRICS_LATENCY_BUCKETS, then > the last bound
+    buckets: list = field(default_factory=list)
+
+    def cumulative(self):
+        """[(upper bound, requests at or under it)], ending with +Inf."""
+        bounds = list(settings.METRICS_LATENCY_BUCKETS) + [float('inf')]
+        total, result = 0, []
+        for bound, count in zip(bounds, self.buckets):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th request (None if above every bucket)."""
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return None if bound == float('inf') else bound
+        return None
+
+    @property
+    def quantile_50(self):
+        return self.quantile(0.5)
+
+    @property
+    def quantile_95(self):
+        return self.quantile(0.95)
+
+    @property
+    def avg_ms(self):
+        return self.latency * 1000 / self.count if self.count else 0
+
+    @property
+    def avg_queries(self):
+        return self.queries / self.count if self.count else 0
+
+    @property
+    def avg_sql_ms(self):
+        return self.sql_time * 1000 / self.count if self.count else 0
+
+
+def snapshot():
+    """Totals across every thread, as {view: ViewMetrics}."""
+    with _shards_lock:
+        shards = list(_shards)
+
+    views = {}
+    for shard in shards:
+        for view, row in list(shard.items()):
+            row = list(row)
+            metrics = views.get(view)
+            if metrics is None:
+                metrics = views[view] = ViewMetrics(view, buckets=[0] * (len(row) - FIRST_BUCKET))
+            metrics.count += row[COUNT]
+            metrics.latency += row[LATENCY]
+            metrics.queries += row[QUERIES]
+            metrics.sql_time += row[SQL_TIME]
+            for index, count in enumerate(row[FIRST_BUCKET:]):
+                metrics.buckets[index] += count
+    return dict(sorted(views.items()))
+
+
+def reset():
+    with _shards_lock:
+        for shard in _shards:
+            shard.clear()
+
+
+def _label(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _bound(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+def prometheus_text():
+    """The snapshot in Prometheus text exposition format (0.0.4)."""
+    metrics = snapshot().values()
+    lines = [
+        '# HELP ehospitality_http_request_duration_seconds Request latency by URL name.',
+        '# TYPE ehospitality_http_request_duration_seconds histogram',
+    ]
+    for view in metrics:
+        name = _label(view.view)
+        for bound, total in view.cumulative():
+            lines.append(f'ehospitality_http_request_duration_seconds_bucket{{view="{name}",le="{_bound(bound)}"}} {total}')
+        lines.append(f'ehospitality_http_request_duration_seconds_sum{{view="{name}"}} {view.latency!r}')
+        lines.append(f'ehospitality_http_request_duration_seconds_count{{view="{name}"}} {view.count}')
+
+    lines += [
+        '# HELP ehospitality_sql_queries_total SQL queries run by requests, by URL name.',
+        '# TYPE ehospitality_sql_queries_total counter',
+    ]
+    lines += [f'ehospitality_sql_queries_total{{view="{_label(v.view)}"}} {v.queries}' for v in metrics]
+    lines += [
+        '# HELP ehospitality_sql_duration_seconds_total Time spent in SQL, by URL name.',
+        '# TYPE ehospitality_sql_duration_seconds_total counter',
+    ]
+    lines += [f'ehospitality_sql_duration_seconds_total{{view="{_label(v.view)}"}} {v.sql_time!r}' for v in metrics]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,68 @@
+from threading import Lock
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+from .tracing import tracing
+
+
+UNMATCHED = '<unmatched>'
+
+
+class _QueryTimer:
+    """SQL wrapper that counts and times the request's queries (from any thread)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self._lock = Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            with self._lock:
+                self.seconds += elapsed
+                self.queries += 1
+
+
+class MetricsMiddleware:
+    """Record latency and SQL per URL name into adminpanel.metrics."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        started = perf_counter()
+        with tracing(timer):
+            response = self.get_response(request)
+        self.record(request, started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        started = perf_counter()
+        with tracing(timer):
+            response = await self.get_response(request)
+        self.record(request, started, timer)
+        return response
+
+    def record(self, request, started, timer):
+        match = getattr(request, 'resolver_match', None)
+        metrics.record(
+            (match and match.url_name) or UNMATCHED,
+            perf_counter() - started,
+            timer.queries,
+            timer.seconds,
+        )
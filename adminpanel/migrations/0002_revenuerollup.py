@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    Appointment = apps.get_model('patient', 'Appointment')
+    RevenueRollup = apps.get_model('adminpanel', 'RevenueRollup')
+
+    paid = Q(payment_status='Paid')
+    rows = (
+        Appointment.objects.filter(status='Completed')
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'doctor_type', 'doctor_id')
+        .annotate(
+            completed_count=Count('id'),
+            paid_count=Count('id', filter=paid),
+            revenue=Sum('bill_amount'),
+            paid_revenue=Sum('bill_amount', filter=paid),
+        )
+        .order_by()
+    )
+    RevenueRollup.objects.bulk_create(
+        (
+            RevenueRollup(
+                day=row['day'],
+                department=row['doctor_type'],
+                doctor_id=row['doctor_id'],
+                completed_count=row['completed_count'],
+                paid_count=row['paid_count'],
+                revenue=row['revenue'] or 0,
+                paid_revenue=row['paid_revenue'] or 0,
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adminpanel', '0001_initial'),
+        ('patient', '0006_appointment_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('department', models.CharField(max_length=100)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revenue_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('day', 'department', 'doctor')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 21:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+COUNTERS = ('completed_count', 'paid_count', 'revenue', 'paid_revenue')
+
+
+def merge_unassigned_rows(apps, schema_editor):
+    # deleted doctors' rows were set to NULL next to existing NULL rows
+    RevenueRollup = apps.get_model('adminpanel', 'RevenueRollup')
+
+    duplicated = (
+        RevenueRollup.objects.filter(doctor__isnull=True)
+        .values('day', 'department')
+        .annotate(rows=Count('id'), **{name: Sum(name) for name in COUNTERS})
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicated:
+        rows = RevenueRollup.objects.filter(doctor__isnull=True, day=row['day'], department=row['department'])
+        keep = rows.order_by('id').first()
+        rows.exclude(pk=keep.pk).delete()
+        rows.filter(pk=keep.pk).update(**{name: row[name] for name in COUNTERS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adminpanel', '0002_revenuerollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_unassigned_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('doctor__isnull', True)), fields=('day', 'department'), name='rollup_unassigned_unique'),
+        ),
+    ]
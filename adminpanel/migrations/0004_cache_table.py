@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-19 09:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # the 'shared' cache falls back to the database cache table without
+    # REDIS_URL; createcachetable skips tables that already exist
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adminpanel', '0003_revenuerollup_unassigned_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -43,4 +43,42 @@ class PatientProfile(models.Model):
     category = models.CharField(max_length=50)
 
     def __str__(self):
-        return self.user.username
\ No newline at end of file
+        return self.user.username
+
+# =========================================================
+# REVENUE ROLLUP (billing dashboard)
+# =========================================================
+
+class RevenueRollup(models.Model):
+    """
+    Completed-appointment revenue per day, department and doctor.
+    Kept in step with patient.Appointment by adminpanel.signals; rebuild
+    with `manage.py rebuild_revenue_rollup`.
+    """
+    day = models.DateField()
+    department = models.CharField(max_length=100)
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='revenue_rollups'
+    )
+    completed_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'department', 'doctor')
+        constraints = [
+            # unique_together lets NULLs repeat; one unassigned row per day and department
+            models.UniqueConstraint(
+                fields=['day', 'department'],
+                condition=models.Q(doctor__isnull=True),
+                name='rollup_unassigned_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.department} - {self.revenue}"
@@ -0,0 +1,214 @@
+"""
+Bulk account import for onboarding a partner clinic
+(`manage.py import_users patients.csv --role patient`).
+
+Rows are read from CSV (with a header row) or NDJSON, in chunks of
+`chunk_size`. Passwords are hashed in a process pool. While one chunk is
+inserted, the pool is already hashing the next. Each chunk's users,
+profiles and Doctor group memberships are written with bulk_create in
+one transaction.
+
+An import can be re-run after a failure. Usernames that already exist
+are skipped before their passwords are hashed, and a chunk that failed
+was rolled back as a whole, so a second run only creates what is
+missing. bulk_create skips the model signals, so the doctor directory
+and patient statistics caches are dropped at the end instead.
+"""
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from doctor.directory import invalidate_directory
+from doctor.models import DoctorProfile
+from patient.models import PatientProfile
+from .statistics import invalidate_patient_statistics
+
+
+ROLES = ('patient', 'doctor')
+FORMATS = ('csv', 'ndjson')
+CATEGORIES = {value for value, _ in PatientProfile.CATEGORY_CHOICES}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0  # usernames that already exist, or repeat earlier in the file
+    # (line number, message) for rows that were not imported
+    invalid: list = field(default_factory=list)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_rows(stream, fmt):
+    """(line number, dict) for each record of an open text file; None for a line that is not JSON."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError:
+                yield number, None
+
+
+def _text(row, name, required=True):
+    value = str(row.get(name) or '').strip()
+    if required and not value:
+        raise ValueError(f"missing {name}")
+    return value
+
+
+def _time(value, default):
+    return time.fromisoformat(value) if value else default
+
+
+def _patient_profile(row):
+    age = _text(row, 'age')
+    if not age.isdigit():
+        raise ValueError("age must be a whole number")
+    category = _text(row, 'category')
+    if category not in CATEGORIES:
+        raise ValueError(f"category must be one of {', '.join(sorted(CATEGORIES))}")
+    return PatientProfile(
+        full_name=_text(row, 'full_name'),
+        age=int(age),
+        gender=_text(row, 'gender'),
+        place=_text(row, 'place'),
+        category=category,
+    )
+
+
+def _doctor_profile(row):
+    fields = DoctorProfile._meta
+    return DoctorProfile(
+        full_name=_text(row, 'full_name', required=False) or _text(row, 'username'),
+        specialization=_text(row, 'specialization'),
+        working_from=_time(_text(row, 'working_from', required=False), fields.get_field('working_from').default),
+        working_to=_time(_text(row, 'working_to', required=False), fields.get_field('working_to').default),
+    )
+
+
+def _parse(role, row):
+    """(username, password, unsaved profile) or raises ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError("not an object")
+    username = _text(row, 'username')
+    try:
+        User.username_validator(username)
+    except ValidationError as exc:
+        raise ValueError(exc.messages[0]) from exc
+    profile = (_patient_profile if role == 'patient' else _doctor_profile)(row)
+    return username, row.get('password') or None, profile
+
+
+def _init_worker():
+    import django
+    django.setup()  # a spawned worker starts without settings
+
+
+class _Hasher:
+    """make_password over a process pool, or in this process when workers is 0."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker) if workers else None
+
+    def submit(self, passwords):
+        """An iterator of hashes, already being computed when the pool is used."""
+        if self.pool is None:
+            return map(make_password, passwords)
+        return self.pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4)))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+def _insert(role, group, pending, hashes):
+    users = [User(username=username, password=password) for (username, _, _), password in zip(pending, hashes)]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        profiles = []
+        for user, (_, _, profile) in zip(users, pending):
+            profile.user = user
+            profiles.append(profile)
+        if role == 'doctor':
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=user.pk, group_id=group.pk) for user in users]
+            )
+            DoctorProfile.objects.bulk_create(profiles)
+        else:
+            PatientProfile.objects.bulk_create(profiles)
+    return len(users)
+
+
+def import_users(rows, role, chunk_size=1000, workers=None, progress=None):
+    """
+    Create the accounts described by `rows` ((line number, dict) pairs,
+    see read_rows) as `role` users. Returns an ImportResult.
+    `progress(result)` is called after each chunk is committed.
+    """
+    if role not in ROLES:
+        raise ValueError(f"role must be one of {', '.join(ROLES)}")
+    workers = os.cpu_count() if workers is None else workers
+    group = Group.objects.get_or_create(name='Doctor')[0] if role == 'doctor' else None
+    result = ImportResult()
+    seen = set()
+    hasher = _Hasher(workers)
+    queued = None  # (rows, hashes in progress) of the chunk waiting to be inserted
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            parsed = []
+            for number, row in chunk:
+                try:
+                    parsed.append(_parse(role, row))
+                except ValueError as exc:
+                    result.invalid.append((number, str(exc)))
+            existing = set(
+                User.objects.filter(username__in=[username for username, _, _ in parsed])
+                .values_list('username', flat=True)
+            )
+            pending = []
+            for entry in parsed:
+                if entry[0] in existing or entry[0] in seen:
+                    result.skipped += 1
+                else:
+                    seen.add(entry[0])
+                    pending.append(entry)
+
+            hashes = hasher.submit([password for _, password, _ in pending])
+            if queued:
+                result.created += _insert(role, group, *queued)
+                if progress:
+                    progress(result)
+            queued = (pending, hashes) if pending else None
+        if queued:
+            result.created += _insert(role, group, *queued)
+            if progress:
+                progress(result)
+    finally:
+        hasher.close()
+        if result.created:
+            invalidate_directory()
+            invalidate_patient_statistics()
+    return result
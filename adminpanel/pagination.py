@@ -0,0 +1,60 @@
+import base64
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+
+
+def encode_cursor(appointment):
+    raw = f"{appointment.created_at.isoformat()}|{appointment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) or None for a missing / malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_page_size(value):
+    """Clamp a ?page_size= value to settings.APPOINTMENT_MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return settings.APPOINTMENT_PAGE_SIZE
+    return max(1, min(size, settings.APPOINTMENT_MAX_PAGE_SIZE))
+
+
+def keyset_page(querysets, cursor, page_size):
+    """
+    Newest-first page over (created_at, id).
+
+    Pass one queryset per equality filter on the leading index column
+    (e.g. one per status) so each is a bounded index seek; the slices are
+    merged here instead of letting SQLite sort every matching row.
+    Returns (rows, next_cursor).
+    """
+    position = decode_cursor(cursor)
+    slices = []
+    for queryset in querysets:
+        if position:
+            created_at, pk = position
+            queryset = queryset.filter(created_at__lte=created_at).exclude(
+                created_at=created_at, id__gte=pk
+            )
+        queryset = queryset.order_by('-created_at', '-id')[:page_size + 1]
+        slices.append(list(queryset))
+
+    merged = heapq.merge(*slices, key=lambda a: (a.created_at, a.id), reverse=True)
+    rows = [row for _, row in zip(range(page_size + 1), merged)]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
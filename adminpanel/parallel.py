@@ -0,0 +1,46 @@
+"""
+Run independent, read-only ORM work concurrently from async views.
+
+Django's own async ORM methods (aaggregate(), async for) all hop onto the
+one thread-sensitive worker, so awaiting several of them with
+asyncio.gather() still runs them back to back. gather() here gives each
+call its own worker thread and database connection instead.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def _sequential(calls):
+    return [call() for call in calls]
+
+
+def _on_own_connection(call):
+    def run():
+        try:
+            return call()
+        finally:
+            # the worker thread outlives the request; honour CONN_MAX_AGE as a request would
+            close_old_connections()
+    return run
+
+
+async def gather(*calls):
+    """
+    The results of the zero-argument callables `calls`, in order.
+
+    Inside a transaction (ATOMIC_REQUESTS, TestCase) other connections
+    cannot see its writes, so the calls run one after another on the
+    request's own connection instead.
+    """
+    if await sync_to_async(_in_transaction)():
+        return await sync_to_async(_sequential)(calls)
+    return await asyncio.gather(*(
+        sync_to_async(_on_own_connection(call), thread_sensitive=False)()
+        for call in calls
+    ))
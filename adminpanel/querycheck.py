@@ -0,0 +1,176 @@
+"""
+Development / test guard against N+1 queries and query-count creep.
+
+QueryCheckMiddleware fingerprints every SQL statement a request runs.
+A SELECT shape repeated QUERY_CHECK_REPEAT_THRESHOLD times or more,
+issued while a template resolved a variable (e.g. `appointment.doctor`
+inside a {% for %}), is reported with the view and the template line
+that triggered it. Requests to a URL name listed in QUERY_BUDGETS may
+run at most that many queries.
+
+QUERY_CHECK = 'log' writes findings to the `adminpanel.querycheck`
+logger; 'raise' raises QueryCheckFailed, which QueryCheckRunner turns on
+for the whole test suite; 'off' skips the work entirely.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+
+import django
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .tracing import tracing
+
+
+logger = logging.getLogger(__name__)
+
+DJANGO_DIR = os.path.dirname(django.__file__)
+PLACEHOLDER_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+class QueryCheckFailed(AssertionError):
+    """A request ran an N+1 pattern or went over its query budget."""
+
+
+def fingerprint(sql):
+    """The statement with IN (...) lists collapsed; parameters are already %s."""
+    return PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+def template_site():
+    """
+    (template name, line, tag source) of the node being rendered when a
+    template variable lookup runs the current query, or None when the query
+    does not come from a template lookup.
+    """
+    frame = sys._getframe(1)
+    in_lookup = False
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(DJANGO_DIR):
+            if code.co_name == '_resolve_lookup':
+                in_lookup = True
+            elif in_lookup and code.co_name == 'render_annotated':
+                node = frame.f_locals.get('self')
+                token = getattr(node, 'token', None)
+                origin = getattr(node, 'origin', None)
+                if token is not None:
+                    return getattr(origin, 'template_name', None) or str(origin), token.lineno, token.contents
+        frame = frame.f_back
+    return None
+
+
+@dataclass
+class Repeat:
+    sql: str
+    count: int
+    template: str
+    line: int
+    source: str
+
+    def __str__(self):
+        return f"{self.count}x from {{{{ {self.source} }}}} at {self.template}:{self.line}: {self.sql[:200]}"
+
+
+class QueryRecorder:
+    """SQL wrapper collecting one request's statement shapes (from any thread)."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.total = 0
+        self.shapes = Counter()
+        self.sites = {}
+        self._lock = Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.total += 1
+            seen = 0
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                shape = fingerprint(sql)
+                self.shapes[shape] += 1
+                seen = self.shapes[shape]
+        # the site is looked up once, when the shape first looks like a loop
+        if seen == 2:
+            self.sites[shape] = template_site()
+        return execute(sql, params, many, context)
+
+    def repeats(self):
+        found = []
+        for shape, count in self.shapes.items():
+            site = self.sites.get(shape)
+            if count >= self.threshold and site:
+                found.append(Repeat(shape, count, *site))
+        return found
+
+
+def check(view, recorder):
+    """Problems with one request, as a list of messages."""
+    problems = [f"N+1 in {view}: {repeat}" for repeat in recorder.repeats()]
+    budget = settings.QUERY_BUDGETS.get(view)
+    if budget is not None and recorder.total > budget:
+        problems.append(f"{view} ran {recorder.total} queries; its budget is {budget}")
+    return problems
+
+
+class QueryCheckMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = settings.QUERY_CHECK
+        if mode == 'off':
+            return self.get_response(request)
+
+        recorder = QueryRecorder(settings.QUERY_CHECK_REPEAT_THRESHOLD)
+        with tracing(recorder):
+            response = self.get_response(request)
+        return self.report(request, recorder, mode, response)
+
+    async def __acall__(self, request):
+        mode = settings.QUERY_CHECK
+        if mode == 'off':
+            return await self.get_response(request)
+
+        recorder = QueryRecorder(settings.QUERY_CHECK_REPEAT_THRESHOLD)
+        with tracing(recorder):
+            response = await self.get_response(request)
+        return self.report(request, recorder, mode, response)
+
+    def report(self, request, recorder, mode, response):
+        match = getattr(request, 'resolver_match', None)
+        view = (match and match.url_name) or request.path
+        problems = check(view, recorder)
+        if problems and mode == 'raise':
+            raise QueryCheckFailed('\n'.join(problems))
+        for problem in problems:
+            logger.warning(problem)
+        return response
+
+
+class QueryCheckRunner(DiscoverRunner):
+    """Test runner that makes every N+1 or blown budget a test failure."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_check = override_settings(QUERY_CHECK='raise')
+        self._query_check.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._query_check.disable()
+        super().teardown_test_environment(**kwargs)
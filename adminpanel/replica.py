@@ -0,0 +1,106 @@
+"""
+Reporting reads on a replica database.
+
+Views wrapped in @reads_from_replica send their reads to the `replica`
+alias; everything else, and every write, stays on `default`. For a local
+SQLite deployment the replica is a copy of db.sqlite3 refreshed with the
+online backup API (`manage.py refresh_replica --every 60`), so dashboard
+scans never hold the primary's lock against booking and billing writes.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA = 'replica'
+
+_reporting = ContextVar('reporting', default=False)
+
+
+def replica_available():
+    """
+    False until the first refresh has created the replica file, and when
+    the replica is the primary itself (e.g. mirrored under tests).
+    """
+    if REPLICA not in connections.settings:
+        return False
+    name = connections[REPLICA].settings_dict['NAME']
+    if name == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return False
+    return connections[REPLICA].vendor != 'sqlite' or os.path.exists(name)
+
+
+@contextmanager
+def reporting():
+    """Route the reads inside the block to the replica."""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+def reads_from_replica(view):
+    """
+    For read-only reporting views only: the replica can lag the primary by
+    a refresh interval, so nothing that must see its own writes belongs here.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with reporting():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reporting():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        # the database cache table is live shared state, never a snapshot
+        if model._meta.app_label == 'django_cache':
+            return DEFAULT_DB_ALIAS
+        if _reporting.get() and replica_available():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # the replica gets its schema from the primary with each refresh
+        return db != REPLICA
+
+
+def refresh(source=None, target=None, pages=1024):
+    """
+    Copy the primary SQLite file into the replica with sqlite3's online
+    backup, `pages` at a time so writers only wait for one step. The copy is
+    written next to the replica and renamed over it, so readers always see
+    a complete database.
+    """
+    source = str(source or connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    target = str(target or connections[REPLICA].settings_dict['NAME'])
+    partial = f"{target}.partial"
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(partial)
+    try:
+        src.backup(dst, pages=pages)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(partial, target)
@@ -0,0 +1,128 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from patient import archive
+from .models import RevenueRollup
+
+
+# Appointment columns that decide where (and whether) it lands in the rollup
+STATE_FIELDS = ('status', 'bill_amount', 'payment_status', 'doctor_id', 'doctor_type', 'created_at')
+
+COUNTERS = ('completed_count', 'paid_count', 'revenue', 'paid_revenue')
+
+
+def state(appointment):
+    return {field: getattr(appointment, field) for field in STATE_FIELDS}
+
+
+def contribution(values):
+    """
+    Return (key, deltas) for one appointment's STATE_FIELDS, or None when it
+    does not count towards revenue. Only Completed appointments are billed.
+    """
+    if not values or values['status'] != 'Completed' or values['created_at'] is None:
+        return None
+
+    amount = Decimal(values['bill_amount'] or 0)
+    paid = values['payment_status'] == 'Paid'
+    key = (timezone.localdate(values['created_at']), values['doctor_type'], values['doctor_id'])
+    return key, {
+        'completed_count': 1,
+        'paid_count': 1 if paid else 0,
+        'revenue': amount,
+        'paid_revenue': amount if paid else Decimal(0),
+    }
+
+
+def _add(key, deltas, sign):
+    # Call inside a transaction. get_or_create() looks the row up again when
+    # a concurrent insert wins the unique constraint, and the increment is
+    # one UPDATE in the database, so simultaneous saves never lose a delta.
+    day, department, doctor_id = key
+    row = RevenueRollup.objects.get_or_create(day=day, department=department, doctor_id=doctor_id)[0]
+    RevenueRollup.objects.filter(pk=row.pk).update(
+        **{name: F(name) + sign * value for name, value in deltas.items()}
+    )
+
+
+def apply_change(before, after):
+    """Move one appointment's contribution from `before` to `after`."""
+    if before == after:
+        return
+    with transaction.atomic():
+        if before:
+            _add(*before, sign=-1)
+        if after:
+            _add(*after, sign=1)
+
+
+def apply_changes(changes):
+    """
+    apply_change() for many (before, after) pairs, e.g. after a queryset
+    update() that bypassed the Appointment signals. Deltas are netted per
+    rollup row first, so each touched row is written once.
+    """
+    net = {}
+    for before, after in changes:
+        for contrib, sign in ((before, -1), (after, 1)):
+            if not contrib:
+                continue
+            key, deltas = contrib
+            row = net.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, value in deltas.items():
+                row[name] += sign * value
+
+    with transaction.atomic():
+        for key, deltas in net.items():
+            if any(deltas.values()):
+                _add(key, deltas, sign=1)
+
+
+def fold_doctor(doctor_id):
+    """
+    Merge a doctor's rows into the unassigned (no doctor) rows of the same
+    day and department. Runs before the doctor is deleted, where SET_NULL
+    would otherwise leave two rows with one key.
+    """
+    with transaction.atomic():
+        rows = RevenueRollup.objects.filter(doctor_id=doctor_id)
+        for row in rows.values('day', 'department', *COUNTERS):
+            _add((row.pop('day'), row.pop('department'), None), row, sign=1)
+        rows.delete()
+
+
+def rebuild():
+    """Recompute the whole rollup from patient.Appointment and its archive."""
+    paid = Q(payment_status='Paid')
+    totals = {}
+    for queryset in archive.querysets(status='Completed'):
+        rows = (
+            queryset.annotate(day=TruncDate('created_at'))
+            .values('day', 'doctor_type', 'doctor_id')
+            .annotate(
+                completed_count=Count('id'),
+                paid_count=Count('id', filter=paid),
+                revenue=Sum('bill_amount'),
+                paid_revenue=Sum('bill_amount', filter=paid),
+            )
+            .order_by()
+        )
+        for row in rows.iterator():
+            total = totals.setdefault((row['day'], row['doctor_type'], row['doctor_id']), dict.fromkeys(COUNTERS, 0))
+            for name in COUNTERS:
+                total[name] += row[name] or 0
+
+    with transaction.atomic():
+        RevenueRollup.objects.all().delete()
+        RevenueRollup.objects.bulk_create(
+            (
+                RevenueRollup(day=day, department=department, doctor_id=doctor_id, **total)
+                for (day, department, doctor_id), total in totals.items()
+            ),
+            batch_size=1000,
+        )
+    return RevenueRollup.objects.count()
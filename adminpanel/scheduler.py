@@ -0,0 +1,130 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+from doctor import slots
+from doctor.models import DoctorAvailability, DoctorProfile
+from patient.models import Appointment
+from . import live
+from .statistics import invalidate_patient_statistics
+
+
+class AvailabilityChanged(Exception):
+    """The queue or a bitmap moved underneath the scheduler; nothing was written."""
+
+
+@dataclass
+class ScheduleResult:
+    assigned: list = field(default_factory=list)
+    unassigned: list = field(default_factory=list)
+
+
+def plan_assignments():
+    """
+    Match every Pending appointment (oldest first) to a doctor whose
+    specialization equals its doctor_type and whose slot is free, picking
+    the doctor with the fewest Approved appointments that day.
+    Returns (ScheduleResult, original bitmaps, new bitmaps).
+    """
+    pending = list(
+        Appointment.objects.filter(status='Pending')
+        .order_by('created_at', 'id')
+        .values_list('id', 'doctor_type', 'appointment_date', 'appointment_time')
+    )
+    days = {day for _, _, day, _ in pending}
+
+    by_department = defaultdict(list)
+    masks = {}
+    for profile in DoctorProfile.objects.all():
+        by_department[profile.specialization].append(profile.user_id)
+        masks[profile.user_id] = slots.working_mask(profile)
+
+    original = {
+        (doctor_id, day): booked
+        for doctor_id, day, booked in DoctorAvailability.objects
+        .filter(day__in=days, doctor_id__in=masks)
+        .values_list('doctor_id', 'day', 'booked')
+    }
+    booked = dict(original)
+
+    load = defaultdict(int)
+    for doctor_id, day, count in (
+        Appointment.objects.filter(status='Approved', appointment_date__in=days, doctor__isnull=False)
+        .values('doctor_id', 'appointment_date')
+        .annotate(count=Count('id'))
+        .values_list('doctor_id', 'appointment_date', 'count')
+    ):
+        load[doctor_id, day] = count
+
+    result = ScheduleResult()
+    for appointment_id, department, day, at in pending:
+        index = slots.slot_index(at)
+        candidates = [] if index is None else [
+            doctor_id for doctor_id in by_department.get(department, [])
+            if masks[doctor_id] & ~booked.get((doctor_id, day), 0) & (1 << index)
+        ]
+        if not candidates:
+            result.unassigned.append(appointment_id)
+            continue
+
+        doctor_id = min(candidates, key=lambda d: (load[d, day], d))
+        booked[doctor_id, day] = booked.get((doctor_id, day), 0) | (1 << index)
+        load[doctor_id, day] += 1
+        result.assigned.append((appointment_id, doctor_id))
+
+    return result, original, booked
+
+
+def _write_bitmaps(original, booked):
+    """Compare-and-set each changed bitmap; raise if another writer got there first."""
+    new_rows = []
+    for key, value in booked.items():
+        if original.get(key) == value:
+            continue
+        doctor_id, day = key
+        if key not in original:
+            new_rows.append(DoctorAvailability(doctor_id=doctor_id, day=day, booked=value))
+            continue
+        updated = DoctorAvailability.objects.filter(
+            doctor_id=doctor_id, day=day, booked=original[key]
+        ).update(booked=value)
+        if not updated:
+            raise AvailabilityChanged(key)
+
+    try:
+        # a concurrent reserve() creating the same (doctor, day) row trips
+        # the unique constraint
+        with transaction.atomic():
+            DoctorAvailability.objects.bulk_create(new_rows, batch_size=1000)
+    except IntegrityError:
+        raise AvailabilityChanged('new rows')
+
+
+def auto_assign(dry_run=False, attempts=3):
+    """Plan and apply assignments for the whole Pending queue in one transaction."""
+    for attempt in range(attempts):
+        result, original, booked = plan_assignments()
+        if dry_run or not result.assigned:
+            return result
+        try:
+            with transaction.atomic():
+                ids = [appointment_id for appointment_id, _ in result.assigned]
+                if Appointment.objects.filter(id__in=ids, status='Pending').count() != len(ids):
+                    raise AvailabilityChanged('queue')
+                _write_bitmaps(original, booked)
+                Appointment.objects.bulk_update(
+                    [
+                        Appointment(id=appointment_id, doctor_id=doctor_id, status='Approved')
+                        for appointment_id, doctor_id in result.assigned
+                    ],
+                    ['doctor', 'status'],
+                )
+        except AvailabilityChanged:
+            if attempt == attempts - 1:
+                raise
+            continue
+        invalidate_patient_statistics()
+        live.changed(appointment_id for appointment_id, _ in result.assigned)
+        return result
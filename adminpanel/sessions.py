@@ -0,0 +1,140 @@
+"""
+Session engine with a cache read path and throttled expiry writes.
+
+Sessions are read from the cache (SESSION_CACHE_ALIAS) and only fall
+back to django_session on a miss. Each cache entry also stores the
+expiry date last written to the row. With SESSION_SAVE_EVERY_REQUEST
+sliding the expiry forward, a save whose data is unchanged is not
+written until the stored expiry is SESSION_WRITE_INTERVAL seconds
+behind. A session can therefore end that much earlier than its cookie
+says. The write lock on django_session is then taken for logins,
+role / message changes and roughly one refresh per active user per
+interval, not for every request.
+
+The cache is the source of truth between writes, so it has to be one
+that every server process shares: a per-process cache would keep a
+session alive in the other workers after logout deleted it in one. A
+process-local cache (LocMem, dummy) is therefore never used, and
+neither is the database cache, which would only move the reads to
+another table; with those the engine reads django_session on every
+request and only the write throttle applies.
+
+Expired rows are deleted in batches of SESSION_PURGE_BATCH_SIZE
+(`manage.py purge_sessions --every 3600`, or `clearsessions`), one short
+statement at a time, so the purge never holds the lock for long.
+"""
+import hashlib
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends import db
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+
+KEY_PREFIX = 'adminpanel.sessions:'
+
+
+def session_cache():
+    """The SESSION_CACHE_ALIAS cache, or None when it cannot front django_session."""
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    if isinstance(cache, (LocMemCache, DummyCache, DatabaseCache)):
+        return None
+    return cache
+
+
+class SessionStore(db.SessionStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = session_cache()
+        # expiry date of the stored row and the data it holds, as loaded or last written
+        self._stored_expiry = None
+        self._stored_fingerprint = None
+
+    @property
+    def cache_key(self):
+        return KEY_PREFIX + self._get_or_create_session_key()
+
+    def _fingerprint(self, data):
+        # encode() is signed with a timestamp, so hash the serialized data instead
+        return hashlib.sha1(self.serializer().dumps(data)).digest()
+
+    def _remember(self, data, expiry):
+        self._stored_expiry = expiry
+        self._stored_fingerprint = self._fingerprint(data)
+        if self._cache is not None:
+            self._cache.set(self.cache_key, (data, expiry), self.get_expiry_age(expiry=expiry))
+
+    def load(self):
+        entry = self._cache.get(self.cache_key) if self.session_key and self._cache is not None else None
+        if entry is not None and entry[1] > timezone.now():
+            data, expiry = entry
+            self._stored_expiry = expiry
+            self._stored_fingerprint = self._fingerprint(data)
+            return data
+
+        session = self._get_session_from_db()
+        if session is None:
+            self._session_key = None
+            return {}
+        data = self.decode(session.session_data)
+        self._remember(data, session.expire_date)
+        return data
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        if (
+            not must_create
+            and self._stored_expiry is not None
+            and self._fingerprint(data) == self._stored_fingerprint
+            and self.get_expiry_date() - self._stored_expiry < timedelta(seconds=settings.SESSION_WRITE_INTERVAL)
+        ):
+            return  # only the expiry would move, and not far enough yet
+        super().save(must_create=must_create)
+        self._remember(data, self.get_expiry_date())
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        if self._cache is not None:
+            self._cache.delete(KEY_PREFIX + session_key)
+        if session_key == self.session_key:
+            self._stored_expiry = self._stored_fingerprint = None
+
+    # The db backend's async methods bypass the overrides above
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired()
+
+
+def purge_expired(batch_size=None):
+    """Delete expired sessions, batch_size rows per statement; returns how many went."""
+    Session = SessionStore.get_model_class()
+    batch_size = batch_size or settings.SESSION_PURGE_BATCH_SIZE
+    now = timezone.now()
+    purged = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return purged
+        purged += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
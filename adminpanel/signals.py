@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from patient.models import Appointment, PatientProfile
+from . import live, rollups
+from .statistics import invalidate_patient_statistics
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_revenue_state(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    instance._revenue_before = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Appointment.objects.filter(pk=instance.pk)
+        .values(*rollups.STATE_FIELDS)
+        .first()
+    )
+    instance._previous_state = previous
+    instance._revenue_before = rollups.contribution(previous)
+
+
+@receiver(post_save, sender=Appointment)
+def update_revenue_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.apply_change(
+        getattr(instance, '_revenue_before', None),
+        rollups.contribution(rollups.state(instance))
+    )
+
+
+@receiver(post_delete, sender=Appointment)
+def remove_revenue_contribution(sender, instance, **kwargs):
+    rollups.apply_change(rollups.contribution(rollups.state(instance)), None)
+
+
+@receiver(pre_delete, sender=User)
+def fold_revenue_rollup(sender, instance, **kwargs):
+    rollups.fold_doctor(instance.pk)
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_statistics_changed(sender, instance, created, raw=False, **kwargs):
+    # the statistics only count appointments per status
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None or previous['status'] != instance.status:
+        invalidate_patient_statistics()
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=PatientProfile)
+@receiver(post_delete, sender=PatientProfile)
+def patient_statistics_changed(sender, **kwargs):
+    invalidate_patient_statistics()
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_queue_changed(sender, instance, created, raw=False, **kwargs):
+    # the live queues show Pending / Approved rows per doctor
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None or (previous['status'], previous['doctor_id']) != (instance.status, instance.doctor_id):
+        live.changed([instance.pk])
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_left_queue(sender, instance, **kwargs):
+    live.changed([instance.pk])
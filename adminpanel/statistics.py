@@ -0,0 +1,88 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+
+from patient.models import Appointment, ArchivedAppointment, PatientProfile
+from .parallel import gather
+
+
+CACHE_KEY = 'adminpanel:patient_statistics'
+
+
+def age_bucket_label(low, high):
+    return f"{low}+" if high is None else f"{low}-{high}"
+
+
+def _queries():
+    """
+    The five independent aggregate queries behind patient_statistics, as
+    callables. They always read the primary: the result is cached until a
+    write invalidates it, and figures from the lagging replica would put
+    the pre-write counts back in the cache.
+    """
+    patients = PatientProfile.objects.using(DEFAULT_DB_ALIAS)
+    age_filters = {}
+    for index, (low, high) in enumerate(settings.PATIENT_AGE_BUCKETS):
+        condition = Q(age__gte=low)
+        if high is not None:
+            condition &= Q(age__lte=high)
+        age_filters[f'age_{index}'] = Count('id', filter=condition)
+
+    return [
+        partial(patients.aggregate, total=Count('id'), **age_filters),
+        partial(
+            Appointment.objects.using(DEFAULT_DB_ALIAS).aggregate,
+            total=Count('id'),
+            approved=Count('id', filter=Q(status='Approved')),
+            pending=Count('id', filter=Q(status='Pending')),
+            completed=Count('id', filter=Q(status='Completed')),
+            rejected=Count('id', filter=Q(status='Rejected')),
+        ),
+        # the archive only holds Completed and Rejected appointments
+        partial(
+            ArchivedAppointment.objects.using(DEFAULT_DB_ALIAS).aggregate,
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='Completed')),
+            rejected=Count('id', filter=Q(status='Rejected')),
+        ),
+        partial(list, patients.values('gender').annotate(count=Count('id')).order_by('gender')),
+        partial(list, patients.values('category').annotate(count=Count('id')).order_by('category')),
+    ]
+
+
+def _payload(patients, appointment_stats, archived_stats, gender_stats, category_stats):
+    for name, count in archived_stats.items():
+        appointment_stats[name] += count
+    return {
+        'total_patients': patients['total'],
+        'gender_stats': gender_stats,
+        'age_stats': [
+            {'label': age_bucket_label(low, high), 'count': patients[f'age_{index}']}
+            for index, (low, high) in enumerate(settings.PATIENT_AGE_BUCKETS)
+        ],
+        'category_stats': category_stats,
+        'appointment_stats': appointment_stats,
+    }
+
+
+async def acompute_patient_statistics():
+    """Build the patient_statistics payload, its five aggregate queries run concurrently."""
+    return _payload(*await gather(*_queries()))
+
+
+# In the shared cache, so a write in one worker invalidates the figures
+# every worker serves
+async def aget_patient_statistics():
+    cache = caches['shared']
+    stats = await cache.aget(CACHE_KEY)
+    if stats is None:
+        stats = await acompute_patient_statistics()
+        await cache.aset(CACHE_KEY, stats, settings.PATIENT_STATISTICS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_patient_statistics():
+    caches['shared'].delete(CACHE_KEY)
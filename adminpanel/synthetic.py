@@ -0,0 +1,188 @@
+"""
+Synthetic datasets for load testing (`manage.py generate_synthetic_data`,
+`manage.py run_benchmarks`).
+
+Everything is written with chunked bulk_create, which skips the model
+signals, so finish() rebuilds the derived tables (balances, revenue
+rollup, slot bitmaps) and drops the caches afterwards.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.utils import timezone
+
+from doctor import slots
+from doctor.directory import invalidate_directory
+from doctor.models import DoctorProfile
+from patient import ledger
+from patient.models import Appointment, PatientProfile
+from . import rollups
+from .statistics import invalidate_patient_statistics
+
+
+SPECIALIZATIONS = [
+    'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics',
+    'Dermatology', 'General Medicine', 'ENT', 'Gynecology',
+]
+PLACES = ['Kochi', 'Thrissur', 'Kozhikode', 'Kannur', 'Kollam', 'Alappuzha', 'Palakkad', 'Kottayam']
+CATEGORY_BY_AGE = [(12, 'Child'), (59, 'General'), (None, 'Senior')]
+# (status, weight); Completed appointments carry a bill
+STATUS_WEIGHTS = [('Pending', 10), ('Approved', 15), ('Completed', 60), ('Rejected', 15)]
+PAID_SHARE = 0.8
+DIAGNOSES = [
+    ('Viral fever', 'Paracetamol 500mg, rest'),
+    ('Hypertension', 'Amlodipine 5mg daily'),
+    ('Migraine', 'Sumatriptan as needed'),
+    ('Sprained ankle', 'Ice, compression, ibuprofen'),
+    ('Dermatitis', 'Hydrocortisone cream'),
+]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@contextmanager
+def _keep_created_at():
+    # bulk_create would stamp every row with now(); keep the generated dates
+    field = Appointment._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _next_index(prefix, kind):
+    return User.objects.filter(username__startswith=f"{prefix}-{kind}-").count()
+
+
+def _create_users(prefix, kind, count, chunk_size):
+    password = make_password('synthetic')  # hashed once, shared by every user
+    start = _next_index(prefix, kind)
+    users = (
+        User(username=f"{prefix}-{kind}-{i}", password=password)
+        for i in range(start, start + count)
+    )
+    created = []
+    for chunk in _chunks(users, chunk_size):
+        created += User.objects.bulk_create(chunk)
+    return created
+
+
+def create_doctors(count, prefix='synth', chunk_size=5000, seed=0):
+    rng = random.Random(f"{seed}-doctors")
+    group, _ = Group.objects.get_or_create(name='Doctor')
+    with transaction.atomic():
+        users = _create_users(prefix, 'doctor', count, chunk_size)
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user_id=user.pk, group_id=group.pk) for user in users],
+            batch_size=chunk_size,
+        )
+        profiles = []
+        for index, user in enumerate(users):
+            start = rng.choice([8, 9, 10])
+            profiles.append(DoctorProfile(
+                user=user,
+                full_name=f"Synthetic Doctor {user.username.rsplit('-', 1)[1]}",
+                specialization=SPECIALIZATIONS[index % len(SPECIALIZATIONS)],
+                working_from=time(start, 0),
+                working_to=time(start + 8, 0),
+            ))
+        DoctorProfile.objects.bulk_create(profiles, batch_size=chunk_size)
+    return len(users)
+
+
+def create_patients(count, prefix='synth', chunk_size=5000, seed=0):
+    rng = random.Random(f"{seed}-patients")
+    created = 0
+    with transaction.atomic():
+        for chunk in _chunks(range(count), chunk_size):
+            users = _create_users(prefix, 'patient', len(chunk), chunk_size)
+            profiles = []
+            for user in users:
+                age = rng.randint(1, 90)
+                profiles.append(PatientProfile(
+                    user=user,
+                    full_name=f"Synthetic Patient {user.username.rsplit('-', 1)[1]}",
+                    age=age,
+                    gender=rng.choice(['Male', 'Female']),
+                    place=rng.choice(PLACES),
+                    category=next(c for limit, c in CATEGORY_BY_AGE if limit is None or age <= limit),
+                ))
+            PatientProfile.objects.bulk_create(profiles)
+            created += len(users)
+    return created
+
+
+def _appointments(count, patient_ids, doctors, start, days, rng):
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+    for _ in range(count):
+        doctor = rng.choice(doctors)
+        status = rng.choices(statuses, weights)[0]
+        day = start + timedelta(days=rng.randrange(days))
+        minutes = rng.randrange(
+            doctor.working_from.hour * 60, doctor.working_to.hour * 60, 15
+        )
+        created_at = timezone.make_aware(datetime.combine(
+            day - timedelta(days=rng.randint(0, 14)),
+            time(rng.randrange(24), rng.randrange(60), rng.randrange(60)),
+        ))
+        appointment = Appointment(
+            patient_id=rng.choice(patient_ids),
+            doctor_id=doctor.user_id if status in ('Approved', 'Completed') else None,
+            doctor_type=doctor.specialization,
+            appointment_date=day,
+            appointment_time=time(minutes // 60, minutes % 60),
+            status=status,
+            payment_status='Not Paid',
+            created_at=created_at,
+        )
+        if status == 'Completed':
+            appointment.diagnosis, appointment.prescription = rng.choice(DIAGNOSES)
+            appointment.bill_amount = Decimal(rng.randrange(200, 5000, 50))
+            if rng.random() < PAID_SHARE:
+                appointment.payment_status = 'Paid'
+        yield appointment
+
+
+def create_appointments(count, start=None, days=365, chunk_size=5000, seed=0, progress=None):
+    """
+    `count` appointments spread over `days` days from `start` (default: a
+    year ago) between existing patients and doctors, `chunk_size` per
+    INSERT batch and transaction. `progress(done)` is called per chunk.
+    """
+    rng = random.Random(f"{seed}-appointments-{Appointment.objects.count()}")
+    patient_ids = list(PatientProfile.objects.values_list('user_id', flat=True))
+    doctors = list(DoctorProfile.objects.only('user_id', 'specialization', 'working_from', 'working_to'))
+    if not patient_ids or not doctors:
+        raise ValueError("Create patients and doctors before appointments")
+    start = start or timezone.localdate() - timedelta(days=days)
+
+    done = 0
+    with _keep_created_at():
+        for chunk in _chunks(_appointments(count, patient_ids, doctors, start, days, rng), chunk_size):
+            with transaction.atomic():
+                Appointment.objects.bulk_create(chunk)
+            done += len(chunk)
+            if progress:
+                progress(done)
+    return done
+
+
+def finish():
+    """Rebuild what the skipped signals would have maintained."""
+    ledger.rebuild()
+    rollups.rebuild()
+    slots.rebuild()
+    invalidate_directory()
+    invalidate_patient_statistics()
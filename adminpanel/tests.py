@@ -1,3 +1,1095 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import sqlite3
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from threading import Thread, Timer, get_ident
+from time import perf_counter
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from doctor import slots
+from doctor.models import DoctorAvailability, DoctorProfile
+from patient.models import Appointment, PatientBalance, PatientProfile
+from asgiref.sync import async_to_sync
+
+from . import (
+    benchmark, live, metrics, onboarding, querycheck, replica, sessions, statistics, synthetic, throttle, views,
+)
+from .models import RevenueRollup
+from .parallel import gather
+from .scheduler import auto_assign
+from .tracing import tracing
+from .transitions import QueueChanged, approve_pending, reject_pending
+
+
+class AppointmentQueuePaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+        statuses = ['Pending', 'Approved', 'Completed', 'Rejected']
+        now = timezone.now()
+        for i in range(24):
+            appointment = Appointment.objects.create(
+                patient=cls.patient,
+                doctor_type='Cardiology' if i % 2 else 'Neurology',
+                appointment_date=date(2026, 1, 1) + timedelta(days=i),
+                appointment_time=time(10, 0),
+                status=statuses[i % 4],
+            )
+            # pairs share a timestamp so the id tie-breaker is exercised
+            Appointment.objects.filter(id=appointment.id).update(
+                created_at=now - timedelta(minutes=i // 2)
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def walk(self, url_name, **params):
+        seen = []
+        cursor = None
+        while True:
+            query = dict(params, page_size=4)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get(reverse(url_name), query)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(a.id for a in response.context['appointments'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_history_pages_cover_every_row_once_newest_first(self):
+        seen = self.walk('appoinment_history')
+        expected = list(
+            Appointment.objects.exclude(status='Pending')
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_request_queue_only_lists_pending(self):
+        seen = self.walk('appoinment_request')
+        self.assertEqual(
+            set(seen),
+            set(Appointment.objects.filter(status='Pending').values_list('id', flat=True))
+        )
+
+    def test_filters(self):
+        seen = self.walk(
+            'appoinment_history',
+            status='Completed',
+            department='Neurology',
+            date_from='2026-01-05',
+        )
+        expected = Appointment.objects.filter(
+            status='Completed',
+            doctor_type='Neurology',
+            appointment_date__gte=date(2026, 1, 5),
+        ).values_list('id', flat=True)
+        self.assertEqual(set(seen), set(expected))
+
+    def test_query_count_independent_of_page_size(self):
+        url = reverse('appoinment_history')
+        self.client.get(url)  # resolves the session role, caches the doctor directory
+        # session, user, role and directory version stamps and one seek per status
+        with self.assertNumQueries(7):
+            self.client.get(url, {'page_size': 2})
+        with self.assertNumQueries(7):
+            self.client.get(url, {'page_size': 18})
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('appoinment_history'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['appointments'])
+
+
+class RevenueRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        cls.doctor = User.objects.create_user(username='doctor', password='pass')
+
+    def book(self, **fields):
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=fields.pop('doctor', self.doctor),
+            doctor_type=fields.pop('doctor_type', 'Cardiology'),
+            appointment_date=date(2026, 1, 10),
+            appointment_time=time(10, 0),
+            **fields
+        )
+
+    def snapshot(self):
+        return sorted(
+            RevenueRollup.objects.filter(completed_count__gt=0)
+            .values_list('day', 'department', 'doctor_id', 'completed_count',
+                         'paid_count', 'revenue', 'paid_revenue')
+        )
+
+    def test_rollup_tracks_status_amount_and_payment_changes(self):
+        first = self.book()
+        second = self.book(doctor_type='Neurology', status='Completed', bill_amount=300)
+
+        first.status = 'Completed'
+        first.bill_amount = '500'
+        first.save()
+        first.payment_status = 'Paid'
+        first.save()
+        second.bill_amount = 250
+        second.save()
+        self.book(status='Rejected', bill_amount=900)
+
+        totals = RevenueRollup.objects.get(department='Cardiology')
+        self.assertEqual(totals.completed_count, 1)
+        self.assertEqual(totals.paid_revenue, Decimal('500'))
+        self.assertEqual(RevenueRollup.objects.get(department='Neurology').revenue, Decimal('250'))
+
+        incremental = self.snapshot()
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+        second.delete()
+        self.assertFalse(
+            RevenueRollup.objects.filter(department='Neurology', completed_count__gt=0).exists()
+        )
+
+    def test_deleted_doctors_fold_into_the_unassigned_row(self):
+        self.book(status='Completed', bill_amount=100, doctor=None)
+        self.book(status='Completed', bill_amount=300, payment_status='Paid')
+
+        self.doctor.delete()
+        row = RevenueRollup.objects.get()
+        self.assertEqual((row.doctor_id, row.completed_count, row.paid_count), (None, 2, 1))
+        self.assertEqual(row.revenue, Decimal('400'))
+
+        incremental = self.snapshot()
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_dashboard_reads_only_the_rollup(self):
+        self.book(status='Completed', bill_amount=400, payment_status='Paid')
+        self.book(status='Completed', bill_amount=100)
+        self.client.force_login(self.admin)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('billing_dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_revenue'], Decimal('500'))
+        self.assertEqual(response.context['outstanding'], Decimal('100'))
+        self.assertFalse([q for q in ctx.captured_queries if Appointment._meta.db_table in q['sql']])
+
+
+class PatientStatisticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        for i, age in enumerate([5, 15, 30, 30, 72]):
+            user = User.objects.create_user(username=f'patient{i}', password='pass')
+            PatientProfile.objects.create(
+                user=user, full_name=user.username, age=age,
+                gender='Female' if i % 2 else 'Male', place='Kochi', category='General'
+            )
+            Appointment.objects.create(
+                patient=user,
+                doctor_type='Cardiology',
+                appointment_date=date(2026, 1, 10),
+                appointment_time=time(10, 0),
+                status='Approved' if i % 2 else 'Pending',
+            )
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.client.force_login(self.admin)
+
+    def get_stats(self):
+        response = self.client.get(reverse('patient_statistics'))
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_age_buckets_and_status_counts(self):
+        context = self.get_stats()
+        ages = {row['label']: row['count'] for row in context['age_stats']}
+        self.assertEqual(ages, {'0-12': 1, '13-17': 1, '18-39': 2, '40-59': 0, '60+': 1})
+        self.assertEqual(context['appointment_stats']['approved'], 2)
+        self.assertEqual(context['appointment_stats']['pending'], 3)
+        self.assertEqual(context['appointment_stats']['total'], 5)
+
+    def test_cached_until_a_write_invalidates_it(self):
+        self.get_stats()
+        with CaptureQueriesContext(connection) as ctx:
+            self.get_stats()
+        tables = (Appointment._meta.db_table, PatientProfile._meta.db_table)
+        self.assertFalse([q for q in ctx.captured_queries if any(table in q['sql'] for table in tables)])
+
+        appointment = Appointment.objects.filter(status='Pending').first()
+        appointment.status = 'Rejected'
+        appointment.save()
+        self.assertEqual(self.get_stats()['appointment_stats']['rejected'], 1)
+
+        PatientProfile.objects.filter(age=72).get().delete()
+        self.assertEqual(self.get_stats()['total_patients'], 4)
+
+    @mock.patch('adminpanel.replica.replica_available', return_value=True)
+    def test_misses_are_filled_from_the_primary(self, available):
+        # even in reporting mode; a query on 'replica' is refused in this test case
+        with replica.reporting():
+            stats = async_to_sync(statistics.aget_patient_statistics)()
+        self.assertEqual(stats['total_patients'], 5)
+        self.assertEqual(caches['shared'].get(statistics.CACHE_KEY), stats)
+
+
+class AutoAssignTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        cls.doctors = []
+        for name in ['house', 'wilson']:
+            user = User.objects.create_user(username=name, password='pass')
+            cls.doctors.append(DoctorProfile.objects.create(
+                user=user, full_name=name, specialization='Cardiology',
+                working_from=time(9, 0), working_to=time(10, 0)
+            ))
+
+    def book(self, at, department='Cardiology'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor_type=department,
+            appointment_date=date(2026, 3, 2), appointment_time=at
+        )
+
+    def test_balances_load_and_respects_slots(self):
+        # house already holds 9:00, so 9:00 can only go to wilson
+        slots.reserve(self.doctors[0], date(2026, 3, 2), time(9, 0))
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctors[0].user, doctor_type='Cardiology',
+            appointment_date=date(2026, 3, 2), appointment_time=time(9, 0), status='Approved'
+        )
+        first = self.book(time(9, 0))
+        second = self.book(time(9, 0))
+        third = self.book(time(9, 15))
+        fourth = self.book(time(9, 15))
+        other = self.book(time(9, 30), department='Neurology')
+
+        # constant in the queue length: 4 reads, one write per doctor-day and
+        # the shared statistics invalidation
+        with self.assertNumQueries(13):
+            result = auto_assign()
+
+        self.assertEqual(len(result.assigned), 3)
+        self.assertEqual(sorted(result.unassigned), sorted([second.id, other.id]))
+
+        assigned = dict(Appointment.objects.filter(status='Approved').values_list('id', 'doctor__username'))
+        self.assertEqual(assigned[first.id], 'wilson')
+        self.assertEqual({assigned[third.id], assigned[fourth.id]}, {'house', 'wilson'})
+
+        bitmaps = dict(DoctorAvailability.objects.values_list('doctor__username', 'booked'))
+        self.assertEqual(bitmaps['house'], bitmaps['wilson'])
+
+    def test_dry_run_writes_nothing(self):
+        self.book(time(9, 0))
+        result = auto_assign(dry_run=True)
+        self.assertEqual(len(result.assigned), 1)
+        self.assertFalse(Appointment.objects.filter(status='Approved').exists())
+        self.assertFalse(DoctorAvailability.objects.exists())
+
+    def test_admin_queue_action(self):
+        self.book(time(9, 0))
+        self.client.force_login(self.admin)
+        self.client.post(reverse('appoinment_request'), {'action': 'auto_assign'})
+        self.assertFalse(Appointment.objects.filter(status='Pending').exists())
+
+
+class BulkTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        doctor = User.objects.create_user(username='house', password='pass')
+        cls.profile = DoctorProfile.objects.create(
+            user=doctor, full_name='house', specialization='Cardiology',
+            working_from=time(9, 0), working_to=time(12, 0)
+        )
+
+    def book(self, at, status='Pending'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor_type='Cardiology', status=status,
+            appointment_date=date(2026, 3, 2), appointment_time=at
+        )
+
+    def test_reject_only_transitions_pending_rows(self):
+        pending = [self.book(time(9, 0)), self.book(time(9, 15))]
+        approved = self.book(time(9, 30), status='Approved')
+
+        # the UPDATE and the shared statistics invalidation
+        with self.assertNumQueries(2):
+            count = reject_pending([a.id for a in pending] + [approved.id])
+
+        self.assertEqual(count, 2)
+        approved.refresh_from_db()
+        self.assertEqual(approved.status, 'Approved')
+
+    def test_approve_reports_busy_slots(self):
+        first, clash, later = self.book(time(9, 0)), self.book(time(9, 0)), self.book(time(10, 0))
+        count, busy = approve_pending([first.id, clash.id, later.id], self.profile)
+        self.assertEqual((count, busy), (2, [clash.id]))
+        self.assertEqual(
+            set(Appointment.objects.filter(status='Approved').values_list('id', flat=True)),
+            {first.id, later.id}
+        )
+
+    def test_lost_race_rolls_back_reservations(self):
+        appointment = self.book(time(9, 0))
+        reserve = slots.reserve
+
+        # another admin rejects the row between our read and our UPDATE
+        def reserve_then_lose_race(profile, day, at):
+            Appointment.objects.filter(id=appointment.id).update(status='Rejected')
+            return reserve(profile, day, at)
+
+        with mock.patch.object(slots, 'reserve', reserve_then_lose_race):
+            with self.assertRaises(QueueChanged):
+                approve_pending([appointment.id], self.profile)
+
+        self.assertFalse(DoctorAvailability.objects.filter(booked__gt=0).exists())
+
+    def test_bulk_form(self):
+        rows = [self.book(time(9, 0)), self.book(time(9, 15)), self.book(time(9, 30))]
+        self.client.force_login(self.admin)
+        self.client.post(reverse('appoinment_request'), {
+            'action': 'approve', 'doctor': self.profile.user_id,
+            'appointment_ids': [rows[0].id, rows[1].id],
+        })
+        self.client.post(reverse('appoinment_request'), {
+            'action': 'reject', 'appointment_ids': [rows[1].id, rows[2].id],
+        })
+        self.assertEqual(
+            list(Appointment.objects.order_by('id').values_list('status', flat=True)),
+            ['Approved', 'Approved', 'Rejected']
+        )
+
+
+class ReplicaRoutingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+
+    @mock.patch('adminpanel.replica.replica_available', return_value=True)
+    def test_only_reporting_reads_go_to_the_replica(self, available):
+        router = replica.ReplicaRouter()
+        self.assertEqual(Appointment.objects.all().db, 'default')
+        with replica.reporting():
+            self.assertEqual(Appointment.objects.all().db, 'replica')
+            self.assertEqual(router.db_for_write(Appointment), 'default')
+        self.assertEqual(Appointment.objects.all().db, 'default')
+
+    @mock.patch('adminpanel.replica.replica_available', return_value=True)
+    def test_shared_cache_is_read_from_the_primary(self, available):
+        caches['shared'].set('replica-test', 1)
+        with replica.reporting():
+            # a replica query would raise in a TestCase
+            self.assertEqual(caches['shared'].get('replica-test'), 1)
+
+    def test_mirrored_replica_falls_back_to_primary(self):
+        with replica.reporting():
+            self.assertEqual(Appointment.objects.all().db, 'default')
+
+    def test_dashboards_read_from_the_replica(self):
+        self.client.force_login(self.admin)
+        for url_name in ['billing_dashboard', 'appoinment_history']:
+            cache.clear()
+            # only consulted while a view is in reporting mode
+            with mock.patch('adminpanel.replica.replica_available', return_value=False) as available:
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, 200)
+            self.assertTrue(available.called, f"{url_name} does not read from the replica")
+
+        # the statistics are cached, so a miss is filled from the primary
+        for url_name in ['appoinment_request', 'patient_statistics']:
+            with mock.patch('adminpanel.replica.replica_available', return_value=False) as available:
+                self.client.get(reverse(url_name))
+            self.assertFalse(available.called, f"{url_name} reads from the replica")
+
+    def test_refresh_copies_the_primary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            primary, copy = Path(tmp, 'primary.sqlite3'), Path(tmp, 'replica.sqlite3')
+            with sqlite3.connect(primary) as db:
+                db.execute("CREATE TABLE bill (amount INTEGER)")
+                db.executemany("INSERT INTO bill VALUES (?)", [(n,) for n in range(1000)])
+            db.close()
+
+            replica.refresh(primary, copy, pages=2)
+            db = sqlite3.connect(copy)
+            self.assertEqual(db.execute("SELECT SUM(amount) FROM bill").fetchone(), (499500,))
+            db.close()
+            self.assertEqual(list(Path(tmp).glob('*.partial')), [])
+
+
+class RequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.force_login(self.patient)
+        for _ in range(3):
+            self.client.get(reverse('patient_dashboard'))
+        self.client.get('/no-such-page/')
+
+        recorded = metrics.snapshot()
+        dashboard = recorded['patient_dashboard']
+        self.assertEqual(dashboard.count, 3)
+        self.assertEqual(sum(dashboard.buckets), 3)
+        self.assertGreater(dashboard.queries, 0)
+        self.assertGreater(dashboard.sql_time, 0)
+        self.assertEqual(recorded['<unmatched>'].count, 1)
+
+    def test_threads_record_without_sharing_a_shard(self):
+        threads = [Thread(target=lambda: [metrics.record('x', 0.001, 1, 0.0) for _ in range(500)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.snapshot()['x'].count, 2000)
+
+    def test_pages_are_admin_only(self):
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('metrics_dashboard')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('metrics_prometheus')).status_code, 403)
+
+        self.client.force_login(self.admin)
+        self.client.get(reverse('billing_dashboard'))
+        self.assertContains(self.client.get(reverse('metrics_dashboard')), 'billing_dashboard')
+
+    def test_prometheus_exposition(self):
+        metrics.record('billing_dashboard', 0.02, 4, 0.003)
+        metrics.record('billing_dashboard', 20, 4, 0.003)
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get(reverse('metrics_prometheus')).status_code, 403)
+            response = self.client.get(reverse('metrics_prometheus'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+        body = response.content.decode()
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('ehospitality_http_request_duration_seconds_bucket{view="billing_dashboard",le="0.025"} 1', body)
+        self.assertIn('ehospitality_http_request_duration_seconds_bucket{view="billing_dashboard",le="+Inf"} 2', body)
+        self.assertIn('ehospitality_sql_queries_total{view="billing_dashboard"} 8', body)
+
+
+class QueryCheckTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.doctor = User.objects.create_user(username='doctor', password='pass')
+        cls.doctor.groups.add(Group.objects.create(name='Doctor'))
+        DoctorProfile.objects.create(user=cls.doctor, full_name='House', specialization='Cardiology')
+        cls.patients = [User.objects.create_user(username=f'patient{i}', password='pass') for i in range(4)]
+        for i in range(20):
+            for status in ['Approved', 'Completed', 'Rejected']:
+                Appointment.objects.create(
+                    patient=cls.patients[i % 4], doctor=cls.doctor, doctor_type='Cardiology',
+                    appointment_date=date(2026, 1, 1) + timedelta(days=i),
+                    appointment_time=time(10, 0), status=status, bill_amount=100,
+                )
+
+    def test_fingerprint_collapses_in_lists(self):
+        self.assertEqual(
+            querycheck.fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND x = %s'),
+            querycheck.fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s) AND x = %s'),
+        )
+
+    def test_template_lookup_in_a_loop_is_reported_with_its_line(self):
+        template = Template("<ul>\n{% for a in appointments %}\n<li>{{ a.patient.username }}</li>{% endfor %}</ul>")
+        recorder = querycheck.QueryRecorder(threshold=3)
+        with connection.execute_wrapper(recorder):
+            template.render(Context({'appointments': Appointment.objects.all()}))
+
+        repeat, = recorder.repeats()
+        self.assertEqual((repeat.line, repeat.source), (3, 'a.patient.username'))
+        self.assertEqual(repeat.count, 60)
+        self.assertTrue(querycheck.check('some_view', recorder)[0].startswith('N+1 in some_view'))
+
+    @override_settings(QUERY_BUDGETS={'patient_dashboard': 1})
+    def test_budget_overrun_fails_the_request(self):
+        self.client.force_login(self.patients[0])
+        with self.assertRaisesMessage(querycheck.QueryCheckFailed, 'its budget is 1'):
+            self.client.get(reverse('patient_dashboard'))
+
+    @override_settings(QUERY_CHECK='log')
+    def test_log_mode_only_warns(self):
+        self.client.force_login(self.patients[0])
+        with override_settings(QUERY_BUDGETS={'patient_dashboard': 1}), self.assertLogs('adminpanel.querycheck'):
+            self.assertEqual(self.client.get(reverse('patient_dashboard')).status_code, 200)
+
+    def test_listing_pages_have_no_n_plus_one(self):
+        # the runner sets QUERY_CHECK='raise', so any N+1 or blown budget raises here
+        pages = [
+            (self.admin, ['appoinment_history', 'billing_dashboard', 'patient_statistics']),
+            (self.patients[0], ['view_bills', 'view_appointemnt', 'view_medical_history', 'patient_dashboard']),
+            (self.doctor, ['doctor_dashboard']),
+        ]
+        for user, url_names in pages:
+            self.client.force_login(user)
+            for url_name in url_names:
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, 200, url_name)
+
+
+class SyntheticDataTests(TestCase):
+
+    def test_generator_fills_every_table(self):
+        call_command(
+            'generate_synthetic_data', patients=12, doctors=4, appointments=300,
+            chunk_size=64, stdout=StringIO()
+        )
+        self.assertEqual(User.objects.filter(groups__name='Doctor').count(), 4)
+        self.assertEqual(DoctorProfile.objects.count(), 4)
+        self.assertEqual(PatientProfile.objects.count(), 12)
+        self.assertEqual(Appointment.objects.count(), 300)
+        self.assertEqual(set(Appointment.objects.values_list('status', flat=True)),
+                         {'Pending', 'Approved', 'Completed', 'Rejected'})
+        self.assertGreater(Appointment.objects.dates('created_at', 'day').count(), 30)
+
+        # derived tables were rebuilt after the signal-less bulk inserts
+        unpaid = Appointment.objects.filter(status='Completed').exclude(payment_status='Paid')
+        self.assertEqual(
+            PatientBalance.objects.aggregate(total=Sum('outstanding'))['total'],
+            unpaid.aggregate(total=Sum('bill_amount'))['total'],
+        )
+        self.assertEqual(
+            RevenueRollup.objects.aggregate(n=Sum('completed_count'))['n'],
+            Appointment.objects.filter(status='Completed').count(),
+        )
+        self.assertTrue(DoctorAvailability.objects.exists())
+
+        # a second run tops up instead of colliding on usernames
+        synthetic.create_patients(3)
+        self.assertEqual(PatientProfile.objects.count(), 15)
+
+    def test_benchmark_covers_every_route(self):
+        synthetic.create_doctors(8)
+        synthetic.create_patients(5)
+        synthetic.create_appointments(80)
+        synthetic.finish()
+
+        results, skipped = benchmark.run(repeat=1)
+        names = {name for name, _, _ in benchmark.routes()}
+        self.assertEqual(set(results) | set(skipped), names)
+        self.assertEqual(skipped, benchmark.SKIPPED)
+        self.assertEqual(results['appoinment_history']['status'], 200)
+        self.assertGreater(results['appoinment_history']['queries'], 0)
+
+    def test_compare_flags_slower_or_chattier_routes(self):
+        def report(p50, queries):
+            return {'scales': {'1000': {'routes': {'view_bills': {'p50_ms': p50, 'queries': queries}}}}}
+
+        self.assertEqual(benchmark.compare(report(10, 5), report(11, 5), tolerance=0.25), [])
+        self.assertEqual(len(benchmark.compare(report(10, 5), report(20, 6), tolerance=0.25)), 2)
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        for i in range(30):
+            Appointment.objects.create(
+                patient=cls.patient, doctor_type='Cardiology' if i % 3 else 'Neurology',
+                appointment_date=date(2026, 1, 1) + timedelta(days=i), appointment_time=time(10, 0),
+                status='Completed' if i % 2 else 'Rejected', bill_amount=Decimal('150.50'),
+                diagnosis='Flu', prescription='Rest',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, dataset, **params):
+        response = self.client.get(reverse('export_data', args=[dataset]), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_is_streamed_with_filters(self):
+        response, body = self.export('appointments', format='csv', department='Cardiology', date_to='2026-01-20')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="appointments-', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(body.decode().splitlines()))
+        expected = Appointment.objects.filter(doctor_type='Cardiology', appointment_date__lte=date(2026, 1, 20))
+        self.assertEqual([int(row['id']) for row in rows], sorted(expected.values_list('id', flat=True)))
+        self.assertEqual(rows[0]['patient'], 'patient')
+
+    def test_billing_ndjson_only_has_bills(self):
+        _, body = self.export('billing', format='ndjson')
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(records), 15)
+        self.assertEqual(records[0]['amount'], '150.50')
+        self.assertEqual(records[0]['payment_status'], 'Not Paid')
+
+    def test_gzip_matches_plain_output(self):
+        _, plain = self.export('medical-records', format='csv')
+        response, compressed = self.export('medical-records', format='csv', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    @override_settings(EXPORT_CHUNK_SIZE=7)
+    def test_rows_are_fetched_in_chunks_after_the_view_returns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('export_data', args=['appointments']))
+        self.assertFalse([q for q in ctx.captured_queries if 'patient_appointment' in q['sql']])
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 31)
+
+    def test_exports_are_admin_only_and_validated(self):
+        self.assertEqual(self.client.get(reverse('export_data', args=['salaries'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_data', args=['billing']), {'format': 'xml'}).status_code, 404)
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('export_data', args=['billing'])).status_code, 302)
+
+
+def whose_thread():
+    User.objects.count()
+    return get_ident()
+
+
+class AsyncDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        PatientProfile.objects.create(user=cls.patient, age=30, gender='Female', category='General')
+        Appointment.objects.create(
+            patient=cls.patient, doctor_type='Cardiology', appointment_date=date(2026, 1, 5),
+            appointment_time=time(10, 0), status='Completed', bill_amount=Decimal('120'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_dashboards_render_as_async_views(self):
+        self.assertTrue(asyncio.iscoroutinefunction(views.billing_dashboard))
+        self.assertTrue(asyncio.iscoroutinefunction(views.patient_statistics))
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('billing_dashboard'))
+        self.assertEqual(response.context['total_revenue'], Decimal('120'))
+        self.assertEqual([row['department'] for row in response.context['departments']], ['Cardiology'])
+
+        response = self.client.get(reverse('patient_statistics'))
+        self.assertEqual(response.context['total_patients'], 1)
+        self.assertEqual(response.context['appointment_stats']['completed'], 1)
+        self.assertGreaterEqual(metrics.snapshot()['billing_dashboard'].queries, 4)
+
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('billing_dashboard')).status_code, 302)
+
+    def test_gather_stays_on_the_connection_inside_a_transaction(self):
+        # TestCase wraps the test in a transaction other connections cannot see into
+        self.assertEqual(async_to_sync(gather)(whose_thread, whose_thread), [get_ident()] * 2)
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+
+    def test_gather_runs_each_call_on_its_own_thread(self):
+        User.objects.create_user(username='patient')
+        recorder = querycheck.QueryRecorder(threshold=3)
+        with tracing(recorder):
+            threads = async_to_sync(gather)(whose_thread, whose_thread, User.objects.count)
+
+        self.assertNotIn(get_ident(), threads[:2])
+        self.assertEqual(threads[2], 1)
+        # the worker threads' queries still reach the request's wrappers
+        self.assertEqual(recorder.total, 3)
+
+    def test_load_compares_wsgi_and_asgi(self):
+        User.objects.create_superuser(username='admin', password='pass')
+        result = benchmark.load(['billing_dashboard'], concurrency=2, requests=4)['billing_dashboard']
+        for server in ('wsgi', 'asgi'):
+            self.assertEqual(result[server]['errors'], 0)
+            self.assertGreater(result[server]['requests_per_second'], 0)
+
+
+def sse(response):
+    """[(event, data)] from a finished text/event-stream response."""
+    found = []
+    for block in b''.join(response.streaming_content).decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            found.append((fields['event'], json.loads(fields['data'])))
+    return found
+
+
+class LiveQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        group = Group.objects.create(name='Doctor')
+        cls.doctors = []
+        for name in ('house', 'wilson'):
+            user = User.objects.create_user(username=name, password='pass')
+            user.groups.add(group)
+            cls.doctors.append(DoctorProfile.objects.create(
+                user=user, full_name=name, specialization='Cardiology',
+                working_from=time(9, 0), working_to=time(17, 0)
+            ))
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                patient=self.patient, doctor_type='Cardiology',
+                appointment_date=date(2026, 3, 2), appointment_time=time(9, 0)
+            )
+
+    def listen(self, user, name, after, **params):
+        self.client.force_login(user)
+        return sse(self.client.get(reverse(name), {'after': after, **params}))
+
+    def test_admin_queue_receives_new_and_handled_requests(self):
+        self.client.force_login(self.admin)
+        page = self.client.get(reverse('appoinment_request'))
+        after = page.context['live_after']
+        self.assertContains(page, f'?after={after}')
+
+        appointment = self.book()
+        [(event, data)] = self.listen(self.admin, 'appointment_queue_events', after)
+        self.assertEqual((event, data['id']), ('row', appointment.id))
+        self.assertIn('<strong>patient</strong>', data['html'])
+        self.assertIn('csrfmiddlewaretoken', data['html'])
+        # the stream applies the page's filters
+        self.assertEqual(self.listen(self.admin, 'appointment_queue_events', after, department='Oncology'),
+                         [('remove', {'id': appointment.id})])
+
+        after = live.current_id()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('appoinment_request'), {
+                'appointment_id': appointment.id, 'action': 'approve', 'doctor': self.doctors[0].user_id,
+            })
+        self.assertEqual(self.listen(self.admin, 'appointment_queue_events', after),
+                         [('remove', {'id': appointment.id})])
+
+    def test_doctor_queue_follows_assignment(self):
+        appointment = self.book()
+        house, wilson = (profile.user for profile in self.doctors)
+        after = live.current_id()
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_pending([appointment.id], self.doctors[0])
+
+        [(event, data)] = self.listen(house, 'doctor_queue_events', after)
+        self.assertEqual(event, 'row')
+        self.assertIn(reverse('complete_consultation', args=[appointment.id]), data['html'])
+        self.assertEqual(self.listen(wilson, 'doctor_queue_events', after), [('remove', {'id': appointment.id})])
+
+        after = live.current_id()
+        self.client.force_login(house)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reject_doctor_appointment', args=[appointment.id]))
+        self.assertEqual(self.listen(house, 'doctor_queue_events', after), [('remove', {'id': appointment.id})])
+
+    def test_quiet_poll_and_stale_resume(self):
+        after = live.current_id()
+        self.client.force_login(self.admin)
+        started = perf_counter()
+        response = self.client.get(reverse('appointment_queue_events'), {'after': after})
+        body = b''.join(response.streaming_content).decode()
+        # a WSGI poll answers at once and tells the browser when to ask again
+        self.assertLess(perf_counter() - started, 1)
+        self.assertEqual(body, f"retry: {settings.LIVE_POLL_MS}\n\nid: {after}\n\n")
+
+        self.assertEqual(self.listen(self.admin, 'appointment_queue_events', 'another-boot:3'), [('reset', {})])
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('doctor_queue_events')).status_code, 302)
+
+    def test_waiting_streams_wake_on_publish(self):
+        seq = live.bus.last
+        Timer(0.05, live.bus.publish, [{1}]).start()
+
+        async def wait():
+            started = perf_counter()
+            await live.bus.wait(seq, timeout=5)
+            return perf_counter() - started
+
+        self.assertLess(async_to_sync(wait)(), 1)
+        self.assertEqual(live.bus.since(seq), ({1}, seq + 1))
+
+
+class QueueDoctorPickerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        patient = User.objects.create_user(username='patient', password='pass')
+        doctor = User.objects.create_user(username='house', password='pass')
+        doctor.groups.add(Group.objects.create(name='Doctor'))
+        cls.profile = DoctorProfile.objects.create(user=doctor, full_name='house', specialization='Cardiology')
+        for day in range(5):
+            Appointment.objects.create(
+                patient=patient, doctor_type='Cardiology',
+                appointment_date=date(2026, 3, 2) + timedelta(days=day), appointment_time=time(9, 0)
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_doctor_lists_are_rendered_once_per_page(self):
+        self.client.force_login(self.admin)
+        html = self.client.get(reverse('appoinment_request')).content.decode()
+        option = f'<option value="{self.profile.user_id}">'
+        # the bulk form, the all-doctors list and the Cardiology list; none in the five rows
+        self.assertEqual(html.count(option), 3)
+        self.assertIn('<template class="doctor-options" data-department="Cardiology">' + option, html)
+        self.assertEqual(html.count('class="doctor-select" data-department="Cardiology"'), 5)
+
+    def test_row_cost_does_not_depend_on_the_roster(self):
+        def per_ten_rows(doctors):
+            return benchmark.render_queue(20, doctors, repeat=1)[1] - benchmark.render_queue(10, doctors, repeat=1)[1]
+        self.assertEqual(per_ten_rows(10), per_ten_rows(150))
+
+
+class SessionStoreTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # 'shared' and 'other' are two processes' handles on one cache
+        location = cls.enterClassContext(tempfile.TemporaryDirectory())
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        cls.enterClassContext(override_settings(CACHES={
+            'default': settings.CACHES['default'], 'shared': shared, 'other': shared,
+        }))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.client.force_login(self.patient)
+        self.client.get(reverse('patient_dashboard'))
+
+    def session_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('patient_dashboard')).status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if Session._meta.db_table in q['sql']]
+
+    def test_warm_sessions_are_read_from_the_cache(self):
+        self.assertEqual(self.session_queries(), [])
+
+        caches['shared'].clear()
+        self.assertEqual(len(self.session_queries()), 1)
+        self.assertEqual(self.session_queries(), [])
+
+    def test_expiry_refresh_is_throttled(self):
+        key = self.client.session.session_key
+        written = Session.objects.get(pk=key).expire_date
+        self.assertEqual(self.session_queries(), [])
+
+        later = timezone.now() + timedelta(seconds=301)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertTrue(self.session_queries()[0].startswith('UPDATE'))
+        self.assertGreater(Session.objects.get(pk=key).expire_date, written)
+
+    def test_data_changes_are_written_at_once(self):
+        store = sessions.SessionStore(self.client.session.session_key)
+        store['note'] = 'x'
+        with CaptureQueriesContext(connection) as ctx:
+            store.save()
+        self.assertEqual(len([q for q in ctx.captured_queries if Session._meta.db_table in q['sql']]), 1)
+        self.assertEqual(sessions.SessionStore(store.session_key).load()['note'], 'x')
+
+    def test_logout_drops_the_cached_session(self):
+        key = self.client.session.session_key
+        self.client.post(reverse('logout'))
+        self.assertFalse(Session.objects.filter(pk=key).exists())
+        self.assertFalse(sessions.SessionStore(key).exists(key))
+        self.assertEqual(sessions.SessionStore(key).load(), {})
+
+    def test_logout_in_another_worker_ends_the_session(self):
+        key = self.client.session.session_key
+        self.assertTrue(sessions.SessionStore(key).load())  # now cached
+        with self.settings(SESSION_CACHE_ALIAS='other'):
+            sessions.SessionStore(key).delete()
+        self.assertEqual(sessions.SessionStore(key).load(), {})
+
+    def test_process_local_caches_are_not_used(self):
+        key = self.client.session.session_key
+        local = {
+            name: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name}
+            for name in ('worker1', 'worker2')
+        }
+        with self.settings(CACHES={'default': settings.CACHES['default'], **local}):
+            with self.settings(SESSION_CACHE_ALIAS='worker1'):
+                self.assertIsNone(sessions.session_cache())
+                self.assertTrue(sessions.SessionStore(key).load())
+            with self.settings(SESSION_CACHE_ALIAS='worker2'):
+                sessions.SessionStore(key).delete()
+            with self.settings(SESSION_CACHE_ALIAS='worker1'):
+                self.assertEqual(sessions.SessionStore(key).load(), {})
+
+    def test_expired_sessions_are_purged_in_batches(self):
+        expired = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(
+            Session(session_key=f'expired{n:032}', session_data='', expire_date=expired) for n in range(5)
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(sessions.purge_expired(batch_size=2), 5)
+        self.assertEqual(len(ctx.captured_queries), 7)  # three batches and the empty check
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)), [self.client.session.session_key])
+
+        out = StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('Purged 0 expired sessions', out.getvalue())
+
+
+@override_settings(LOGIN_THROTTLE_RATES={'ip': (4, 1), 'username': (2, 6)})
+class LoginThrottleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        User.objects.create_user(username='patient', password='pass')
+
+    def setUp(self):
+        caches['shared'].clear()
+        throttle.reset()
+
+    def test_buckets_refill_at_their_rate(self):
+        buckets = [('username', 'patient')]
+        self.assertEqual([throttle.take(buckets, now=100) for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(throttle.take(buckets, now=100), 10)
+        self.assertAlmostEqual(throttle.take(buckets, now=105), 5)
+        self.assertEqual(throttle.take(buckets, now=110), 0)
+
+    def test_buckets_are_shared_between_workers(self):
+        buckets = [('username', 'patient')]
+        throttle.take(buckets, now=100)
+        cache.clear()  # another worker has its own 'default' cache, but not its own buckets
+        throttle.take(buckets, now=100)
+        self.assertGreater(throttle.take(buckets, now=100), 0)
+
+    def test_excess_attempts_are_refused_before_hashing(self):
+        url = reverse('login')
+        with mock.patch('django.contrib.auth.authenticate', wraps=authenticate) as checked:
+            for _ in range(2):
+                self.assertEqual(self.client.post(url, {'username': 'patient', 'password': 'x'}).status_code, 200)
+            response = self.client.post(url, {'username': 'Patient', 'password': 'pass'})
+            self.assertEqual(response.status_code, 429)
+            self.assertIn(int(response['Retry-After']), range(1, 11))
+            self.assertContains(response, 'Too many login attempts', status_code=429)
+
+            # the IP bucket covers every username and every login page
+            self.assertEqual(self.client.post(reverse('admin_login'), {'username': 'admin', 'password': 'pass'}).status_code, 302)
+            self.assertEqual(self.client.post(reverse('doctor_login'), {'username': 'house', 'password': 'x'}).status_code, 200)
+            self.assertEqual(self.client.post(reverse('doctor_login'), {'username': 'cuddy', 'password': 'x'}).status_code, 429)
+        self.assertEqual(checked.call_count, 4)
+
+    def test_counters_estimate_the_hashing_saved(self):
+        for _ in range(3):
+            self.client.post(reverse('login'), {'username': 'patient', 'password': 'x'})
+        stats = throttle.snapshot()['patient']
+        self.assertEqual((stats.allowed, stats.throttled), (2, 1))
+        self.assertAlmostEqual(stats.saved_seconds, stats.auth_seconds / 2)
+
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(reverse('metrics_dashboard')), 'Login Throttle')
+        body = self.client.get(reverse('metrics_prometheus')).content.decode()
+        self.assertIn('ehospitality_login_attempts_total{endpoint="patient",outcome="throttled"} 1', body)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class OnboardingTests(TestCase):
+
+    PATIENTS = (
+        "username,password,full_name,age,gender,place,category\n"
+        "ann,secret1,Ann,34,Female,Kochi,General\n"
+        "bob,secret2,Bob,7,Male,Kollam,Child\n"
+        "carl,,Carl,old,Male,Kannur,General\n"
+        "ann,other,Ann Again,35,Female,Kochi,General\n"
+        "dee,secret4,Dee,71,Female,Kochi,Senior\n"
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_patients_from_csv(self):
+        result = onboarding.import_users(onboarding.read_rows(StringIO(self.PATIENTS), 'csv'), 'patient', workers=0)
+        self.assertEqual((result.created, result.skipped), (3, 1))
+        self.assertEqual(result.invalid, [(4, 'age must be a whole number')])
+        ann = User.objects.get(username='ann')
+        self.assertTrue(ann.check_password('secret1'))
+        self.assertEqual(PatientProfile.objects.get(user=ann).full_name, 'Ann')
+        self.assertEqual(PatientProfile.objects.get(user__username='bob').category, 'Child')
+
+    def test_a_failed_import_resumes(self):
+        insert = onboarding._insert
+        calls = []
+
+        def fail_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("disk full")
+            return insert(*args)
+
+        rows = lambda: onboarding.read_rows(StringIO(self.PATIENTS), 'csv')
+        with mock.patch.object(onboarding, '_insert', fail_second_chunk), self.assertRaises(RuntimeError):
+            onboarding.import_users(rows(), 'patient', chunk_size=2, workers=0)
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['ann', 'bob'])
+
+        result = onboarding.import_users(rows(), 'patient', chunk_size=2, workers=0)
+        self.assertEqual((result.created, result.skipped), (1, 3))
+        self.assertEqual(PatientProfile.objects.count(), 3)
+
+    def test_doctors_from_ndjson_hashed_in_a_pool(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as source:
+            for name, specialization in [('house', 'Diagnostics'), ('wilson', 'Oncology'), ('cuddy', 'Oncology')]:
+                source.write(json.dumps({'username': name, 'password': f'{name}-pw', 'specialization': specialization}) + '\n')
+            source.write('{not json\n')
+        self.addCleanup(Path(source.name).unlink)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_users', source.name, role='doctor', workers=2, chunk_size=2, stdout=out, stderr=err)
+        self.assertIn('Imported 3 doctors; 0 already existed, 1 invalid', out.getvalue())
+        self.assertIn('line 4: not an object', err.getvalue())
+
+        house = User.objects.get(username='house')
+        self.assertTrue(house.check_password('house-pw'))
+        self.assertTrue(house.groups.filter(name='Doctor').exists())
+        self.assertEqual(house.doctor_profile.full_name, 'house')
+        self.client.force_login(house)
+        self.assertEqual(self.client.get(reverse('doctor_dashboard')).status_code, 200)
@@ -0,0 +1,153 @@
+"""
+Token-bucket throttle in front of the login views.
+
+Each login POST takes a token from two buckets before authenticate()
+runs its PBKDF2 hash: one for the client IP and one for the username
+typed. When either bucket is empty the attempt is refused with a 429
+and nothing is hashed. LOGIN_THROTTLE_RATES gives each bucket kind a
+(burst, tokens refilled per minute).
+
+A bucket is one timestamp, the time at which it will be full again
+(the GCRA form of a token bucket), kept in the LOGIN_THROTTLE_CACHE_ALIAS
+cache. That has to be a cache every server process shares (the
+'shared' alias: Redis, or the database cache table); with a
+per-process cache each worker would grant its own full allowance. A
+bucket is updated without a lock, and simultaneous attempts on one key
+can overshoot by a token or two.
+
+Per endpoint, this process counts attempts let through, attempts
+refused and time spent in authenticate(). Refused attempts times the
+mean authenticate() time is the hashing CPU the throttle saved.
+"""
+import hashlib
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib import auth, messages
+from django.core.cache import caches
+from django.shortcuts import render
+
+
+_lock = threading.Lock()
+_counters = {}  # endpoint -> [allowed, throttled, authenticate() seconds]
+
+
+@dataclass
+class LoginStats:
+    endpoint: str
+    allowed: int = 0
+    throttled: int = 0
+    auth_seconds: float = 0.0
+
+    @property
+    def avg_auth_ms(self):
+        return self.auth_seconds * 1000 / self.allowed if self.allowed else 0
+
+    @property
+    def saved_seconds(self):
+        """authenticate() time the refused attempts would have cost."""
+        return self.throttled * self.auth_seconds / self.allowed if self.allowed else 0
+
+
+def _count(endpoint, allowed=0, throttled=0, auth_seconds=0.0):
+    with _lock:
+        row = _counters.setdefault(endpoint, [0, 0, 0.0])
+        row[0] += allowed
+        row[1] += throttled
+        row[2] += auth_seconds
+
+
+def snapshot():
+    """{endpoint: LoginStats} for this process."""
+    with _lock:
+        return {endpoint: LoginStats(endpoint, *row) for endpoint, row in sorted(_counters.items())}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _key(kind, value):
+    return f'login-throttle:{kind}:{hashlib.sha1(value.encode()).hexdigest()}'
+
+
+def take(buckets, now=None):
+    """
+    Take a token from every (kind, value) bucket, or from none when one
+    of them is empty. Returns 0 if the attempt may go ahead, otherwise
+    the seconds until it could.
+    """
+    now = time.time() if now is None else now
+    cache = caches[settings.LOGIN_THROTTLE_CACHE_ALIAS]
+    rates = {_key(kind, value): settings.LOGIN_THROTTLE_RATES[kind] for kind, value in buckets}
+    full_at = cache.get_many(rates)
+    updates, retry_after, timeout = {}, 0.0, 0
+    for key, (burst, per_minute) in rates.items():
+        interval = 60 / per_minute
+        after = max(full_at.get(key, now), now) + interval
+        retry_after = max(retry_after, after - now - burst * interval)
+        updates[key] = after
+        timeout = max(timeout, math.ceil(burst * interval))
+    if retry_after > 0:
+        return retry_after
+    cache.set_many(updates, timeout)
+    return 0
+
+
+def authenticate(request, endpoint, username, password):
+    """
+    auth.authenticate() unless the IP or username bucket is empty.
+    Returns (user, retry_after); a non-zero retry_after means no password
+    was checked.
+    """
+    buckets = [('ip', client_ip(request))]
+    if username:
+        buckets.append(('username', username.strip().lower()))
+    retry_after = take(buckets)
+    if retry_after:
+        _count(endpoint, throttled=1)
+        return None, retry_after
+
+    started = time.perf_counter()
+    user = auth.authenticate(request, username=username, password=password)
+    _count(endpoint, allowed=1, auth_seconds=time.perf_counter() - started)
+    return user, 0
+
+
+def refused(request, template_name, retry_after):
+    """The login page again, as a 429 with Retry-After."""
+    seconds = math.ceil(retry_after)
+    messages.error(request, f"Too many login attempts. Try again in {seconds} seconds.")
+    response = render(request, template_name, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def prometheus_text():
+    lines = [
+        '# HELP ehospitality_login_attempts_total Login POSTs by endpoint and outcome.',
+        '# TYPE ehospitality_login_attempts_total counter',
+    ]
+    stats = snapshot().values()
+    for row in stats:
+        lines.append(f'ehospitality_login_attempts_total{{endpoint="{row.endpoint}",outcome="allowed"}} {row.allowed}')
+        lines.append(f'ehospitality_login_attempts_total{{endpoint="{row.endpoint}",outcome="throttled"}} {row.throttled}')
+    lines += [
+        '# HELP ehospitality_login_auth_seconds_total Time spent in authenticate() by endpoint.',
+        '# TYPE ehospitality_login_auth_seconds_total counter',
+    ]
+    lines += [f'ehospitality_login_auth_seconds_total{{endpoint="{row.endpoint}"}} {row.auth_seconds!r}' for row in stats]
+    lines += [
+        '# HELP ehospitality_login_auth_seconds_saved_total Estimated authenticate() time not spent on throttled attempts.',
+        '# TYPE ehospitality_login_auth_seconds_saved_total counter',
+    ]
+    lines += [f'ehospitality_login_auth_seconds_saved_total{{endpoint="{row.endpoint}"}} {row.saved_seconds!r}' for row in stats]
+    return '\n'.join(lines) + '\n'
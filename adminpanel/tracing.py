@@ -0,0 +1,40 @@
+"""
+Request-scoped SQL instrumentation.
+
+connection.execute_wrapper() only reaches the connection of the thread
+that installs it, while an async view's queries run on sync_to_async
+worker threads, each with its own connection. install() (connected to
+connection_created) puts one dispatcher on every connection as it is
+opened; it forwards each query to the wrappers registered with
+tracing() in the context the query runs in. sync_to_async copies the
+caller's context into the worker thread, so this follows a request
+across threads.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+
+_wrappers = ContextVar('sql_wrappers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    wrappers = _wrappers.get()
+    for wrapper in reversed(wrappers):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch)
+
+
+@contextmanager
+def tracing(*wrappers):
+    """Pass every query run in this context (any thread) through `wrappers`."""
+    token = _wrappers.set(_wrappers.get() + wrappers)
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from doctor import slots
+from patient.models import Appointment
+from . import live
+from .statistics import invalidate_patient_statistics
+
+
+# Status changes are compare-and-set UPDATEs: the WHERE clause repeats the
+# status the row must still be in, so concurrent admins never overwrite
+# each other and the returned row count is what actually transitioned.
+# They bypass Appointment.save(); none of them touch a Completed row, so
+# the revenue rollup is unaffected, but the live queues are told directly.
+
+
+class QueueChanged(Exception):
+    """Some selected appointments left Pending while they were being approved."""
+
+
+def reject_pending(ids):
+    """Pending -> Rejected for `ids`. Returns how many rows transitioned."""
+    count = Appointment.objects.filter(id__in=ids, status='Pending').update(status='Rejected')
+    if count:
+        invalidate_patient_statistics()
+        live.changed(ids)
+    return count
+
+
+def approve_pending(ids, profile):
+    """
+    Pending -> Approved for `ids`, all assigned to the doctor of `profile`.
+    Each appointment's slot is reserved first; ones whose slot the doctor
+    no longer has free stay Pending. Returns (approved count, busy ids).
+    """
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.filter(id__in=ids, status='Pending')
+            .values_list('id', 'appointment_date', 'appointment_time')
+        )
+        approved, busy = [], []
+        for appointment_id, day, at in rows:
+            if slots.reserve(profile, day, at):
+                approved.append(appointment_id)
+            else:
+                busy.append(appointment_id)
+
+        count = Appointment.objects.filter(id__in=approved, status='Pending').update(
+            doctor_id=profile.user_id, status='Approved'
+        )
+        if count != len(approved):
+            # another admin got there first; drop our slot reservations too
+            raise QueueChanged()
+
+    if count:
+        invalidate_patient_statistics()
+        live.changed(approved)
+    return count, busy
+
+
+def reject_assigned(appointment_id, doctor):
+    """A doctor turns down one of their Approved appointments, freeing the slot."""
+    with transaction.atomic():
+        approved = Appointment.objects.filter(id=appointment_id, doctor=doctor, status='Approved')
+        slot = approved.values_list('appointment_date', 'appointment_time').first()
+        count = approved.update(status='Rejected')
+        if count:
+            slots.release(doctor.id, *slot)
+
+    if count:
+        invalidate_patient_statistics()
+        live.changed([appointment_id])
+    return count
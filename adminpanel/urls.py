@@ -10,6 +10,7 @@ urlpatterns = [
     
     #appoinment 
     path('appoinment-request/', views.appoinment_request, name='appoinment_request'),
+    path('appoinment-request/live/', views.appointment_queue_events, name='appointment_queue_events'),
     path('appointment-history/', views.appointment_history, name='appoinment_history'),
     path('approve/<int:appointment_id>/', views.approve_appointment, name='approve_appointment'),
     path('reject/<int:appointment_id>/', views.reject_appointment, name='reject_appointment'),
@@ -25,5 +26,12 @@ urlpatterns = [
     #doctor
     path('doctor-list/', views.doctor_list, name='doctor_list'),
      path('doctor-delete/<int:id>/', views.doctor_delete, name='doctor_delete'),
+
+    #exports
+    path('export/<slug:dataset>/', views.export_data, name='export_data'),
+
+    #metrics
+    path('metrics/', views.metrics_dashboard, name='metrics_dashboard'),
+    path('metrics/prometheus/', views.metrics_prometheus, name='metrics_prometheus'),
     
 ]
\ No newline at end of file
@@ -1,70 +1,171 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.template.loader import render_to_string
 from patient.models import Appointment
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.contrib.auth import authenticate, login,logout
+from django.contrib.auth import login,logout
+from doctor.directory import get_directory
 from doctor.models import DoctorProfile
 from django.shortcuts import render, redirect
 from patient.models import PatientProfile
-from django.db.models import Count
+from patient import archive, ledger
+from patient.roles import ADMIN, get_role, role_required, store_role
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 import calendar
+import hmac
 from datetime import datetime
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.db.models import Sum
 from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from . import exports, live, metrics, throttle
+from .models import RevenueRollup
+from .parallel import gather
+from .pagination import get_page_size, keyset_page
+from .replica import reads_from_replica
+from .scheduler import auto_assign
+from .transitions import QueueChanged, approve_pending, reject_pending
+from .statistics import aget_patient_statistics
+
+HISTORY_STATUSES = ['Approved', 'Completed', 'Rejected']
+
+
+def filter_appointments(queryset, params):
+    """Apply the ?date_from= / ?date_to= / ?department= queue filters."""
+    date_from = parse_date(params.get('date_from') or '')
+    date_to = parse_date(params.get('date_to') or '')
+    department = params.get('department')
+
+    if date_from:
+        queryset = queryset.filter(appointment_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(appointment_date__lte=date_to)
+    if department:
+        queryset = queryset.filter(doctor_type=department)
+    return queryset
+
+
+def approve_and_report(request, ids, profile):
+    """Approve `ids` for one doctor and flash what actually happened."""
+    doctor_name = profile.user.username
+    try:
+        count, busy = approve_pending(ids, profile)
+    except QueueChanged:
+        messages.error(request, "Some of these appointments were just handled by someone else. Nothing was changed.")
+        return
+
+    if count:
+        messages.success(request, f"{count} appointment(s) approved and assigned to Dr. {doctor_name}.")
+    if busy:
+        messages.error(request, f"Dr. {doctor_name} is not available for {len(busy)} of the selected appointment(s).")
+    if not count and not busy:
+        messages.info(request, "None of the selected appointments were still pending.")
+
+
+def appointment_page(request, statuses):
+    """One keyset page of appointments in `statuses`, newest first."""
+    base = filter_appointments(
+        Appointment.objects.select_related('patient', 'doctor'),
+        request.GET
+    )
+    # one index seek per status on appt_status_created_idx
+    querysets = [base.filter(status=status) for status in statuses]
+    page_size = get_page_size(request.GET.get('page_size'))
+    appointments, next_cursor = keyset_page(querysets, request.GET.get('cursor'), page_size)
+
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return {
+        'appointments': appointments,
+        'next_cursor': next_cursor,
+        'filter_query': params.urlencode(),
+        'filters': request.GET,
+        'page_size': page_size,
+    }
+
 
-# Helper to check if user is admin
-def is_admin(user):
-    return user.is_superuser
+def doctor_picker(directory):
+    """
+    The doctor lists appoinment_request renders once: every doctor for the
+    bulk form, and one cached <option> fragment per department that each
+    row's <select> is filled from in the browser, by its doctor_type.
+    """
+    return {
+        'doctor_options': directory.options[''],
+        'doctor_lists': directory.options,
+        'departments': directory.departments,
+    }
 
 
-@login_required(login_url='admin_login')
-@user_passes_test(is_admin, login_url='admin_login')
+@role_required(ADMIN, login_url='admin_login')
 def appoinment_request(request):
+    if request.method == 'POST' and request.POST.get('action') == 'auto_assign':
+        result = auto_assign()
+        messages.success(
+            request,
+            f"Auto-assigned {len(result.assigned)} appointments. "
+            f"{len(result.unassigned)} could not be matched to a free doctor."
+        )
+        return redirect('appoinment_request')
+
     if request.method == 'POST':
-        appointment_id = request.POST.get('appointment_id')
         action = request.POST.get('action')
         doctor_user_id = request.POST.get('doctor') # Get the doctor ID from the <select>
+        # a row's own form posts appointment_id, the bulk form appointment_ids
+        ids = request.POST.getlist('appointment_ids') or [request.POST.get('appointment_id')]
+        ids = [int(i) for i in ids if i and i.isdigit()]
 
-        appointment = get_object_or_404(Appointment, id=appointment_id)
+        if not ids:
+            messages.error(request, "Please select at least one appointment.")
 
-        if action == 'approve':
+        elif action == 'approve':
             if doctor_user_id:
-                # 1. Fetch the actual User object for the doctor
-                doctor_user = get_object_or_404(User, id=doctor_user_id)
-                # 2. Assign the doctor to the appointment
-                appointment.doctor = doctor_user
-                appointment.status = 'Approved'
-                appointment.save()
-                messages.success(request, f"Appointment for {appointment.patient.username} approved and assigned to Dr. {doctor_user.username}.")
+                profile = get_object_or_404(
+                    DoctorProfile.objects.select_related('user'),
+                    user_id=doctor_user_id
+                )
+                approve_and_report(request, ids, profile)
             else:
                 messages.error(request, "Please select a doctor before approving.")
-                return redirect('appoinment_request')
-        
+
         elif action == 'reject':
-            appointment.status = 'Rejected'
-            appointment.save()
-            messages.info(request, "Appointment has been rejected.")
+            count = reject_pending(ids)
+            messages.info(request, f"{count} appointment(s) rejected.")
 
         return redirect('appoinment_request')
 
-    # Fetching logic remains the same
-    appointments = Appointment.objects.filter(status='Pending').order_by('-created_at')
-    doctors = DoctorProfile.objects.all().select_related('user')
-
-    return render(request, 'appoinment_request.html', {
-        'appointments': appointments,
-        'doctors': doctors
-    })
+    context = appointment_page(request, ['Pending'])
+    context.update(doctor_picker(get_directory()))
+    context['live_after'] = live.current_id()
+
+    return render(request, 'appoinment_request.html', context)
+
+
+@role_required(ADMIN, login_url='admin_login')
+def appointment_queue_events(request):
+    """Server-sent row updates for appoinment_request, under the same filters (adminpanel.live)."""
+    def render_rows(ids):
+        pending = filter_appointments(
+            Appointment.objects.filter(id__in=ids, status='Pending').select_related('patient', 'doctor'),
+            request.GET
+        )
+        return {
+            appointment.id: render_to_string('appoinment_request_row.html', {'appointment': appointment}, request)
+            for appointment in pending
+        }
+    return live.stream(request, render_rows)
     
-@login_required
+@role_required(ADMIN)
 def admin_dashboard(request):
     return render(request,'admindashboard.html')
     
      
     
-@login_required
-@user_passes_test(is_admin)
+@role_required(ADMIN)
 def manage_appointments(request):
     # Consistency fix: changed 'PENDING' to 'Pending'
     appointments = Appointment.objects.filter(status='Pending')
@@ -75,42 +176,18 @@ def manage_appointments(request):
         'doctors': doctors
     })
     
-@login_required
-@user_passes_test(is_admin)
-def approve_appointment(request, id):
-    appointment = get_object_or_404(Appointment, id=id)
-
-    if request.method == "POST":
-        doctor_id = request.POST.get('doctor')  # The ID from the <select> dropdown
-        
-        if doctor_id:
-            # FIX: Fetch the actual User object using the ID
-            doctor_user = get_object_or_404(User, id=doctor_id)
-            
-            # Assign the User object to the ForeignKey field
-            appointment.doctor = doctor_user 
-            appointment.status = 'Approved'
-            appointment.save()
-            
-            messages.success(request, f"Appointment assigned to {doctor_user.username}")
-            return redirect('appoinment_request')
-        else:
-            messages.error(request, "Please select a doctor.")
-
-    return redirect('admin_dashboard')
-
-@login_required
-@user_passes_test(is_admin)
+@role_required(ADMIN)
 def generate_bill(request, id):
     appointment = get_object_or_404(Appointment, id=id)
 
     if request.method == "POST":
         amount = request.POST.get('amount')
         if amount:
-            appointment.bill_amount = amount
-            # Optionally change status to Completed when billing
-            appointment.status = 'Completed' 
-            appointment.save()
+            with ledger.tracking(appointment):
+                appointment.bill_amount = amount
+                # Optionally change status to Completed when billing
+                appointment.status = 'Completed'
+                appointment.save()
             messages.success(request, f"Bill generated for {appointment.patient.username}.")
             return redirect('admin_dashboard')
 
@@ -128,12 +205,15 @@ def login_view(request):
         u = request.POST.get('username')
         p = request.POST.get('password')
         
-        # Authenticate against the database
-        user = authenticate(request, username=u, password=p)
+        # Authenticate against the database, unless the throttle refuses first
+        user, retry_after = throttle.authenticate(request, 'admin', u, p)
+        if retry_after:
+            return throttle.refused(request, 'loginadmin.html', retry_after)
         
         # Check if user exists and has admin privileges
         if user is not None and user.is_superuser:
             login(request, user)
+            store_role(request, ADMIN)
             return redirect('admin_dashboard')
         else:
             # Provide feedback if login fails
@@ -149,15 +229,18 @@ def admin_logout_view(request):
     # This sends the admin back to the Admin Login page specifically
     return redirect('admin_login')
 
-@login_required
+@role_required(ADMIN)
+@reads_from_replica
 def appointment_history(request):
-    appointments = Appointment.objects.exclude(status='Pending').order_by('-created_at')
-    return render(request, 'appoinment._history.html', {
-        'appointments': appointments
-    })
+    status = request.GET.get('status')
+    statuses = [status] if status in HISTORY_STATUSES else HISTORY_STATUSES
+
+    context = appointment_page(request, statuses)
+    context['statuses'] = HISTORY_STATUSES
+    context['departments'] = get_directory().departments
+    return render(request, 'appoinment._history.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@role_required(ADMIN)
 def patient_list(request):
     from patient.models import PatientProfile
 
@@ -167,50 +250,55 @@ def patient_list(request):
         'patients': patients
     })
 
-@login_required
-def patient_statistics(request):
-    return render(request,'patient_statistics.html')
-
-@login_required
-@user_passes_test(is_admin)
-def billing_dashboard(request):
-    # 1. Fetch full objects so we can use dot notation in templates
-    # select_related('patient') makes it faster by joining the User table
-    appointments_list = Appointment.objects.all().select_related('patient').order_by('-created_at')
-
-    # 2. Total revenue
-    total_revenue = Appointment.objects.filter(status='Completed').aggregate(total=Sum('bill_amount'))['total'] or 0
-
-    # 3. Monthly revenue chart (Keep .values here as it's better for grouping)
-    monthly_data = (
-        Appointment.objects.filter(status='Completed')
-        .annotate(month=TruncMonth('created_at'))
-        .values('month')
-        .annotate(total=Sum('bill_amount'))
-        .order_by('month')
+@role_required(ADMIN)
+@reads_from_replica
+async def billing_dashboard(request):
+    # Everything here reads the RevenueRollup table (kept current by
+    # adminpanel.signals), never patient.Appointment itself. The four
+    # aggregates are independent, so they run concurrently.
+    rollup = RevenueRollup.objects.all()
+    totals = {
+        'completed': Sum('completed_count'),
+        'paid': Sum('paid_count'),
+        'billed': Sum('revenue'),
+        'collected': Sum('paid_revenue'),
+        'outstanding': Sum('revenue') - Sum('paid_revenue'),
+    }
+
+    summary, monthly_data, departments, doctors = await gather(
+        # 1. Total revenue
+        partial(rollup.aggregate, **totals),
+        # 2. Monthly revenue chart
+        partial(list, rollup.annotate(month=TruncMonth('day')).values('month')
+                .annotate(total=Sum('revenue')).order_by('month')),
+        # 3. Breakdown per department and per doctor
+        partial(list, rollup.values('department').annotate(**totals).order_by('-billed')),
+        partial(list, rollup.values('doctor__username').annotate(**totals).order_by('-billed')),
     )
+    total_revenue = summary['billed'] or 0
+    outstanding = summary['outstanding'] or 0
 
     labels = [calendar.month_name[dt['month'].month] + f" {dt['month'].year}" for dt in monthly_data]
     data = [float(dt['total']) for dt in monthly_data]
 
     context = {
-        'appointments': appointments_list, # Passing the full objects
         'total_revenue': total_revenue,
+        'outstanding': outstanding,
+        'departments': departments,
+        'doctors': doctors,
         'chart_labels': labels,
         'chart_data': data,
     }
-    return render(request, 'billing_dashboard.html', context)
+    return await sync_to_async(render)(request, 'billing_dashboard.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@role_required(ADMIN)
 def doctor_list(request):
     # Fetch all doctors with their profile info
-    doctors = DoctorProfile.objects.select_related('user').all()
+    doctors = get_directory().doctors
     
     return render(request, 'doctor_list.html', {'doctors': doctors})
 
-@login_required
-@user_passes_test(is_admin)
+@role_required(ADMIN)
 def doctor_delete(request, id):
     doctor = get_object_or_404(DoctorProfile, id=id)
     
@@ -222,20 +310,27 @@ def doctor_delete(request, id):
     return redirect('doctor_list')
 
 
+@role_required(ADMIN)
 def approve_appointment(request, appointment_id):
-    appointment = get_object_or_404(Appointment, id=appointment_id)
-    appointment.status = 'Approved'
-    appointment.save()
+    if request.method == "POST":
+        doctor_id = request.POST.get('doctor')  # The ID from the <select> dropdown
+
+        if doctor_id:
+            profile = get_object_or_404(DoctorProfile.objects.select_related('user'), user_id=doctor_id)
+            approve_and_report(request, [appointment_id], profile)
+        else:
+            messages.error(request, "Please select a doctor.")
+
     return redirect('appoinment_request')
 
+@role_required(ADMIN)
 def reject_appointment(request, appointment_id):
-    appointment = get_object_or_404(Appointment, id=appointment_id)
-    appointment.status = 'Rejected'
-    appointment.save()
+    if request.method == "POST":
+        count = reject_pending([appointment_id])
+        messages.info(request, f"{count} appointment(s) rejected.")
     return redirect('appoinment_request')
 
-@login_required
-@user_passes_test(is_admin)
+@role_required(ADMIN)
 def patient_delete(request, id):
     patient = get_object_or_404(PatientProfile, id=id)
 
@@ -246,33 +341,51 @@ def patient_delete(request, id):
     return redirect('patient_list')
 
 
-@login_required
-@user_passes_test(is_admin)
-def patient_statistics(request):
-    total_patients = PatientProfile.objects.count()
-
-    gender_stats = PatientProfile.objects.values('gender').annotate(count=Count('gender'))
+@role_required(ADMIN)
+async def patient_statistics(request):
+    # cached, and filled from the primary; invalidated by adminpanel.signals
+    # on profile / appointment writes
+    context = await aget_patient_statistics()
 
-    age_stats = PatientProfile.objects.values('age').annotate(count=Count('age')).order_by('age')
+    return await sync_to_async(render)(request, 'patient_statistics.html', context)
 
-    category_stats = PatientProfile.objects.values('category').annotate(count=Count('category'))
 
-    appointment_stats = {
-        'total': Appointment.objects.count(),
-        'approved': Appointment.objects.filter(status='Approved').count(),
-        'pending': Appointment.objects.filter(status='Pending').count(),
-        'rejected': Appointment.objects.filter(status='Rejected').count(),
-    }
-
-    context = {
-        'total_patients': total_patients,
-        'gender_stats': gender_stats,
-        'age_stats': age_stats,
-        'category_stats': category_stats,
-        'appointment_stats': appointment_stats,
-    }
-
-    return render(request, 'patient_statistics.html', context)
+@role_required(ADMIN)
+def metrics_dashboard(request):
+    return render(request, 'metrics_dashboard.html', {
+        'views': metrics.snapshot().values(),
+        'logins': throttle.snapshot().values(),
+    })
 
 
+def metrics_prometheus(request):
+    token = settings.METRICS_TOKEN
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not (token and hmac.compare_digest(supplied, token)) and get_role(request) != ADMIN:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.prometheus_text() + throttle.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@role_required(ADMIN)
+@reads_from_replica
+def export_data(request, dataset):
+    """Stream a DATASETS export, honouring the queue filters plus ?status=, ?format= and ?gzip=1."""
+    spec = exports.DATASETS.get(dataset)
+    fmt = request.GET.get('format', 'csv')
+    if spec is None or fmt not in exports.FORMATS:
+        raise Http404("Unknown export")
+
+    querysets = [filter_appointments(spec.queryset(model), request.GET) for model in archive.MODELS]
+    if request.GET.get('status'):
+        querysets = [queryset.filter(status=request.GET['status']) for queryset in querysets]
+
+    content_type, extension = exports.FORMATS[fmt]
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{extension}"
+    gzip = request.GET.get('gzip') == '1'
+    if gzip:
+        content_type, filename = 'application/gzip', filename + '.gz'
+
+    response = StreamingHttpResponse(exports.stream(spec, querysets, fmt, gzip), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
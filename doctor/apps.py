@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class DoctorConfig(AppConfig):
     name = 'doctor'
+
+    def ready(self):
+        from . import signals
+        post_migrate.connect(signals.stamp_directory, sender=self)
@@ -0,0 +1,127 @@
+"""
+Cached doctor directory.
+
+The roster changes a few times a week but is read by every booking,
+slot lookup and admin queue page, so it is built once (one query) and
+kept in the cache under a version stamp. doctor.signals replaces the
+stamp whenever a DoctorProfile or doctor's User changes, which orphans
+the old entry.
+
+The stamp lives in the 'shared' cache, so a change made by one worker
+reaches all of them on their next lookup. An entry never changes under
+its stamp, so each process keeps its own copy in the local cache and a
+lookup only reads the stamp.
+"""
+from dataclasses import dataclass, field
+from datetime import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.html import format_html_join
+
+from .models import DoctorProfile
+
+
+VERSION_KEY = 'doctor-directory:version'
+
+
+def _directory_key(version):
+    return f'doctor-directory:{version}'
+
+
+@dataclass(frozen=True)
+class DoctorEntry:
+    """The DoctorProfile fields pages need; no User join at render time."""
+    id: int
+    user_id: int
+    username: str
+    full_name: str
+    specialization: str
+    working_from: time
+    working_to: time
+
+    @property
+    def label(self):
+        return f"Dr. {self.full_name} | {self.specialization}"
+
+
+@dataclass
+class Directory:
+    doctors: list = field(default_factory=list)
+    # specialization -> [DoctorEntry], in full_name order
+    by_department: dict = field(default_factory=dict)
+    # '' -> every doctor, specialization -> that department's doctors
+    options: dict = field(default_factory=dict)
+
+    @property
+    def departments(self):
+        return list(self.by_department)
+
+    def in_department(self, department):
+        return self.by_department.get(department, [])
+
+
+def _options(doctors):
+    return format_html_join('', '<option value="{}">{}</option>', ((dr.user_id, dr.label) for dr in doctors))
+
+
+def directory_from(entries):
+    """A Directory of DoctorEntry objects, already in (specialization, full_name) order."""
+    directory = Directory()
+    for entry in entries:
+        directory.doctors.append(entry)
+        directory.by_department.setdefault(entry.specialization, []).append(entry)
+
+    directory.options[''] = _options(directory.doctors)
+    for department, doctors in directory.by_department.items():
+        directory.options[department] = _options(doctors)
+    return directory
+
+
+def build_directory():
+    """
+    Read the whole roster in one query, always from the primary: a
+    reporting view can miss the cache too, and a roster read from the
+    lagging replica would be cached for a day under the new version.
+    """
+    profiles = (
+        DoctorProfile.objects.using(DEFAULT_DB_ALIAS).select_related('user')
+        .order_by('specialization', 'full_name', 'id')
+    )
+    return directory_from(
+        DoctorEntry(
+            id=profile.id,
+            user_id=profile.user_id,
+            username=profile.user.username,
+            full_name=profile.full_name,
+            specialization=profile.specialization,
+            working_from=profile.working_from,
+            working_to=profile.working_to,
+        )
+        for profile in profiles
+    )
+
+
+def invalidate_directory():
+    caches['shared'].set(VERSION_KEY, uuid4().hex, None)
+
+
+def _version():
+    shared = caches['shared']
+    version = shared.get(VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        if not shared.add(VERSION_KEY, version, None):
+            version = shared.get(VERSION_KEY)  # another worker set it first
+    return version
+
+
+def get_directory():
+    key = _directory_key(_version())
+    directory = cache.get(key)
+    if directory is None:
+        directory = build_directory()
+        cache.set(key, directory, settings.DOCTOR_DIRECTORY_CACHE_TIMEOUT)
+    return directory
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from doctor import slots
+
+
+class Command(BaseCommand):
+    help = "Rebuild doctor slot availability bitmaps from Approved / Completed appointments"
+
+    def handle(self, *args, **options):
+        count = slots.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Availability rebuilt: {count} doctor-days"))
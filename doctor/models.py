@@ -1,3 +1,5 @@
+from datetime import time
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -12,11 +14,37 @@ class DoctorProfile(models.Model):
     )
     full_name = models.CharField(max_length=100)
     specialization = models.CharField(max_length=100)
+    working_from = models.TimeField(default=time(9, 0))
+    working_to = models.TimeField(default=time(17, 0))
 
     def __str__(self):
         return f"Dr. {self.full_name} ({self.specialization})"
 
 
+# =========================
+# Slot availability (doctor.slots)
+# =========================
+class DoctorAvailability(models.Model):
+    """
+    One row per doctor per day; bit i of `booked` is set when slot i
+    (settings.APPOINTMENT_SLOT_MINUTES long, counted from
+    settings.CLINIC_OPENING_TIME) holds an Approved appointment.
+    """
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='availability'
+    )
+    day = models.DateField()
+    booked = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('doctor', 'day')
+
+    def __str__(self):
+        return f"{self.doctor.username} {self.day}"
+
+
 # =========================
 # Appointment Model
 # =========================
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .directory import invalidate_directory
+from .models import DoctorProfile
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def doctor_profile_changed(sender, **kwargs):
+    invalidate_directory()
+
+
+@receiver(post_save, sender=User)
+def doctor_user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # a new user has no profile yet, and login() saves last_login only;
+    # neither changes what the directory shows
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_directory()
+
+
+def stamp_directory(sender, **kwargs):
+    # so the first lookups after a deploy only read the stamp, not write it
+    invalidate_directory()
@@ -0,0 +1,170 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from patient.models import Appointment
+from .directory import get_directory
+from .models import DoctorAvailability
+
+
+# Statuses that occupy a doctor's slot
+BOOKED_STATUSES = ('Approved', 'Completed')
+
+
+def _minutes(value):
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+def slot_count():
+    span = _minutes(settings.CLINIC_CLOSING_TIME) - _minutes(settings.CLINIC_OPENING_TIME)
+    return min(span // settings.APPOINTMENT_SLOT_MINUTES, 63)
+
+
+def slot_index(at):
+    """Number of the slot containing `at`, or None outside clinic hours."""
+    if isinstance(at, str):
+        try:
+            at = time.fromisoformat(at)
+        except ValueError:
+            return None
+    offset = _minutes(at) - _minutes(settings.CLINIC_OPENING_TIME)
+    index = offset // settings.APPOINTMENT_SLOT_MINUTES
+    if not 0 <= index < slot_count():
+        return None
+    return index
+
+
+def slot_time(index):
+    opening = datetime.combine(datetime.min, time.fromisoformat(settings.CLINIC_OPENING_TIME))
+    return (opening + timedelta(minutes=index * settings.APPOINTMENT_SLOT_MINUTES)).time()
+
+
+def working_mask(profile):
+    """Bitmap of the slots that fall inside a doctor's working hours."""
+    mask = 0
+    start, end = _minutes(profile.working_from), _minutes(profile.working_to)
+    for index in range(slot_count()):
+        begins = _minutes(slot_time(index))
+        if start <= begins and begins + settings.APPOINTMENT_SLOT_MINUTES <= end:
+            mask |= 1 << index
+    return mask
+
+
+def free_slots(department, day):
+    """
+    {slot start time: [doctor user ids free then]} for a department on a day.
+    Reads the cached directory and DoctorAvailability only - never the
+    appointment table - so Pending bookings are not subtracted; hold()
+    checks those when a slot is actually booked.
+    """
+    doctors = get_directory().in_department(department)
+    booked = dict(
+        DoctorAvailability.objects
+        .filter(doctor_id__in=[dr.user_id for dr in doctors], day=day)
+        .values_list('doctor_id', 'booked')
+    )
+
+    slots = {}
+    for dr in doctors:
+        free = working_mask(dr) & ~booked.get(dr.user_id, 0)
+        for index in range(slot_count()):
+            if free & (1 << index):
+                slots.setdefault(slot_time(index), []).append(dr.user_id)
+    return dict(sorted(slots.items()))
+
+
+def reserve(profile, day, at):
+    """
+    Atomically mark a doctor's slot as booked.
+    Returns False when the slot is outside clinic or the doctor's hours or
+    already taken - the compare-and-set UPDATE matches no row in that case.
+    """
+    index = slot_index(at)
+    if index is None or not working_mask(profile) & (1 << index):
+        return False
+
+    bit = 1 << index
+    with transaction.atomic():
+        DoctorAvailability.objects.get_or_create(doctor_id=profile.user_id, day=day)
+        updated = (
+            DoctorAvailability.objects
+            .filter(doctor_id=profile.user_id, day=day)
+            .alias(taken=F('booked').bitand(bit))
+            .filter(taken=0)
+            .update(booked=F('booked').bitor(bit))
+        )
+    return updated == 1
+
+
+def hold(department, day, at):
+    """
+    Whether one more Pending appointment fits in a department's slot.
+    Each Pending appointment holds one of the doctors free at its time
+    until an admin assigns it, so the slot fits another only while its
+    Pending appointments are fewer than its free doctors.
+
+    Call it inside the transaction that creates the appointment. It locks
+    the department's availability rows for the day, so bookings of that
+    day - and approvals, whose reserve() updates the same rows - wait for
+    each other and two patients cannot both take the last doctor.
+    """
+    index = slot_index(at)
+    if index is None or day is None:
+        return False
+    bit = 1 << index
+    doctor_ids = [dr.user_id for dr in get_directory().in_department(department) if working_mask(dr) & bit]
+    if not doctor_ids:
+        return False
+
+    DoctorAvailability.objects.bulk_create(
+        [DoctorAvailability(doctor_id=doctor_id, day=day) for doctor_id in doctor_ids],
+        ignore_conflicts=True,
+    )
+    # an UPDATE rather than select_for_update() so SQLite takes its write lock here too
+    DoctorAvailability.objects.filter(doctor_id__in=doctor_ids, day=day).update(booked=F('booked'))
+    booked = DoctorAvailability.objects.filter(doctor_id__in=doctor_ids, day=day).values_list('booked', flat=True)
+    free = sum(1 for bitmap in booked if not bitmap & bit)
+    # one range of appt_dept_day_status_time_idx: this slot's Pending rows only
+    pending = Appointment.objects.filter(
+        doctor_type=department, appointment_date=day, status='Pending',
+        appointment_time__gte=slot_time(index), appointment_time__lt=slot_time(index + 1),
+    ).count()
+    return pending < free
+
+
+def release(doctor_id, day, at):
+    index = slot_index(at)
+    if index is None or doctor_id is None:
+        return
+    DoctorAvailability.objects.filter(doctor_id=doctor_id, day=day).update(
+        booked=F('booked').bitand(~(1 << index))
+    )
+
+
+def rebuild():
+    """Recompute every availability bitmap from Approved / Completed appointments."""
+    bitmaps = {}
+    appointments = (
+        Appointment.objects
+        .filter(status__in=BOOKED_STATUSES, doctor__isnull=False)
+        .values_list('doctor_id', 'appointment_date', 'appointment_time')
+    )
+    for doctor_id, day, at in appointments.iterator(chunk_size=2000):
+        index = slot_index(at)
+        if index is not None:
+            bitmaps[doctor_id, day] = bitmaps.get((doctor_id, day), 0) | (1 << index)
+
+    with transaction.atomic():
+        DoctorAvailability.objects.all().delete()
+        DoctorAvailability.objects.bulk_create(
+            (
+                DoctorAvailability(doctor_id=doctor_id, day=day, booked=booked)
+                for (doctor_id, day), booked in bitmaps.items()
+            ),
+            batch_size=1000,
+        )
+    return len(bitmaps)
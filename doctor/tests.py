@@ -1,3 +1,309 @@
+from datetime import date, time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from adminpanel import replica
+from patient import archive, search
+from patient.models import Appointment, ArchivedAppointment
+from . import slots
+from .directory import VERSION_KEY, get_directory
+from .models import DoctorAvailability, DoctorProfile
+
+
+DAY = date(2026, 3, 2)
+
+
+class SlotEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(name='Doctor')
+        cls.profiles = []
+        for name, working_to in [('house', time(10, 0)), ('wilson', time(9, 30))]:
+            user = User.objects.create_user(username=name, password='pass')
+            user.groups.add(group)
+            cls.profiles.append(DoctorProfile.objects.create(
+                user=user, full_name=name, specialization='Cardiology',
+                working_from=time(9, 0), working_to=working_to
+            ))
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def test_free_slots_follow_working_hours(self):
+        free = slots.free_slots('Cardiology', DAY)
+        self.assertEqual(list(free), [time(9, 0), time(9, 15), time(9, 30), time(9, 45)])
+        self.assertEqual(len(free[time(9, 0)]), 2)
+        self.assertEqual(len(free[time(9, 30)]), 1)
+
+    def test_reserve_is_compare_and_set(self):
+        house = self.profiles[0]
+        self.assertTrue(slots.reserve(house, DAY, time(9, 15)))
+        self.assertFalse(slots.reserve(house, DAY, time(9, 15)))
+        self.assertFalse(slots.reserve(house, DAY, time(18, 0)))
+        self.assertNotIn(house.user_id, slots.free_slots('Cardiology', DAY)[time(9, 15)])
+
+        slots.release(house.user_id, DAY, time(9, 15))
+        self.assertTrue(slots.reserve(house, DAY, time(9, 15)))
+
+    def test_availability_never_reads_appointments(self):
+        with CaptureQueriesContext(connection) as ctx:
+            slots.free_slots('Cardiology', DAY)
+        self.assertFalse([q for q in ctx.captured_queries if Appointment._meta.db_table in q['sql']])
+
+    def test_booking_rejects_taken_or_off_grid_times(self):
+        self.client.force_login(self.patient)
+        self.assertContains(self.client.get(reverse('book_appointment')), 'Cardiology')
+        for profile in self.profiles:
+            slots.reserve(profile, DAY, time(9, 0))
+
+        for at in ['09:00', '09:05', '12:00']:
+            self.client.post(reverse('book_appointment'), {
+                'doctor_type': 'Cardiology', 'date': DAY.isoformat(), 'time': at,
+            })
+        self.assertFalse(Appointment.objects.exists())
+
+        self.client.post(reverse('book_appointment'), {
+            'doctor_type': 'Cardiology', 'date': DAY.isoformat(), 'time': '09:15',
+        })
+        self.assertEqual(Appointment.objects.get().appointment_time, time(9, 15))
+
+    def test_pending_bookings_hold_the_last_doctor(self):
+        # only house works at 09:30; the first Pending booking holds him
+        other = User.objects.create_user(username='other', password='pass')
+        for patient in (self.patient, other):
+            self.client.force_login(patient)
+            self.client.post(reverse('book_appointment'), {
+                'doctor_type': 'Cardiology', 'date': DAY.isoformat(), 'time': '09:30',
+            })
+        self.assertEqual(list(Appointment.objects.values_list('patient__username', flat=True)), ['patient'])
+        self.assertTrue(slots.hold('Cardiology', DAY, '09:15'))
+        self.assertFalse(slots.hold('Cardiology', DAY, '09:30'))
+
+    def test_approval_refuses_double_booking(self):
+        house = self.profiles[0]
+        first, second = [
+            Appointment.objects.create(
+                patient=self.patient, doctor_type='Cardiology',
+                appointment_date=DAY, appointment_time=time(9, 45)
+            )
+            for _ in range(2)
+        ]
+        self.client.force_login(self.admin)
+        for appointment in (first, second):
+            self.client.post(reverse('appoinment_request'), {
+                'appointment_id': appointment.id, 'action': 'approve', 'doctor': house.user_id,
+            })
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('Approved', 'Pending'))
+
+    def test_rebuild_matches_incremental_bitmaps(self):
+        house = self.profiles[0]
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=house.user, doctor_type='Cardiology',
+            appointment_date=DAY, appointment_time=time(9, 30), status='Approved'
+        )
+        slots.reserve(house, DAY, appointment.appointment_time)
+        before = list(DoctorAvailability.objects.values_list('doctor_id', 'day', 'booked'))
+
+        call_command('rebuild_availability', stdout=StringIO())
+        self.assertEqual(list(DoctorAvailability.objects.values_list('doctor_id', 'day', 'booked')), before)
+
+    def test_doctor_reject_frees_the_slot(self):
+        house = self.profiles[0]
+        appointment = Appointment.objects.create(
+            patient=self.patient, doctor=house.user, doctor_type='Cardiology',
+            appointment_date=DAY, appointment_time=time(9, 30), status='Approved'
+        )
+        slots.reserve(house, DAY, appointment.appointment_time)
+
+        self.client.force_login(house.user)
+        response = self.client.get(reverse('reject_doctor_appointment', args=[appointment.id]))
+        self.assertEqual(response.status_code, 405)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'Approved')
+
+        self.client.post(reverse('reject_doctor_appointment', args=[appointment.id]))
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'Rejected')
+        self.assertIn(house.user_id, slots.free_slots('Cardiology', DAY)[time(9, 30)])
+
+
+class DoctorDirectoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(name='Doctor')
+        cls.doctors = []
+        for name, specialization in [('house', 'Diagnostics'), ('wilson', 'Oncology'), ('cuddy', 'Oncology')]:
+            user = User.objects.create_user(username=name, password='pass')
+            user.groups.add(group)
+            cls.doctors.append(DoctorProfile.objects.create(user=user, full_name=name, specialization=specialization))
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+
+    def test_directory_groups_doctors_by_department(self):
+        directory = get_directory()
+        self.assertEqual(directory.departments, ['Diagnostics', 'Oncology'])
+        self.assertEqual([dr.username for dr in directory.in_department('Oncology')], ['cuddy', 'wilson'])
+        self.assertIn(f'<option value="{self.doctors[0].user_id}">Dr. house | Diagnostics</option>',
+                      directory.options['Diagnostics'])
+
+    def test_pages_run_no_roster_query_when_warm(self):
+        pages = [
+            (self.patient, reverse('book_appointment')),
+            (self.patient, reverse('available_slots') + '?department=Oncology&date=2026-03-02'),
+            (self.admin, reverse('appoinment_request')),
+            (self.admin, reverse('doctor_list')),
+        ]
+        for user, url in pages:
+            self.client.force_login(user)
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertFalse(
+                [q for q in ctx.captured_queries if DoctorProfile._meta.db_table in q['sql']],
+                f"{url} queried the roster"
+            )
+
+    def test_profile_and_user_changes_invalidate(self):
+        get_directory()
+        house = self.doctors[0]
+        house.specialization = 'Nephrology'
+        house.save()
+        self.assertEqual(get_directory().departments, ['Nephrology', 'Oncology'])
+
+        house.user.username = 'greg'
+        house.user.save()
+        self.assertEqual(get_directory().in_department('Nephrology')[0].username, 'greg')
+
+        self.doctors[1].user.delete()
+        self.assertEqual([dr.username for dr in get_directory().in_department('Oncology')], ['cuddy'])
+
+    def test_changes_made_by_another_worker_are_seen(self):
+        get_directory()
+        DoctorProfile.objects.filter(pk=self.doctors[0].pk).update(specialization='Nephrology')
+        # what invalidate_directory() in another process leaves behind
+        caches['shared'].set(VERSION_KEY, 'another-worker')
+        self.assertEqual(get_directory().departments, ['Nephrology', 'Oncology'])
+
+    @mock.patch('adminpanel.replica.replica_available', return_value=True)
+    def test_reporting_views_build_it_from_the_primary(self, available):
+        # a query on 'replica' is refused in this test case
+        with replica.reporting():
+            self.assertEqual(len(get_directory().doctors), 3)
+
+    def test_login_keeps_the_directory(self):
+        get_directory()
+        self.client.post(reverse('doctor_login'), {'username': 'house', 'password': 'pass'})
+        with CaptureQueriesContext(connection) as ctx:
+            get_directory()
+        self.assertFalse([q for q in ctx.captured_queries if DoctorProfile._meta.db_table in q['sql']])
+
+
+class ConsultationSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.create(name='Doctor')
+        cls.house = User.objects.create_user(username='house', password='pass')
+        cls.wilson = User.objects.create_user(username='wilson', password='pass')
+        for user in (cls.house, cls.wilson):
+            user.groups.add(group)
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+
+    def consultation(self, doctor, diagnosis, prescription, status='Completed'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor, doctor_type='Diagnostics', appointment_date=DAY,
+            appointment_time=time(9, 0), status=status, diagnosis=diagnosis, prescription=prescription,
+        )
+
+    def test_completing_a_consultation_indexes_it(self):
+        appointment = self.consultation(self.house, None, None, status='Approved')
+        self.assertEqual(search.search('amoxicillin'), [])
+
+        self.client.force_login(self.house)
+        self.client.post(reverse('complete_consultation', args=[appointment.id]), {
+            'diagnosis': 'Strep throat', 'prescription': 'Amoxicillin 500mg', 'bill_amount': '40',
+        })
+        appointment.refresh_from_db()
+        self.assertEqual([hit.appointment for hit in search.search('amox*')], [appointment])
+
+        appointment.prescription = 'Penicillin'
+        appointment.save()
+        self.assertEqual(search.search('amoxicillin'), [])
+        self.assertEqual(len(search.search('penicillin')), 1)
+
+        appointment.delete()
+        self.assertEqual(search.search('penicillin'), [])
+
+    def test_ranking_phrases_and_highlighting(self):
+        in_prescription = self.consultation(self.house, 'Sore throat', 'Ibuprofen for pain')
+        in_diagnosis = self.consultation(self.house, 'Migraine with <aura> and pain', 'Rest')
+        self.consultation(self.house, 'Pain in the knee', 'Ice')
+
+        # a diagnosis match outranks a prescription match
+        self.assertEqual([hit.appointment for hit in search.search('pain')][-1], in_prescription)
+        self.assertEqual([hit.appointment for hit in search.search('"with aura" pain')], [in_diagnosis])
+        self.assertEqual(search.search('ibu*')[0].prescription, '<mark>Ibuprofen</mark> for pain')
+        self.assertIn('&lt;<mark>aura</mark>&gt;', search.search('aura')[0].diagnosis)
+        self.assertEqual(search.search('NEAR( "" ^ *'), [])
+        self.assertNotIn(in_prescription, [hit.appointment for hit in search.search('migraine')])
+
+    def test_doctors_only_search_their_own_notes(self):
+        self.consultation(self.house, 'Lupus', 'Steroids')
+        self.consultation(self.wilson, 'Lymphoma', 'Steroids')
+
+        self.client.force_login(self.wilson)
+        response = self.client.get(reverse('search_records'), {'q': 'steroids'})
+        self.assertEqual([hit.appointment.doctor for hit in response.context['hits']], [self.wilson])
+        self.assertContains(response, '<mark>Steroids</mark>', html=True)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('search_records'), {'q': 'steroids'})
+        self.assertEqual(len(response.context['hits']), 2)
+
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('search_records'), {'q': 'steroids'}).status_code, 302)
+
+    def test_rebuild_restores_the_index(self):
+        appointment = self.consultation(self.house, 'Sarcoidosis', 'Methotrexate')
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO patient_appointment_fts (patient_appointment_fts) VALUES ('delete-all')")
+        self.assertEqual(search.search('sarcoidosis'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([hit.appointment for hit in search.search('sarcoidosis')], [appointment])
+
+    def test_archived_consultations_stay_searchable(self):
+        live = self.consultation(self.house, 'Gout', 'Colchicine and rest')
+        old = self.consultation(self.wilson, 'Gout flare', 'Colchicine')
+        Appointment.objects.filter(pk=old.pk).update(payment_status='Paid')
+        self.assertEqual(archive.archive(older_than_days=0), 1)
+
+        hits = {type(hit.appointment): hit for hit in search.search('colchicine')}
+        self.assertEqual(hits[Appointment].appointment, live)
+        self.assertEqual(hits[ArchivedAppointment].appointment.pk, old.pk)
+        self.assertEqual(hits[ArchivedAppointment].prescription, '<mark>Colchicine</mark>')
+        self.assertEqual([hit.appointment.pk for hit in search.search('gout', doctor=self.wilson)], [old.pk])
 
-# Create your tests here.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO patient_archivedappointment_fts (patient_archivedappointment_fts) VALUES ('delete-all')"
+            )
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(search.search('colchicine')), 2)
@@ -1,22 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required, user_passes_test
-from django.contrib.auth import authenticate, login, logout
+from django.template.loader import render_to_string
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth import login, logout
 from django.contrib.auth.models import Group, User
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 
+from adminpanel import live, throttle
+from adminpanel.transitions import reject_assigned
+from patient import ledger, search
 from patient.models import Appointment
+from patient.roles import ADMIN, DOCTOR, get_role, resolve_role, role_required, store_role
 from .models import DoctorProfile
 
 
-# =========================
-# HELPERS
-# =========================
-
-def is_doctor(user):
-    """Allow only users in Doctor group"""
-    return user.is_authenticated and user.groups.filter(name='Doctor').exists()
-
-
 # =========================
 # AUTHENTICATION
 # =========================
@@ -58,10 +55,13 @@ def doctor_login_view(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
-        user = authenticate(request, username=username, password=password)
+        user, retry_after = throttle.authenticate(request, 'doctor', username, password)
+        if retry_after:
+            return throttle.refused(request, 'logindoctor.html', retry_after)
 
-        if user and user.groups.filter(name='Doctor').exists():
+        if user and resolve_role(user) == DOCTOR:
             login(request, user)
+            store_role(request, DOCTOR)
             return redirect('doctor_dashboard')
 
         messages.error(request, "Invalid credentials or access denied.")
@@ -78,40 +78,49 @@ def doctor_logout_view(request):
 # DASHBOARD
 # =========================
 
-@login_required(login_url='doctor_login')
-@user_passes_test(is_doctor, login_url='doctor_login')
-def doctor_dashboard(request):
-    appointments = Appointment.objects.filter(
-        doctor=request.user,
+def assigned_to(doctor):
+    return Appointment.objects.filter(
+        doctor=doctor,
         status='Approved'
-    ).order_by('appointment_date')
+    ).select_related('patient')
+
+
+@role_required(DOCTOR, login_url='doctor_login')
+def doctor_dashboard(request):
+    appointments = assigned_to(request.user).order_by('appointment_date')
 
     return render(request, 'doctordashboard.html', {
-        'appointments': appointments
+        'appointments': appointments,
+        'live_after': live.current_id(),
     })
 
 
+@role_required(DOCTOR, login_url='doctor_login')
+def doctor_queue_events(request):
+    """Server-sent row updates for doctor_dashboard (adminpanel.live)."""
+    def render_rows(ids):
+        return {
+            app.id: render_to_string('doctor_dashboard_row.html', {'app': app}, request)
+            for app in assigned_to(request.user).filter(id__in=ids)
+        }
+    return live.stream(request, render_rows)
+
+
 # =========================
 # APPOINTMENT ACTIONS
 # =========================
 
-@login_required(login_url='doctor_login')
-@user_passes_test(is_doctor, login_url='doctor_login')
+@require_POST
+@role_required(DOCTOR, login_url='doctor_login')
 def reject_appointment(request, appointment_id):
-    appointment = get_object_or_404(
-        Appointment,
-        id=appointment_id,
-        doctor=request.user
-    )
-    appointment.status = 'Rejected'
-    appointment.save()
-
-    messages.info(request, "Appointment rejected.")
+    if reject_assigned(appointment_id, request.user):
+        messages.info(request, "Appointment rejected.")
+    else:
+        messages.error(request, "This appointment is no longer awaiting you.")
     return redirect('doctor_dashboard')
 
 
-@login_required(login_url='doctor_login')
-@user_passes_test(is_doctor, login_url='doctor_login')
+@role_required(DOCTOR, login_url='doctor_login')
 def complete_consultation(request, appointment_id):
     """
     Doctor completes consultation:
@@ -128,12 +137,13 @@ def complete_consultation(request, appointment_id):
     )
 
     if request.method == "POST":
-        appointment.diagnosis = request.POST.get('diagnosis')
-        appointment.prescription = request.POST.get('prescription')
-        appointment.bill_amount = request.POST.get('bill_amount')
-        appointment.status = 'Completed'
+        with ledger.tracking(appointment):
+            appointment.diagnosis = request.POST.get('diagnosis')
+            appointment.prescription = request.POST.get('prescription')
+            appointment.bill_amount = request.POST.get('bill_amount')
+            appointment.status = 'Completed'
 
-        appointment.save()
+            appointment.save()
 
         messages.success(
             request,
@@ -141,15 +151,34 @@ def complete_consultation(request, appointment_id):
         )
         return redirect('doctor_dashboard')
 
-    return render(request, 'doctor/complete_consultation.html', {
+    return render(request, 'complete_consultation.html', {
         'appointment': appointment
     })
 
+# =========================
+# CONSULTATION SEARCH
+# =========================
+
+@role_required(DOCTOR, ADMIN, login_url='doctor_login')
+def search_records(request):
+    """Search diagnosis / prescription notes; doctors only see their own consultations."""
+    query = request.GET.get('q', '').strip()
+    role = get_role(request)
+    hits = search.search(query, doctor=request.user if role == DOCTOR else None)
+
+    return render(request, 'search_records.html', {
+        'query': query,
+        'hits': hits,
+        'role': role,
+    })
+
+
 @login_required
 def complete_appointment(request, id):
     appointment = get_object_or_404(Appointment, id=id)
-    appointment.status = 'Completed'
-    appointment.save()
+    with ledger.tracking(appointment):
+        appointment.status = 'Completed'
+        appointment.save()
 
     messages.success(request, "Appointment completed successfully")
     return redirect('doctor_appointments')
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Hot/cold split of patient.Appointment.
+
+Appointments that are finished with (Completed and Paid, or Rejected)
+and older than ARCHIVE_AFTER_DAYS are moved to ArchivedAppointment by
+`manage.py archive_appointments`. The queues, history and billing pages
+then only scan the live table. The move runs in chunks of
+ARCHIVE_CHUNK_SIZE, each copied and deleted in one short transaction,
+with a pause in between so booking and billing writes get the lock. A
+run that stops part way leaves every row in exactly one table and is
+simply started again.
+
+Archived rows keep their id, so readers that need both tables
+(medical history, exports) run the same query against each via
+querysets() and merge the ordered results.
+
+The rows are deleted without the Appointment signals. Paid and
+rejected appointments owe nothing and sit in no queue, and the revenue
+rollup is meant to keep counting them. rollups.rebuild() and the
+patient statistics read the archive too, and patient.search has an FTS
+index on each table.
+"""
+import heapq
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment
+
+
+MODELS = (Appointment, ArchivedAppointment)
+FINISHED = Q(status='Completed', payment_status='Paid') | Q(status='Rejected')
+# The columns copied across; otp only matters while a bill is being paid
+FIELDS = [
+    field.attname for field in ArchivedAppointment._meta.concrete_fields
+    if field.name != 'archived_at'
+]
+
+
+def querysets(**filters):
+    """The same filter against the live table and the archive."""
+    return [model.objects.filter(**filters) for model in MODELS]
+
+
+def merged(ordered, key, reverse=False):
+    """Iterate querysets (or row iterators) that are each ordered by `key` as one ordered sequence."""
+    return heapq.merge(*ordered, key=key, reverse=reverse)
+
+
+def eligible(older_than_days=None):
+    """Live appointments due for the archive."""
+    days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = timezone.localdate() - timedelta(days=days)
+    return Appointment.objects.filter(FINISHED, appointment_date__lt=cutoff)
+
+
+def _delete(ids):
+    # Plain SQL rather than QuerySet.delete(), which would send post_delete
+    # for every row: the revenue rollup would then take these appointments'
+    # revenue back out, and the statistics cache and live queues would be
+    # churned for rows that are still counted (from the archive) and are
+    # in no queue. Nothing references an appointment, so no cascade is lost.
+    # The FTS triggers do run: the notes leave the live index here and were
+    # added to the archive's by the insert.
+    connection = connections[router.db_for_write(Appointment)]
+    meta = Appointment._meta
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(meta.db_table)}"
+            f" WHERE {connection.ops.quote_name(meta.pk.column)} IN ({placeholders})",
+            ids,
+        )
+
+
+def _move(ids):
+    with transaction.atomic():
+        rows = Appointment.objects.filter(FINISHED, pk__in=ids).values(*FIELDS)
+        archived = ArchivedAppointment.objects.bulk_create(
+            [ArchivedAppointment(**row) for row in rows], ignore_conflicts=True
+        )
+        if archived:
+            _delete([row.pk for row in archived])
+    return len(archived)
+
+
+def archive(older_than_days=None, chunk_size=None, pause=0.0, progress=None):
+    """
+    Move every eligible() appointment to the archive, `chunk_size` per
+    transaction, sleeping `pause` seconds between chunks. Returns how
+    many moved; `progress(moved)` is called after each chunk.
+    """
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+    due = eligible(older_than_days).order_by('id').values_list('id', flat=True)
+    moved, after = 0, 0
+    while ids := list(due.filter(id__gt=after)[:chunk_size]):
+        moved += _move(ids)
+        after = ids[-1]
+        if progress:
+            progress(moved)
+        if pause:
+            time.sleep(pause)
+    return moved
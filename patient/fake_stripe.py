@@ -0,0 +1,168 @@
+"""
+A tiny in-memory stand-in for the parts of the Stripe API that
+patient.payments uses, for offline development and load tests.
+
+    STRIPE_API_BASE=http://127.0.0.1:12111 python manage.py runserver
+    python manage.py fake_stripe --port 12111 --latency-ms 150
+
+Checkout sessions honour Idempotency-Key like the real API. Opening a
+session's URL marks it paid, posts a signed checkout.session.completed
+event to --webhook-url (if given) and redirects to its success_url.
+"""
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from urllib.request import Request, urlopen
+
+
+SESSION_PATH = re.compile(r'^/v1/checkout/sessions/(?P<id>[\w-]+)$')
+PAY_PATH = re.compile(r'^/pay/(?P<id>[\w-]+)$')
+LINE_ITEM = re.compile(r'^line_items\[(\d+)\]\[(price_data\]\[unit_amount|quantity)\]$')
+METADATA = re.compile(r'^metadata\[(\w+)\]$')
+
+
+def sign(payload, secret, timestamp=None):
+    """A Stripe-Signature header value for `payload` (bytes)."""
+    timestamp = int(timestamp or time.time())
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def completed_event(session):
+    return {
+        'id': f"evt_{uuid.uuid4().hex}",
+        'object': 'event',
+        'type': 'checkout.session.completed',
+        'created': int(time.time()),
+        'data': {'object': session},
+    }
+
+
+class FakeStripe:
+    def __init__(self, latency=0.0, webhook_url=None, webhook_secret=''):
+        self.latency = latency
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.sessions = {}
+        self.replays = {}
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def create_session(self, base_url, form):
+        amounts, quantities, metadata = {}, {}, {}
+        for key, value in form.items():
+            item = LINE_ITEM.match(key)
+            if item:
+                target = amounts if item.group(2).startswith('price_data') else quantities
+                target[item.group(1)] = int(value)
+            meta = METADATA.match(key)
+            if meta:
+                metadata[meta.group(1)] = value
+
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'mode': form.get('mode', 'payment'),
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'amount_total': sum(amount * quantities.get(i, 1) for i, amount in amounts.items()),
+            'currency': form.get('line_items[0][price_data][currency]'),
+            'client_reference_id': form.get('client_reference_id'),
+            'metadata': metadata,
+            'success_url': form.get('success_url'),
+            'expires_at': int(form.get('expires_at') or time.time() + 86400),
+            'url': f"{base_url}/pay/{session_id}",
+        }
+        with self.lock:
+            self.sessions[session_id] = session
+            self.created += 1
+        return session
+
+    def deliver(self, event):
+        payload = json.dumps(event).encode()
+        request = Request(self.webhook_url, data=payload, headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign(payload, self.webhook_secret),
+        })
+        with urlopen(request, timeout=10) as response:
+            return response.status
+
+
+def make_handler(stripe):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like api.stripe.com
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload, replayed=False):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Request-Id', f"req_{uuid.uuid4().hex[:14]}")
+            if replayed:
+                self.send_header('Idempotent-Replayed', 'true')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def not_found(self):
+            self.send_json(404, {'error': {'type': 'invalid_request_error', 'message': 'No such resource'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            form = dict(parse_qsl(self.rfile.read(length).decode()))
+            if self.path != '/v1/checkout/sessions':
+                return self.not_found()
+
+            time.sleep(stripe.latency)
+            key = self.headers.get('Idempotency-Key')
+            with stripe.lock:
+                replay = stripe.replays.get(key) if key else None
+            if replay:
+                return self.send_json(200, replay, replayed=True)
+
+            host = self.headers.get('Host')
+            session = stripe.create_session(f"http://{host}", form)
+            if key:
+                with stripe.lock:
+                    stripe.replays[key] = session
+            self.send_json(200, session)
+
+        def do_GET(self):
+            match = SESSION_PATH.match(self.path)
+            if match and match.group('id') in stripe.sessions:
+                time.sleep(stripe.latency)
+                return self.send_json(200, stripe.sessions[match.group('id')])
+
+            match = PAY_PATH.match(self.path)
+            if match and match.group('id') in stripe.sessions:
+                session = stripe.sessions[match.group('id')]
+                session.update(status='complete', payment_status='paid')
+                if stripe.webhook_url:
+                    threading.Thread(target=stripe.deliver, args=(completed_event(session),), daemon=True).start()
+                self.send_response(303)
+                self.send_header('Location', session['success_url'])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            self.not_found()
+
+    return Handler
+
+
+def make_server(host='127.0.0.1', port=12111, latency=0.0, webhook_url=None, webhook_secret=''):
+    """Return (server, FakeStripe state); call server.serve_forever()."""
+    stripe = FakeStripe(latency=latency, webhook_url=webhook_url, webhook_secret=webhook_secret)
+    server = ThreadingHTTPServer((host, port), make_handler(stripe))
+    server.daemon_threads = True
+    return server, stripe
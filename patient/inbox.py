@@ -0,0 +1,107 @@
+"""
+Durable inbox for Stripe webhooks.
+
+The webhook view only verifies the signature and records the event
+(one INSERT, ignored if Stripe redelivers it). drain() applies the
+recorded events in batches: one bulk payment_status update per batch,
+with the balance and revenue rollup deltas that the bypassed
+Appointment signals would otherwise have written.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger, payments
+from .models import Appointment, StripeEvent
+
+
+logger = logging.getLogger(__name__)
+
+PAID_EVENTS = {'checkout.session.completed', 'checkout.session.async_payment_succeeded'}
+
+
+def record(event):
+    """Store a verified webhook event; a redelivered event id is a no-op."""
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event['id'], type=event['type'], payload=event)],
+        ignore_conflicts=True,
+    )
+
+
+def charged(events):
+    """{appointment_id: amount Stripe charged} for the paid checkouts in `events`."""
+    amounts = {}
+    for event in events:
+        if event.type not in PAID_EVENTS:
+            continue
+        session = event.payload.get('data', {}).get('object', {})
+        appointment_id = (session.get('metadata') or {}).get('appointment_id')
+        if session.get('payment_status') != 'paid' or not str(appointment_id or '').isdigit():
+            continue
+        amounts[int(appointment_id)] = session.get('amount_total')
+    return amounts
+
+
+def _mark_paid(amounts):
+    # imported here: adminpanel depends on patient, not the other way round
+    from adminpanel import rollups
+
+    bills = Appointment.objects.filter(id__in=amounts).exclude(payment_status='Paid')
+    paid, changes = [], []
+    balances = defaultdict(lambda: [0, 0])
+    for bill in bills:
+        if payments.amount_in_paise(bill) != amounts[bill.id]:
+            logger.warning(
+                "Stripe charged %s for appointment %s billed at %s; left unpaid",
+                amounts[bill.id], bill.id, payments.amount_in_paise(bill)
+            )
+            continue
+        before = rollups.contribution(rollups.state(bill))
+        balance = balances[bill.patient_id]
+        balance[0] -= ledger.owed(bill)
+        balance[1] -= int(ledger.is_unpaid(bill))
+
+        bill.payment_status = 'Paid'
+        changes.append((before, rollups.contribution(rollups.state(bill))))
+        paid.append(bill)
+
+    if not paid:
+        return []
+    Appointment.objects.filter(id__in=[bill.id for bill in paid]).update(payment_status='Paid')
+    for patient_id, (amount, bills) in balances.items():
+        ledger.adjust(patient_id, amount, bills)
+    rollups.apply_changes(changes)
+    return paid
+
+
+def drain_batch(batch_size=None):
+    """Apply the oldest unprocessed events. Returns (events, bills_paid)."""
+    batch_size = batch_size or settings.STRIPE_INBOX_BATCH_SIZE
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.filter(processed_at__isnull=True)
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0, 0
+        paid = _mark_paid(charged(events))
+        StripeEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+
+    for bill in paid:
+        payments.forget_checkout(bill)
+    return len(events), len(paid)
+
+
+def drain(batch_size=None):
+    """Apply every pending event. Returns (events, bills_paid)."""
+    total_events = total_paid = 0
+    while True:
+        events, paid = drain_batch(batch_size)
+        if not events:
+            return total_events, total_paid
+        total_events += events
+        total_paid += paid
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Appointment, PatientBalance
+
+
+UNPAID = Q(status='Completed') & ~Q(payment_status='Paid')
+
+
+def is_unpaid(appointment):
+    return appointment.status == 'Completed' and appointment.payment_status != 'Paid'
+
+
+def owed(appointment):
+    """What one appointment adds to its patient's outstanding balance."""
+    if not is_unpaid(appointment):
+        return Decimal(0)
+    return Decimal(str(appointment.bill_amount or 0))
+
+
+def adjust(patient_id, amount, bills):
+    """Add `amount` / `bills` to a patient's balance row, creating it if needed."""
+    if not amount and not bills:
+        return
+    # get_or_create() looks the row up again when a concurrent first bill
+    # wins the unique constraint, and the increment is one UPDATE in the
+    # database, so simultaneous adjustments never lose a delta.
+    with transaction.atomic():
+        balance = PatientBalance.objects.get_or_create(patient_id=patient_id)[0]
+        PatientBalance.objects.filter(pk=balance.pk).update(
+            outstanding=F('outstanding') + amount,
+            unpaid_bills=F('unpaid_bills') + bills,
+            updated_at=timezone.now(),
+        )
+
+
+@contextmanager
+def tracking(appointment):
+    """
+    Wrap the edit + save() of an appointment that has already been loaded;
+    its balance change is applied in the same transaction, from the values
+    before and after the block, without re-reading the row.
+    """
+    before, was_unpaid = owed(appointment), is_unpaid(appointment)
+    with transaction.atomic():
+        yield
+        adjust(
+            appointment.patient_id,
+            owed(appointment) - before,
+            int(is_unpaid(appointment)) - int(was_unpaid)
+        )
+
+
+def rebuild():
+    """Recompute every patient's balance from patient.Appointment."""
+    rows = (
+        Appointment.objects.filter(UNPAID)
+        .values('patient_id')
+        .annotate(outstanding=Sum('bill_amount'), unpaid_bills=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        PatientBalance.objects.all().delete()
+        PatientBalance.objects.bulk_create(
+            (
+                PatientBalance(
+                    patient_id=row['patient_id'],
+                    outstanding=row['outstanding'] or 0,
+                    unpaid_bills=row['unpaid_bills'],
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+    return PatientBalance.objects.count()
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from patient import archive
+
+
+class Command(BaseCommand):
+    help = "Move old paid and rejected appointments to the archive table, in chunks; safe to re-run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.ARCHIVE_AFTER_DAYS,
+            help="Only archive appointments dated more than this many days ago",
+        )
+        parser.add_argument('--chunk-size', type=int, default=settings.ARCHIVE_CHUNK_SIZE, help="Rows per transaction")
+        parser.add_argument('--pause', type=float, default=0.1, help="Seconds to sleep between chunks")
+
+    def handle(self, *args, **options):
+        def progress(moved):
+            self.stdout.write(f"  {moved} archived", ending='\r')
+            self.stdout.flush()
+
+        moved = archive.archive(
+            options['older_than_days'], options['chunk_size'], options['pause'], progress=progress
+        )
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} appointments"))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from patient.fake_stripe import make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Stripe API (see patient.fake_stripe) for offline checkout load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument(
+            '--latency-ms',
+            type=int,
+            default=0,
+            help="Delay added to every API call, to mimic a slow Stripe round-trip",
+        )
+        parser.add_argument(
+            '--webhook-url',
+            help="Where to post checkout.session.completed, e.g. http://127.0.0.1:8000/patient/stripe/webhook/ "
+                 "(signed with STRIPE_WEBHOOK_SECRET)",
+        )
+
+    def handle(self, *args, **options):
+        server, stripe = make_server(
+            options['host'], options['port'], options['latency_ms'] / 1000,
+            webhook_url=options['webhook_url'], webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Stripe listening on http://{options['host']}:{options['port']} "
+            f"(set STRIPE_API_BASE to this URL)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{stripe.created} checkout sessions created")
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from patient.inbox import drain
+
+
+class Command(BaseCommand):
+    help = "Apply recorded Stripe webhook events to bills, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.STRIPE_INBOX_BATCH_SIZE)
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help="Keep polling the inbox instead of exiting once it is empty",
+        )
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --follow")
+
+    def handle(self, *args, **options):
+        while True:
+            events, paid = drain(options['batch_size'])
+            if events or not options['follow']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {events} Stripe events; {paid} bills marked Paid"
+                ))
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from patient import ledger
+
+
+class Command(BaseCommand):
+    help = "Rebuild every patient's outstanding balance from patient.Appointment"
+
+    def handle(self, *args, **options):
+        count = ledger.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Balances rebuilt: {count} patients owe money"))
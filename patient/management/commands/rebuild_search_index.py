@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from patient import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild and merge the full-text indexes over consultation notes"
+
+    def handle(self, *args, **options):
+        if search.rebuild():
+            self.stdout.write(self.style.SUCCESS("Search indexes rebuilt"))
+        else:
+            self.stdout.write("Not an SQLite database; search scans the notes directly")
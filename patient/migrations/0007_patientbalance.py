@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 18:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_balances(apps, schema_editor):
+    Appointment = apps.get_model('patient', 'Appointment')
+    PatientBalance = apps.get_model('patient', 'PatientBalance')
+
+    rows = (
+        Appointment.objects.filter(Q(status='Completed') & ~Q(payment_status='Paid'))
+        .values('patient_id')
+        .annotate(outstanding=Sum('bill_amount'), unpaid_bills=Count('id'))
+        .order_by()
+    )
+    PatientBalance.objects.bulk_create(
+        (
+            PatientBalance(
+                patient_id=row['patient_id'],
+                outstanding=row['outstanding'] or 0,
+                unpaid_bills=row['unpaid_bills'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0006_appointment_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('unpaid_bills', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='balance', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
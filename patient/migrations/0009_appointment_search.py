@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+# External-content FTS5 index over the consultation notes; the triggers keep
+# it in step with every write to patient_appointment, bulk updates included.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE patient_appointment_fts USING fts5(
+        diagnosis, prescription,
+        content='patient_appointment', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER patient_appointment_fts_ai AFTER INSERT ON patient_appointment BEGIN
+        INSERT INTO patient_appointment_fts (rowid, diagnosis, prescription)
+        VALUES (new.id, new.diagnosis, new.prescription);
+    END
+    """,
+    """
+    CREATE TRIGGER patient_appointment_fts_ad AFTER DELETE ON patient_appointment BEGIN
+        INSERT INTO patient_appointment_fts (patient_appointment_fts, rowid, diagnosis, prescription)
+        VALUES ('delete', old.id, old.diagnosis, old.prescription);
+    END
+    """,
+    """
+    CREATE TRIGGER patient_appointment_fts_au AFTER UPDATE OF diagnosis, prescription ON patient_appointment BEGIN
+        INSERT INTO patient_appointment_fts (patient_appointment_fts, rowid, diagnosis, prescription)
+        VALUES ('delete', old.id, old.diagnosis, old.prescription);
+        INSERT INTO patient_appointment_fts (rowid, diagnosis, prescription)
+        VALUES (new.id, new.diagnosis, new.prescription);
+    END
+    """,
+    "INSERT INTO patient_appointment_fts (patient_appointment_fts) VALUES ('rebuild')",
+]
+DROP = [
+    "DROP TRIGGER IF EXISTS patient_appointment_fts_au",
+    "DROP TRIGGER IF EXISTS patient_appointment_fts_ad",
+    "DROP TRIGGER IF EXISTS patient_appointment_fts_ai",
+    "DROP TABLE IF EXISTS patient_appointment_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # other backends fall back to LIKE scans in patient.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0008_stripeevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 22:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0009_appointment_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('doctor_type', models.CharField(max_length=100)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Completed', 'Completed'), ('Rejected', 'Rejected')], max_length=20)),
+                ('diagnosis', models.TextField(blank=True, null=True)),
+                ('prescription', models.TextField(blank=True, null=True)),
+                ('bill_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('payment_status', models.CharField(choices=[('Not Paid', 'Not Paid'), ('Paid', 'Paid')], default='Not Paid', max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_appointments_as_doctor', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments_as_patient', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'status', 'appointment_date'], name='archive_patient_status_idx')],
+            },
+        ),
+    ]
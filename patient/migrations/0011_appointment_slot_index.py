@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0010_archivedappointment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor_type', 'appointment_date', 'status', 'appointment_time'], name='appt_dept_day_status_time_idx'),
+        ),
+    ]
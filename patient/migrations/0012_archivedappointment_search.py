@@ -0,0 +1,66 @@
+# Generated by Django 6.0 on 2026-10-19 10:40
+
+from django.db import migrations
+
+
+# The archive's own external-content FTS5 index, so consultations moved out
+# of patient_appointment stay searchable; same columns and tokenizer as the
+# live table's index (0009).
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE patient_archivedappointment_fts USING fts5(
+        diagnosis, prescription,
+        content='patient_archivedappointment', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER patient_archivedappointment_fts_ai AFTER INSERT ON patient_archivedappointment BEGIN
+        INSERT INTO patient_archivedappointment_fts (rowid, diagnosis, prescription)
+        VALUES (new.id, new.diagnosis, new.prescription);
+    END
+    """,
+    """
+    CREATE TRIGGER patient_archivedappointment_fts_ad AFTER DELETE ON patient_archivedappointment BEGIN
+        INSERT INTO patient_archivedappointment_fts (patient_archivedappointment_fts, rowid, diagnosis, prescription)
+        VALUES ('delete', old.id, old.diagnosis, old.prescription);
+    END
+    """,
+    """
+    CREATE TRIGGER patient_archivedappointment_fts_au AFTER UPDATE OF diagnosis, prescription ON patient_archivedappointment BEGIN
+        INSERT INTO patient_archivedappointment_fts (patient_archivedappointment_fts, rowid, diagnosis, prescription)
+        VALUES ('delete', old.id, old.diagnosis, old.prescription);
+        INSERT INTO patient_archivedappointment_fts (rowid, diagnosis, prescription)
+        VALUES (new.id, new.diagnosis, new.prescription);
+    END
+    """,
+    # rows archived before this migration
+    "INSERT INTO patient_archivedappointment_fts (patient_archivedappointment_fts) VALUES ('rebuild')",
+]
+DROP = [
+    "DROP TRIGGER IF EXISTS patient_archivedappointment_fts_au",
+    "DROP TRIGGER IF EXISTS patient_archivedappointment_fts_ad",
+    "DROP TRIGGER IF EXISTS patient_archivedappointment_fts_ai",
+    "DROP TABLE IF EXISTS patient_archivedappointment_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # other backends fall back to LIKE scans in patient.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0011_appointment_slot_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 
@@ -69,9 +69,74 @@ class Appointment(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # admin request queue / history / billing
+            models.Index(fields=['status', 'created_at'], name='appt_status_created_idx'),
+            # patient bills / medical history
+            models.Index(fields=['patient', 'status', 'appointment_date'], name='appt_patient_status_date_idx'),
+            # doctor dashboard
+            models.Index(fields=['doctor', 'status', 'appointment_date'], name='appt_doctor_status_date_idx'),
+            # Pending bookings of one department's slot (doctor.slots.hold)
+            models.Index(
+                fields=['doctor_type', 'appointment_date', 'status', 'appointment_time'],
+                name='appt_dept_day_status_time_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.patient.username} - {self.doctor_type} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        # pre/post_save receivers (adminpanel.signals) update the revenue
+        # rollup; keep them in the same transaction as the row itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+# =========================================================
+# ARCHIVED APPOINTMENT (cold storage; see patient.archive)
+# =========================================================
+
+class ArchivedAppointment(models.Model):
+    """
+    A paid or rejected Appointment moved out of the live table once it is
+    ARCHIVE_AFTER_DAYS old. Keeps the live row's id and columns (bar the
+    one-time payment otp) and is read back through patient.archive.
+    """
+    id = models.IntegerField(primary_key=True)
+    patient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments_as_patient'
+    )
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_appointments_as_doctor'
+    )
+    doctor_type = models.CharField(max_length=100)
+    appointment_date = models.DateField()
+    appointment_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    diagnosis = models.TextField(null=True, blank=True)
+    prescription = models.TextField(null=True, blank=True)
+    bill_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    payment_status = models.CharField(max_length=20, choices=Appointment.PAYMENT_CHOICES, default='Not Paid')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # patient medical history
+            models.Index(fields=['patient', 'status', 'appointment_date'], name='archive_patient_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.username} - {self.doctor_type} ({self.status}, archived)"
+
 
 # =========================================================
 # PATIENT PROFILE
@@ -93,4 +158,42 @@ class PatientProfile(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
 
     def __str__(self):
-        return self.full_name
\ No newline at end of file
+        return self.full_name
+
+# =========================================================
+# PATIENT BALANCE (denormalized; see patient.ledger)
+# =========================================================
+
+class PatientBalance(models.Model):
+    patient = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='balance'
+    )
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unpaid_bills = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.patient.username} owes {self.outstanding}"
+
+
+# =========================================================
+# STRIPE WEBHOOK INBOX (drained by patient.inbox)
+# =========================================================
+
+class StripeEvent(models.Model):
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker reads the oldest unprocessed events
+            models.Index(fields=['processed_at', 'id'], name='stripe_event_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} ({self.type})"
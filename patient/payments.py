@@ -0,0 +1,121 @@
+"""
+Stripe Checkout gateway.
+
+Every worker shares one keep-alive HTTP connection pool with bounded
+timeouts. Checkout sessions are created with an idempotency key derived
+from the bill, and the open session is cached so that double clicks and
+reloads reuse it instead of creating another one.
+"""
+import json
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+StripeError = stripe.StripeError
+InvalidWebhook = stripe.SignatureVerificationError
+
+
+def configure():
+    """Point the Stripe SDK at a pooled, time-bounded HTTP client."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_POOL_SIZE,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.default_http_client = stripe.RequestsClient(
+        session=session,
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+    )
+    # retried requests reuse the same idempotency key, so retries are safe
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    if settings.STRIPE_API_BASE:
+        stripe.api_base = settings.STRIPE_API_BASE
+
+
+def verify_webhook(payload, signature):
+    """
+    Check the Stripe-Signature header of a webhook body and return the
+    decoded event. Raises InvalidWebhook (or ValueError for a bad body).
+    """
+    secret = settings.STRIPE_WEBHOOK_SECRET
+    if not secret:
+        raise InvalidWebhook("STRIPE_WEBHOOK_SECRET is not configured", signature)
+    stripe.WebhookSignature.verify_header(
+        payload.decode('utf-8'), signature, secret, settings.STRIPE_WEBHOOK_TOLERANCE
+    )
+    return json.loads(payload)
+
+
+def amount_in_paise(appointment):
+    """A bill in the smallest currency unit, as Stripe charges and reports it."""
+    return int(appointment.bill_amount * 100)
+
+
+def _window(now):
+    return int(now) // settings.STRIPE_CHECKOUT_TTL
+
+
+def idempotency_key(appointment, now):
+    """
+    Same bill, same amount, same session window -> same key (and the same
+    request parameters, as Stripe requires). A changed amount or a later
+    window gets a fresh session.
+    """
+    return f"checkout-{appointment.id}-{amount_in_paise(appointment)}-{_window(now)}"
+
+
+def _cache_key(appointment):
+    return f"stripe-checkout:{appointment.id}:{amount_in_paise(appointment)}"
+
+
+def checkout_url(appointment, success_url):
+    """URL of an open Checkout session for this bill, creating one if needed."""
+    key = _cache_key(appointment)
+    url = cache.get(key)
+    if url:
+        return url
+
+    now = time.time()
+    # derived from the window so a retried create sends identical params;
+    # always between one and two TTLs away (Stripe allows 30 min - 24 h)
+    expires_at = (_window(now) + 2) * settings.STRIPE_CHECKOUT_TTL
+
+    session = stripe.checkout.Session.create(
+        payment_method_types=['card'],
+        mode='payment',
+        line_items=[{
+            'price_data': {
+                'currency': 'inr',
+                'product_data': {
+                    'name': f"Hospital Appointment - {appointment.doctor_type}",
+                },
+                'unit_amount': amount_in_paise(appointment),
+            },
+            'quantity': 1,
+        }],
+        client_reference_id=str(appointment.id),
+        metadata={'appointment_id': appointment.id},
+        success_url=success_url,
+        expires_at=expires_at,
+        idempotency_key=idempotency_key(appointment, now),
+    )
+
+    # stop handing the URL out a few minutes before Stripe expires it
+    cache.set(key, session.url, int(expires_at - now) - 300)
+    return session.url
+
+
+def forget_checkout(appointment):
+    cache.delete(_cache_key(appointment))
+
+
+configure()
@@ -0,0 +1,109 @@
+from functools import wraps
+from uuid import uuid4
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import caches
+from django.shortcuts import resolve_url
+
+
+ADMIN = 'admin'
+DOCTOR = 'doctor'
+PATIENT = 'patient'
+
+ROLE_SESSION_KEY = '_role'
+ROLE_VERSION_SESSION_KEY = '_role_version'
+
+
+def _version_key(user_id):
+    return f'role-version:{user_id}'
+
+
+def resolve_role(user):
+    """Work a user's role out from the database (one query for non-admins)."""
+    if user.is_superuser:
+        return ADMIN
+    if user.groups.filter(name='Doctor').exists():
+        return DOCTOR
+    return PATIENT
+
+
+def role_version(user_id):
+    """
+    The user's role version stamp, created at login. A missing one (evicted)
+    is replaced rather than read as None, so it cannot match what an older
+    session stored.
+    """
+    cache = caches['shared']
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key)  # another request replaced it first
+    return version
+
+
+def invalidate_role(user_id):
+    """Make every session of `user_id` re-resolve its role on the next request."""
+    caches['shared'].set(_version_key(user_id), uuid4().hex, None)
+
+
+def _store(request, role, version):
+    request.session[ROLE_SESSION_KEY] = role
+    request.session[ROLE_VERSION_SESSION_KEY] = version
+    request._cached_role = role
+
+
+def store_role(request, role):
+    _store(request, role, role_version(request.user.pk))
+
+
+def get_role(request):
+    """
+    The current user's role, resolved once and kept in the session.
+    A version stamp in the shared cache lets group / profile changes made
+    by any worker invalidate it.
+    """
+    if hasattr(request, '_cached_role'):
+        return request._cached_role
+
+    if not request.user.is_authenticated:
+        request._cached_role = None
+        return None
+
+    role = request.session.get(ROLE_SESSION_KEY)
+    version = role_version(request.user.pk)
+    if role is None or request.session.get(ROLE_VERSION_SESSION_KEY) != version:
+        role = resolve_role(request.user)
+        _store(request, role, version)
+
+    request._cached_role = role
+    return role
+
+
+def role_required(*roles, login_url=None):
+    """Like login_required + user_passes_test, but backed by get_role(). Works on async views too."""
+    def decorator(view_func):
+        def refuse(request):
+            return redirect_to_login(
+                request.get_full_path(),
+                resolve_url(login_url or settings.LOGIN_URL)
+            )
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                if await sync_to_async(get_role)(request) in roles:
+                    return await view_func(request, *args, **kwargs)
+                return refuse(request)
+            return _wrapped_view
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if get_role(request) in roles:
+                return view_func(request, *args, **kwargs)
+            return refuse(request)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,158 @@
+"""
+Full-text search over consultation notes (diagnosis / prescription).
+
+On SQLite the notes are indexed by the patient_appointment_fts FTS5 table
+(migration 0009), which triggers keep in step with patient_appointment,
+and archived consultations by patient_archivedappointment_fts (0012).
+Both indexes are queried and their hits merged by score, so a
+consultation stays searchable once it is archived. Queries are ranked
+with bm25, diagnosis matches weighing double, and return highlighted
+snippets. Other backends fall back to an unranked icontains scan of
+both tables, newest first.
+
+Query syntax: words are ANDed, "quoted words" match as a phrase and a
+trailing * makes a prefix query (amox*).
+"""
+import re
+from dataclasses import dataclass
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import archive
+from .models import Appointment, ArchivedAppointment
+
+
+FTS_TABLE = 'patient_appointment_fts'
+ARCHIVE_FTS_TABLE = 'patient_archivedappointment_fts'
+# Each notes table with its FTS5 index
+INDEXES = ((Appointment, FTS_TABLE), (ArchivedAppointment, ARCHIVE_FTS_TABLE))
+TERM = re.compile(r'"([^"]*)"(\*?)|(\w+)(\*?)')
+# Private-use characters the snippets are marked with before escaping
+OPEN, CLOSE = '\ue000', '\ue001'
+SNIPPET_TOKENS = 16
+
+
+@dataclass
+class Hit:
+    appointment: Appointment  # or an ArchivedAppointment
+    diagnosis: str
+    prescription: str
+    score: float = 0.0
+
+
+def parse(text):
+    """[(words, prefix)] for each term of a user query; punctuation is dropped."""
+    terms = []
+    for match in TERM.finditer(text or ''):
+        phrase, phrase_prefix, word, word_prefix = match.groups()
+        words = re.findall(r'\w+', phrase) if phrase is not None else [word]
+        if words:
+            terms.append((words, bool(phrase_prefix or word_prefix)))
+    return terms
+
+
+def to_match(terms):
+    """An FTS5 MATCH expression in which every term is quoted, so no user input is parsed as syntax."""
+    return ' '.join(
+        '"{}"{}'.format(' '.join(words), '*' if prefix else '')
+        for words, prefix in terms
+    )
+
+
+def _highlight(text):
+    return mark_safe(escape(text or '').replace(OPEN, '<mark>').replace(CLOSE, '</mark>'))
+
+
+def _fts_ids(connection, model, fts_table, match, doctor, limit):
+    sql = f"""
+        SELECT a.id,
+               snippet({fts_table}, 0, %s, %s, '…', {SNIPPET_TOKENS}),
+               snippet({fts_table}, 1, %s, %s, '…', {SNIPPET_TOKENS}),
+               bm25({fts_table}, 2.0, 1.0) AS score
+        FROM {fts_table}
+        JOIN {model._meta.db_table} a ON a.id = {fts_table}.rowid
+        WHERE {fts_table} MATCH %s AND a.status = 'Completed'
+    """
+    params = [OPEN, CLOSE, OPEN, CLOSE, match]
+    if doctor is not None:
+        sql += " AND a.doctor_id = %s"
+        params.append(doctor.pk)
+    sql += " ORDER BY score LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _scan(connection, model, terms, doctor, limit):
+    queryset = model.objects.using(connection.alias).filter(status='Completed')
+    if doctor is not None:
+        queryset = queryset.filter(doctor=doctor)
+    for words, _ in terms:  # icontains already matches prefixes
+        phrase = ' '.join(words)
+        queryset = queryset.filter(Q(diagnosis__icontains=phrase) | Q(prescription__icontains=phrase))
+    rows = queryset.order_by('-appointment_date', '-id').values_list(
+        'id', 'diagnosis', 'prescription', 'appointment_date',
+    )[:limit]
+    # the date only orders the merge with the other table
+    return [(pk, diagnosis, prescription, 0.0, (day, pk)) for pk, diagnosis, prescription, day in rows]
+
+
+def search(text, doctor=None, limit=None):
+    """
+    Completed consultations matching `text`, best first, as Hits whose
+    diagnosis / prescription are escaped HTML with the matches in <mark>.
+    `doctor` restricts the search to that doctor's own consultations.
+    Archived consultations are included; their Hit carries the
+    ArchivedAppointment.
+    """
+    terms = parse(text)
+    if not terms:
+        return []
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+    connection = connections[router.db_for_read(Appointment)]
+    if connection.vendor == 'sqlite':
+        match = to_match(terms)
+        found = [
+            (model, _fts_ids(connection, model, fts_table, match, doctor, limit))
+            for model, fts_table in INDEXES
+        ]
+        # bm25 is lower for better matches
+        key, reverse = itemgetter(3), False
+    else:
+        found = [(model, _scan(connection, model, terms, doctor, limit)) for model, _ in INDEXES]
+        key, reverse = itemgetter(4), True
+    rows = list(islice(archive.merged([model_rows for _, model_rows in found], key, reverse), limit))
+
+    # archived rows keep their id, so ids are unique across the two tables
+    wanted = {row[0] for row in rows}
+    appointments = {}
+    for model, model_rows in found:
+        appointments.update(
+            model.objects.using(connection.alias)
+            .select_related('patient', 'doctor')
+            .in_bulk([row[0] for row in model_rows if row[0] in wanted])
+        )
+    return [
+        Hit(appointments[row[0]], _highlight(row[1]), _highlight(row[2]), row[3])
+        for row in rows
+        if row[0] in appointments
+    ]
+
+
+def rebuild():
+    """Repopulate and merge the FTS indexes from the live and archive tables (SQLite only)."""
+    connection = connections[router.db_for_write(Appointment)]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        for _, fts_table in INDEXES:
+            cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('optimize')")
+    return True
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from doctor.models import DoctorProfile
+from .roles import invalidate_role, role_version
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # group.user_set.clear(): remember who was in it
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        invalidate_role(instance.pk)
+    elif action == 'post_clear':
+        for user_id in getattr(instance, '_cleared_user_ids', []):
+            invalidate_role(user_id)
+    else:
+        # group.user_set.add(...) / remove(...): pk_set holds user ids
+        for user_id in pk_set:
+            invalidate_role(user_id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # a new user has no session to invalidate yet, and login() saves
+    # last_login only, which never changes the role
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_role(instance.pk)
+
+
+@receiver(user_logged_in)
+def stamp_role_version(sender, user, **kwargs):
+    # so the requests of this session only read the stamp
+    role_version(user.pk)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def doctor_profile_changed(sender, instance, **kwargs):
+    invalidate_role(instance.user_id)
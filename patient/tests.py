@@ -1,3 +1,418 @@
-from django.test import TestCase
+import json
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from threading import Thread
 
-# Create your tests here.
+import stripe
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from adminpanel.models import RevenueRollup
+from doctor import slots
+from doctor.models import DoctorProfile
+from . import archive, inbox
+from .fake_stripe import completed_event, make_server, sign
+from .models import Appointment, ArchivedAppointment, PatientBalance, PatientProfile, StripeEvent
+from .roles import ROLE_SESSION_KEY, ROLE_VERSION_SESSION_KEY
+
+
+APPOINTMENT_TABLE = Appointment._meta.db_table
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def paid_event(appointment, amount_total=None):
+    return completed_event({
+        'id': f"cs_test_{appointment.id}",
+        'object': 'checkout.session',
+        'payment_status': 'paid',
+        'amount_total': int(appointment.bill_amount * 100) if amount_total is None else amount_total,
+        'metadata': {'appointment_id': str(appointment.id)},
+    })
+
+
+def post_event(client, event, secret=WEBHOOK_SECRET):
+    payload = json.dumps(event).encode()
+    return client.post(
+        reverse('stripe_webhook'), payload, content_type='application/json',
+        HTTP_STRIPE_SIGNATURE=sign(payload, secret)
+    )
+
+
+def query_plan(sql):
+    """Return the EXPLAIN QUERY PLAN detail lines for a captured SELECT."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class AppointmentQueryPlanTests(TestCase):
+    """
+    Every filtered query a view runs against patient_appointment must be
+    answered from an index. An unfiltered listing is a scan by definition,
+    so only queries with a WHERE clause are checked.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        PatientProfile.objects.create(
+            user=cls.patient, full_name='Patient', age=30,
+            gender='Male', place='Kochi', category='General'
+        )
+        cls.doctor = User.objects.create_user(username='doctor', password='pass')
+        cls.doctor.groups.add(Group.objects.create(name='Doctor'))
+        DoctorProfile.objects.create(user=cls.doctor, full_name='Doctor', specialization='Cardiology')
+
+        for status in ['Pending', 'Approved', 'Completed', 'Rejected']:
+            Appointment.objects.create(
+                patient=cls.patient,
+                doctor=cls.doctor,
+                doctor_type='Cardiology',
+                appointment_date=date(2026, 1, 10),
+                appointment_time=time(10, 0),
+                status=status,
+                bill_amount=500,
+            )
+
+    def assertViewUsesIndexes(self, user, url_name):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or APPOINTMENT_TABLE not in sql or ' WHERE ' not in sql:
+                continue
+            checked += 1
+            for detail in query_plan(sql):
+                self.assertFalse(
+                    detail.startswith(f'SCAN {APPOINTMENT_TABLE}'),
+                    f"{url_name} falls back to a full scan: {detail}\n{sql}"
+                )
+        self.assertGreater(checked, 0, f"{url_name} ran no filtered appointment query")
+
+    def test_appoinment_request(self):
+        self.assertViewUsesIndexes(self.admin, 'appoinment_request')
+
+    def test_appointment_history(self):
+        self.assertViewUsesIndexes(self.admin, 'appoinment_history')
+
+    def test_view_bills(self):
+        self.assertViewUsesIndexes(self.patient, 'view_bills')
+
+    def test_view_medical_history(self):
+        self.assertViewUsesIndexes(self.patient, 'view_medical_history')
+
+    def test_doctor_dashboard(self):
+        self.assertViewUsesIndexes(self.doctor, 'doctor_dashboard')
+
+    def test_booking_hold_reads_only_its_slot(self):
+        with CaptureQueriesContext(connection) as ctx:
+            slots.hold('Cardiology', date(2026, 1, 10), '10:00')
+        [count] = [q['sql'] for q in ctx.captured_queries if APPOINTMENT_TABLE in q['sql']]
+        self.assertIn('USING COVERING INDEX appt_dept_day_status_time_idx', ' '.join(query_plan(count)))
+
+
+class RoleResolutionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='Doctor')
+        cls.doctor = User.objects.create_user(username='doctor', password='pass')
+        cls.doctor.groups.add(cls.group)
+        DoctorProfile.objects.create(user=cls.doctor, full_name='Doctor', specialization='Cardiology')
+
+    def test_role_resolved_at_login(self):
+        response = self.client.post(reverse('doctor_login'), {'username': 'doctor', 'password': 'pass'})
+        self.assertRedirects(response, reverse('doctor_dashboard'))
+        self.assertEqual(self.client.session[ROLE_SESSION_KEY], 'doctor')
+
+    def test_guarded_view_runs_no_group_query(self):
+        self.client.post(reverse('login'), {'username': 'doctor', 'password': 'pass'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('doctor_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'auth_group' in q['sql']])
+
+    def test_group_change_invalidates_role(self):
+        self.client.post(reverse('doctor_login'), {'username': 'doctor', 'password': 'pass'})
+        self.doctor.groups.remove(self.group)
+
+        response = self.client.get(reverse('doctor_dashboard'))
+        self.assertRedirects(response, f"{reverse('doctor_login')}?next={reverse('doctor_dashboard')}",
+                             fetch_redirect_response=False)
+        self.assertEqual(self.client.session[ROLE_SESSION_KEY], 'patient')
+
+    @override_settings(QUERY_CHECK='off')  # re-creating the stamp is outside the dashboard's budget
+    def test_evicted_stamp_never_matches_the_session(self):
+        caches['shared'].clear()
+        self.client.post(reverse('doctor_login'), {'username': 'doctor', 'password': 'pass'})
+        self.assertIsNotNone(self.client.session[ROLE_VERSION_SESSION_KEY])
+
+        # a change the signals missed, then the stamp is evicted
+        User.groups.through.objects.filter(user=self.doctor).delete()
+        caches['shared'].clear()
+        response = self.client.get(reverse('doctor_dashboard'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session[ROLE_SESSION_KEY], 'patient')
+
+    def test_patient_cannot_open_admin_pages(self):
+        User.objects.create_user(username='patient', password='pass')
+        self.client.post(reverse('login'), {'username': 'patient', 'password': 'pass'})
+        response = self.client.get(reverse('appoinment_history'))
+        self.assertEqual(response.status_code, 302)
+
+
+class PatientBalanceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        cls.doctor = User.objects.create_user(username='doctor', password='pass')
+        cls.doctor.groups.add(Group.objects.create(name='Doctor'))
+
+    def approved(self):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, doctor_type='Cardiology',
+            appointment_date=date(2026, 1, 10), appointment_time=time(10, 0), status='Approved'
+        )
+
+    def balance(self):
+        return PatientBalance.objects.get(patient=self.patient)
+
+    def test_billing_and_payment_keep_the_balance(self):
+        first, second = self.approved(), self.approved()
+
+        self.client.force_login(self.doctor)
+        self.client.post(reverse('complete_consultation', args=[first.id]), {
+            'diagnosis': 'Flu', 'prescription': 'Rest', 'bill_amount': '450.50',
+        })
+        self.client.force_login(self.admin)
+        self.client.post(reverse('generate_bill', args=[second.id]), {'amount': '200'})
+        self.assertEqual(self.balance().outstanding, Decimal('650.50'))
+        self.assertEqual(self.balance().unpaid_bills, 2)
+
+        first.refresh_from_db()
+        with self.settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET):
+            for _ in range(2):  # a redelivered event must not pay twice
+                post_event(self.client, paid_event(first))
+        inbox.drain()
+        self.assertEqual(self.balance().outstanding, Decimal('200'))
+        self.assertEqual(self.balance().unpaid_bills, 1)
+
+        incremental = list(PatientBalance.objects.values_list('patient_id', 'outstanding', 'unpaid_bills'))
+        call_command('rebuild_patient_balances', stdout=StringIO())
+        self.assertEqual(
+            list(PatientBalance.objects.values_list('patient_id', 'outstanding', 'unpaid_bills')),
+            incremental
+        )
+
+    def test_bills_page_reads_balance_and_paginates(self):
+        for _ in range(25):
+            appointment = self.approved()
+            appointment.status = 'Completed'
+            appointment.bill_amount = 10
+            appointment.save()
+        call_command('rebuild_patient_balances', stdout=StringIO())
+
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('view_bills'), {'page': 2})
+        self.assertEqual(response.context['total_due'], Decimal('250'))
+        self.assertEqual(len(response.context['bills']), 5)
+
+
+class CheckoutGatewayTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, cls.stripe = make_server(port=0)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_base = stripe.api_base
+        stripe.api_base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        stripe.api_base = cls.api_base
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        cls.bill = Appointment.objects.create(
+            patient=cls.patient, doctor_type='Cardiology', appointment_date=date(2026, 1, 10),
+            appointment_time=time(10, 0), status='Completed', bill_amount=Decimal('450.50')
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.stripe.sessions.clear()
+        self.stripe.replays.clear()
+        self.client.force_login(self.patient)
+
+    def test_checkout_redirects_to_session(self):
+        response = self.client.post(reverse('pay_bill', args=[self.bill.id]))
+        self.assertEqual(response.status_code, 303)
+
+        session, = self.stripe.sessions.values()
+        self.assertEqual(response['Location'], session['url'])
+        self.assertEqual(session['amount_total'], 45050)
+        self.assertEqual(session['metadata'], {'appointment_id': str(self.bill.id)})
+
+    def test_repeated_clicks_reuse_one_session(self):
+        first = self.client.post(reverse('pay_bill', args=[self.bill.id]))
+        second = self.client.post(reverse('pay_bill', args=[self.bill.id]))
+        self.assertEqual(first['Location'], second['Location'])
+
+        cache.clear()  # a different worker without the cached URL
+        third = self.client.post(reverse('pay_bill', args=[self.bill.id]))
+        self.assertEqual(third['Location'], first['Location'])
+        self.assertEqual(len(self.stripe.sessions), 1)
+
+    def test_gateway_failure_returns_to_bills(self):
+        stripe.api_base = 'http://127.0.0.1:9'
+        try:
+            response = self.client.post(reverse('pay_bill', args=[self.bill.id]), follow=True)
+        finally:
+            stripe.api_base = f"http://127.0.0.1:{self.server.server_port}"
+        self.assertRedirects(response, reverse('view_bills'))
+        self.assertContains(response, 'payment service is not responding')
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        cls.bills = [
+            Appointment.objects.create(
+                patient=cls.patient, doctor_type='Cardiology', appointment_date=date(2026, 1, 10),
+                appointment_time=time(10, 0), status='Completed', bill_amount=Decimal('100.25')
+            )
+            for _ in range(3)
+        ]
+        call_command('rebuild_patient_balances', stdout=StringIO())
+
+    def test_unsigned_events_are_rejected(self):
+        event = paid_event(self.bills[0])
+        self.assertEqual(post_event(self.client, event, secret='whsec_forged').status_code, 400)
+        response = self.client.post(reverse('stripe_webhook'), json.dumps(event), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_webhook_only_records_the_event(self):
+        event = paid_event(self.bills[0])
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(2):
+                self.assertEqual(post_event(self.client, event).status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if APPOINTMENT_TABLE in q['sql']])
+        self.assertEqual(StripeEvent.objects.get().event_id, event['id'])
+
+    def test_success_page_does_not_mark_paid(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('payment_success', args=[self.bills[0].id]))
+        self.assertContains(response, 'confirming your payment')
+        self.bills[0].refresh_from_db()
+        self.assertEqual(self.bills[0].payment_status, 'Not Paid')
+
+    def test_batch_is_one_bulk_update(self):
+        for bill in self.bills:
+            post_event(self.client, paid_event(bill))
+        post_event(self.client, paid_event(self.bills[0]) | {'id': 'evt_duplicate_checkout'})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(inbox.drain_batch(), (4, 3))
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith(f'UPDATE "{APPOINTMENT_TABLE}"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertFalse(Appointment.objects.exclude(payment_status='Paid').exists())
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(PatientBalance.objects.get(patient=self.patient).outstanding, 0)
+        rollup = RevenueRollup.objects.get()
+        self.assertEqual((rollup.paid_count, rollup.paid_revenue), (3, Decimal('300.75')))
+        self.assertEqual(inbox.drain_batch(), (0, 0))
+
+    def test_amount_mismatch_is_left_unpaid(self):
+        post_event(self.client, paid_event(self.bills[0], amount_total=100))
+        with self.assertLogs('patient.inbox', 'WARNING'):
+            self.assertEqual(inbox.drain(), (1, 0))
+        self.bills[0].refresh_from_db()
+        self.assertEqual(self.bills[0].payment_status, 'Not Paid')
+
+
+class AppointmentArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='patient', password='pass')
+        PatientProfile.objects.create(
+            user=cls.patient, full_name='Pat', age=40, gender='Female', place='Kochi', category='General'
+        )
+        cls.doctor = User.objects.create_user(username='house', password='pass')
+        cls.admin = User.objects.create_superuser(username='admin', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        old = date.today() - timedelta(days=400)
+        self.paid = self.visit(old, 'Completed', 'Paid', diagnosis='Gout')
+        self.unpaid = self.visit(old, 'Completed', 'Not Paid', diagnosis='Asthma')
+        self.rejected = self.visit(old, 'Rejected')
+        self.pending = self.visit(old, 'Pending')
+        self.recent = self.visit(date.today() - timedelta(days=10), 'Completed', 'Paid', diagnosis='Flu')
+
+    def visit(self, day, status, payment_status='Not Paid', diagnosis=None):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, doctor_type='General Medicine', appointment_date=day,
+            appointment_time=time(10, 0), status=status, payment_status=payment_status,
+            diagnosis=diagnosis, bill_amount=Decimal('100.00') if status == 'Completed' else 0,
+        )
+
+    def test_only_old_finished_appointments_move(self):
+        revenue = list(RevenueRollup.objects.values_list('revenue', 'paid_revenue'))
+        self.assertEqual(archive.archive(chunk_size=1), 2)
+
+        self.assertEqual(set(ArchivedAppointment.objects.values_list('id', flat=True)), {self.paid.id, self.rejected.id})
+        self.assertEqual(
+            set(Appointment.objects.values_list('id', flat=True)),
+            {self.unpaid.id, self.pending.id, self.recent.id},
+        )
+        archived = ArchivedAppointment.objects.get(pk=self.paid.id)
+        self.assertEqual((archived.diagnosis, archived.created_at), ('Gout', self.paid.created_at))
+
+        # the rollup still counts archived revenue, and a rebuild agrees
+        self.assertEqual(list(RevenueRollup.objects.values_list('revenue', 'paid_revenue')), revenue)
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        self.assertEqual(list(RevenueRollup.objects.values_list('revenue', 'paid_revenue')), revenue)
+
+        self.assertEqual(archive.archive(), 0)
+
+    def test_history_and_exports_read_both_tables(self):
+        call_command('archive_appointments', pause=0, stdout=StringIO())
+
+        self.client.force_login(self.patient)
+        history = self.client.get(reverse('view_medical_history')).context['history']
+        self.assertEqual([app.diagnosis for app in history], ['Flu', 'Asthma', 'Gout'])
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_data', args=['appointments']), {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], sorted(app.id for app in (
+            self.paid, self.unpaid, self.rejected, self.pending, self.recent
+        )))
+
+        stats = self.client.get(reverse('patient_statistics')).context['appointment_stats']
+        self.assertEqual((stats['total'], stats['completed'], stats['rejected']), (5, 3, 1))
@@ -14,6 +14,7 @@ urlpatterns = [
     
     # Appointments
     path('book_appointment/', views.book_appointment, name='book_appointment'),
+    path('available-slots/', views.available_slots, name='available_slots'),
     path('view_appointemnt/', views.view_appointment, name='view_appointemnt'),
     
     # Billing & Medical Records
@@ -22,5 +23,6 @@ urlpatterns = [
     path('view_medical_history/', views.view_medical_history, name='view_medical_history'),
 #   path('view_medical_request/', views.view_medical_request, name='view_medical_request'),
     path('paymentsuccess/<int:id>/', views.payment_success, name='payment_success'),
+    path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
     # path('payment-cancel/<int:id>/', views.payment_cancel, name='payment_cancel'),
 ]
\ No newline at end of file
@@ -1,15 +1,24 @@
+from operator import attrgetter
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.urls import reverse
-from .models import Appointment, PatientProfile
-import stripe
-
-# Stripe setup (SERVER SIDE ONLY)
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from adminpanel import throttle
+from . import archive, inbox
+from .models import Appointment, PatientBalance, PatientProfile
+from .roles import DOCTOR, resolve_role, store_role
+# Stripe setup (SERVER SIDE ONLY) lives in patient.payments
+from . import payments
 
 
 # -----------------------------
@@ -29,10 +38,14 @@ def patient_login_view(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
-        user = authenticate(request, username=username, password=password)
+        user, retry_after = throttle.authenticate(request, 'patient', username, password)
+        if retry_after:
+            return throttle.refused(request, 'loginpatient.html', retry_after)
         if user:
+            role = resolve_role(user)
             login(request, user)
-            if hasattr(user, 'doctor_profile'):
+            store_role(request, role)
+            if role == DOCTOR:
                 return redirect('doctor_dashboard')
             return redirect('patient_dashboard')
         else:
@@ -77,28 +90,59 @@ def patient_logout_view(request):
 # -----------------------------
 @login_required
 def book_appointment(request):
-    from doctor.models import DoctorProfile  # prevent circular import
+    from doctor import slots  # prevent circular import
+    from doctor.directory import get_directory
+
+    departments = get_directory().departments
 
     if request.method == "POST":
-        Appointment.objects.create(
-            patient=request.user,
-            doctor_type=request.POST.get('doctor_type'),
-            appointment_date=request.POST.get('date'),
-            appointment_time=request.POST.get('time'),
-            status='Pending',
-            payment_status='Not Paid'
-        )
+        department = request.POST.get('doctor_type')
+        day = parse_date(request.POST.get('date') or '')
+        at = request.POST.get('time')
+
+        # Only accept a slot some doctor in the department still has free
+        if not day or at not in [t.strftime('%H:%M') for t in slots.free_slots(department, day)]:
+            messages.error(request, "That time is not available. Please pick one of the free slots.")
+            return render(request, 'book_appointment.html', {'departments': departments})
+
+        # The slot is held in the same transaction as the insert
+        with transaction.atomic():
+            held = slots.hold(department, day, at)
+            if held:
+                Appointment.objects.create(
+                    patient=request.user,
+                    doctor_type=department,
+                    appointment_date=day,
+                    appointment_time=at,
+                    status='Pending',
+                    payment_status='Not Paid'
+                )
+        if not held:
+            messages.error(request, "That time was just taken. Please pick another free slot.")
+            return render(request, 'book_appointment.html', {'departments': departments})
 
         messages.success(request, "Appointment booked successfully")
         return redirect('patient_dashboard')
 
-    doctors = DoctorProfile.objects.all().select_related('user')
-    return render(request, 'book_appointment.html', {'doctors': doctors})
+    return render(request, 'book_appointment.html', {'departments': departments})
+
+
+@login_required
+def available_slots(request):
+    """Free slot start times for ?department= on ?date= (JSON)."""
+    from doctor import slots
+
+    day = parse_date(request.GET.get('date') or '')
+    if not day:
+        return JsonResponse({'slots': []})
+
+    free = slots.free_slots(request.GET.get('department'), day)
+    return JsonResponse({'slots': [t.strftime('%H:%M') for t in free]})
 
 
 @login_required
 def view_appointment(request):
-    appointments = Appointment.objects.filter(patient=request.user)
+    appointments = Appointment.objects.filter(patient=request.user).select_related('doctor')
     return render(request, 'view_appointemnt.html', {'appointments': appointments})
 
 
@@ -110,15 +154,16 @@ def view_bills(request):
     bills = Appointment.objects.filter(
         patient=request.user,
         status='Completed'
-    )
+    ).select_related('doctor').order_by('-appointment_date', '-id')
+    page = Paginator(bills, settings.BILLS_PAGE_SIZE).get_page(request.GET.get('page'))
 
-    total_due = sum(
-        bill.bill_amount for bill in bills if bill.payment_status != 'Paid'
-    )
+    # maintained by patient.ledger; one indexed lookup instead of summing every bill
+    balance = PatientBalance.objects.filter(patient=request.user).first()
 
     return render(request, 'view_bills.html', {
-        'bills': bills,
-        'total_due': total_due
+        'bills': page,
+        'page': page,
+        'total_due': balance.outstanding if balance else 0
     })
 
 
@@ -135,28 +180,17 @@ def pay_bill(request, id):
         return redirect('view_bills')
 
     if request.method == "POST":
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            mode='payment',
-            line_items=[{
-                'price_data': {
-                    'currency': 'inr',
-                    'product_data': {
-                        'name': f"Hospital Appointment - {appointment.doctor_type}",
-                    },
-                    'unit_amount': int(appointment.bill_amount * 100),
-                },
-                'quantity': 1,
-            }],
-            success_url=request.build_absolute_uri(
-                reverse('payment_success', args=[appointment.id])
-            ),
-            # cancel_url=request.build_absolute_uri(
-            #     reverse('payment_cancel', args=[appointment.id])
-            # ),
+        success_url = request.build_absolute_uri(
+            reverse('payment_success', args=[appointment.id])
         )
+        try:
+            url = payments.checkout_url(appointment, success_url)
+        except payments.StripeError:
+            messages.error(request, "The payment service is not responding. Please try again in a moment.")
+            return redirect('view_bills')
 
-        return redirect(session.url, code=303)
+        # 303 so the browser follows with a GET
+        return HttpResponseRedirect(url, status=303)
 
     return render(request, 'pay_bill.html', {
         'appointment': appointment,
@@ -172,24 +206,36 @@ def payment_success(request, id):
         patient=request.user
     )
 
-    # Mark payment as paid
-    appointment.payment_status = 'Paid'
-    appointment.save()
-
+    # Read-only: the bill is marked Paid when Stripe's webhook is processed
+    # (patient.inbox), not because this URL was loaded.
     return render(request, 'pyementSucess.html', {
         'appointment': appointment
     })
 
 
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    try:
+        event = payments.verify_webhook(request.body, request.headers.get('Stripe-Signature', ''))
+    except (ValueError, payments.InvalidWebhook):
+        return HttpResponse(status=400)
+
+    inbox.record(event)
+    return HttpResponse(status=200)
+
+
 # -----------------------------
 # 5. MEDICAL HISTORY & PROFILE
 # -----------------------------
 @login_required
 def view_medical_history(request):
-    history = Appointment.objects.filter(
-        patient=request.user,
-        status='Completed'
-    ).order_by('-appointment_date')
+    # live and archived consultations, newest first
+    history = list(archive.merged(
+        [queryset.order_by('-appointment_date') for queryset in archive.querysets(patient=request.user, status='Completed')],
+        key=attrgetter('appointment_date'),
+        reverse=True,
+    ))
 
     return render(request, 'view_medical_history.html', {
         'history': history